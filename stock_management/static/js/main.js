@@ -54,14 +54,112 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
-    // Auto-refresh dashboard every 30 seconds
-    if (window.location.pathname === '/') {
-        setInterval(() => {
-            const notifications = document.querySelectorAll('.alert');
-            if (notifications.length === 0) {
-                window.location.reload();
-            }
-        }, 30000);
+    // Live dashboard: patch the numbers from Server-Sent Events instead of reloading
+    const dashboard = document.getElementById('dashboard');
+    if (dashboard && dashboard.dataset.liveUrl && window.EventSource) {
+        const escapeHtml = value => String(value).replace(/[&<>"']/g, c => (
+            {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]
+        ));
+        
+        function setText(id, value) {
+            const element = document.getElementById(id);
+            if (element && value !== undefined) {
+                element.textContent = value;
+            }
+        }
+        
+        function renderLowStock(rows) {
+            setText('live-low-count', rows.length);
+            const container = document.getElementById('live-low-stock');
+            if (!container) {
+                return;
+            }
+            if (!rows.length) {
+                container.innerHTML = `
+                    <div class="text-center py-4">
+                        <i class="fas fa-check-circle fa-3x text-success mb-3"></i>
+                        <p class="text-muted mb-0">Hakuna bidhaa zenye stock ndogo</p>
+                    </div>`;
+                return;
+            }
+            const body = rows.map(row => {
+                const empty = row.current_stock <= 0;
+                return `
+                    <tr>
+                        <td><a href="${row.url}">${escapeHtml(row.name)}</a></td>
+                        <td><code>${escapeHtml(row.sku)}</code></td>
+                        <td class="text-center">
+                            <span class="badge ${empty ? 'bg-danger' : 'bg-warning'}">${row.current_stock}</span>
+                        </td>
+                        <td class="text-center">${row.reorder_level}</td>
+                        <td><span class="badge ${empty ? 'bg-danger' : 'bg-warning'}">${empty ? 'Hakuna Stock' : 'Stock Ndogo'}</span></td>
+                    </tr>`;
+            }).join('');
+            container.innerHTML = `
+                <div class="table-responsive">
+                    <table class="table table-sm table-hover">
+                        <thead>
+                            <tr><th>Bidhaa</th><th>SKU</th><th>Stock</th><th>Reorder</th><th>Hali</th></tr>
+                        </thead>
+                        <tbody>${body}</tbody>
+                    </table>
+                </div>`;
+        }
+        
+        function movementHtml(row) {
+            const isIn = row.kind === 'in';
+            return `
+                <div class="alert ${isIn ? 'alert-success' : 'alert-danger'} py-2 mb-2">
+                    <div class="d-flex justify-content-between">
+                        <span>
+                            <strong>${escapeHtml(row.product.length > 20 ? row.product.slice(0, 19) + '…' : row.product)}</strong>
+                            <br>
+                            <small>${escapeHtml(row.warehouse)}</small>
+                        </span>
+                        <span class="fw-bold">${isIn ? '+' : '-'}${row.quantity}</span>
+                    </div>
+                    <small class="text-muted">${row.time}</small>
+                </div>`;
+        }
+        
+        function renderRecent(kind, rows, replace) {
+            const container = document.getElementById(kind === 'in' ? 'live-recent-in' : 'live-recent-out');
+            if (!container || (!rows.length && !replace)) {
+                return;
+            }
+            const existing = replace ? '' : Array.from(container.querySelectorAll('.alert')).map(el => el.outerHTML).join('');
+            container.innerHTML = rows.map(movementHtml).join('') + existing;
+            Array.from(container.querySelectorAll('.alert')).slice(5).forEach(el => el.remove());
+            if (!container.querySelector('.alert')) {
+                container.innerHTML = `<p class="text-muted">${kind === 'in' ? 'Hakuna maingizo' : 'Hakuna matoleo'}</p>`;
+            }
+        }
+        
+        function applyEvent(data) {
+            setText('live-today-in', data.today_stockins);
+            setText('live-today-out', data.today_stockouts);
+            if (data.low_stock) {
+                renderLowStock(data.low_stock);
+            }
+            if (data.movements) {
+                ['in', 'out'].forEach(kind => renderRecent(kind, data.movements.filter(row => row.kind === kind).reverse(), false));
+            }
+            if (data.recent) {
+                ['in', 'out'].forEach(kind => renderRecent(kind, data.recent.filter(row => row.kind === kind), true));
+            }
+        }
+        
+        function connect() {
+            const source = new EventSource(dashboard.dataset.liveUrl);
+            source.addEventListener('snapshot', event => applyEvent(JSON.parse(event.data)));
+            source.addEventListener('update', event => applyEvent(JSON.parse(event.data)));
+            // Fell too far behind: reconnect and start again from a fresh snapshot
+            source.addEventListener('resync', () => {
+                source.close();
+                connect();
+            });
+        }
+        connect();
     }
     
     // Print functionality
@@ -82,32 +180,125 @@ document.addEventListener('DOMContentLoaded', function() {
 // Add to existing main.js
 document.addEventListener('DOMContentLoaded', function() {
     
+    // Product typeahead: selects with data-search-url only hold the chosen
+    // product; matches are fetched from the search API as the user types
+    document.querySelectorAll('select[data-search-url]').forEach(select => {
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control mb-1';
+        input.placeholder = 'Andika SKU au jina la bidhaa...';
+        input.autocomplete = 'off';
+        select.parentNode.insertBefore(input, select);
+        const placeholder = select.options[0] && !select.options[0].value ? select.options[0].text : '';
+        let timer = null;
+        let controller = null;
+        
+        function choose(value) {
+            if (select.value !== String(value)) {
+                select.value = value;
+                select.dispatchEvent(new Event('change', { bubbles: true }));
+            }
+        }
+        
+        function showResults(query, results) {
+            const current = select.value;
+            select.innerHTML = '';
+            select.appendChild(new Option(results.length ? placeholder : 'Hakuna bidhaa inayolingana', ''));
+            results.forEach(result => select.appendChild(new Option(result.text, result.id)));
+            const exact = results.find(result => result.sku.toLowerCase() === query.toLowerCase());
+            if (exact || results.length === 1) {
+                choose((exact || results[0]).id);
+            } else if (results.some(result => String(result.id) === current)) {
+                select.value = current;
+            } else if (current) {
+                select.dispatchEvent(new Event('change', { bubbles: true }));
+            }
+        }
+        
+        function search() {
+            const query = input.value.trim();
+            if (!query) {
+                return;
+            }
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            fetch(`${select.dataset.searchUrl}?q=${encodeURIComponent(query)}&limit=20`, { signal: controller.signal })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.success) {
+                        showResults(query, data.results);
+                    }
+                })
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        console.error('Error:', error);
+                    }
+                });
+        }
+        
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(search, 200);
+        });
+        // Barcode scanners finish with Enter: search now, do not submit the form
+        input.addEventListener('keydown', event => {
+            if (event.key === 'Enter') {
+                event.preventDefault();
+                clearTimeout(timer);
+                search();
+            }
+        });
+    });
+    
     // Stock availability check for stockout form
     const productSelect = document.getElementById('id_product');
     const quantityInput = document.getElementById('id_quantity');
     
     if (productSelect && quantityInput) {
+        // Stock of the chosen product; repeat fetches revalidate with the
+        // ETag and usually come back as a cheap 304.
+        let stockLevels = {};
+        
+        function loadStockLevel(productId) {
+            return fetch(`/api/stock/?products=${productId}`, { cache: 'no-cache' })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.success) {
+                        data.products.forEach(entry => { stockLevels[entry.product_id] = entry; });
+                    }
+                    return stockLevels;
+                });
+        }
+        
+        function showStock(productId) {
+            const data = stockLevels[productId];
+            if (!data) {
+                return;
+            }
+            const stockInfo = document.getElementById('stock-info');
+            if (!stockInfo) {
+                const div = document.createElement('div');
+                div.id = 'stock-info';
+                div.className = 'alert alert-info mt-2';
+                quantityInput.parentNode.appendChild(div);
+            }
+            
+            const stockElement = document.getElementById('stock-info');
+            stockElement.innerHTML = `
+                <i class="fas fa-box"></i> Stock inayopatikana: <strong>${data.stock}</strong>
+                ${data.status === 'low' ? '<span class="badge bg-warning ms-2">Stock Ndogo</span>' : ''}
+                ${data.status === 'out' ? '<span class="badge bg-danger ms-2">Hakuna Stock</span>' : ''}
+            `;
+        }
+        
         productSelect.addEventListener('change', function() {
             const productId = this.value;
             if (productId) {
-                fetch(`/api/product-stock/${productId}/`)
-                    .then(response => response.json())
-                    .then(data => {
-                        const stockInfo = document.getElementById('stock-info');
-                        if (!stockInfo) {
-                            const div = document.createElement('div');
-                            div.id = 'stock-info';
-                            div.className = 'alert alert-info mt-2';
-                            quantityInput.parentNode.appendChild(div);
-                        }
-                        
-                        const stockElement = document.getElementById('stock-info');
-                        stockElement.innerHTML = `
-                            <i class="fas fa-box"></i> Stock inayopatikana: <strong>${data.stock}</strong>
-                            ${data.status === 'low' ? '<span class="badge bg-warning ms-2">Stock Ndogo</span>' : ''}
-                            ${data.status === 'out' ? '<span class="badge bg-danger ms-2">Hakuna Stock</span>' : ''}
-                        `;
-                    })
+                showStock(productId);
+                loadStockLevel(productId)
+                    .then(() => showStock(productId))
                     .catch(error => {
                         console.error('Error:', error);
                     });
@@ -201,9 +201,9 @@ function shareWhatsApp() {
 document.addEventListener('DOMContentLoaded', function() {
     console.log('📊 Reports JS initialized');
     
-    // Excel button
+    // Excel button (links to the server export are left alone)
     const excelBtn = document.querySelector('.btn-success');
-    if (excelBtn && excelBtn.textContent.includes('Excel')) {
+    if (excelBtn && excelBtn.textContent.includes('Excel') && !excelBtn.hasAttribute('href')) {
         excelBtn.onclick = exportToExcel;
         console.log('  ✅ Excel button ready');
     }
@@ -3,6 +3,19 @@ ASGI config for stock_management project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with any ASGI server, for example:
+
+    STOCK_CACHE_DIR=/var/cache/stock uvicorn stock_management.asgi:application --workers 4
+
+With more than one worker set STOCK_CACHE_DIR, so that product, category
+and warehouse changes and report cache versions reach every worker at once;
+without it each worker only picks them up after CATALOG_MAX_AGE seconds.
+
+Served this way the dashboard, stock report and monthly report use their
+async views (STOCK_ASYNC_VIEWS), which run independent queries concurrently
+on a pool of STOCK_REPORT_QUERY_WORKERS threads per process, and the live
+dashboard stream holds its connections on the event loop.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -12,5 +25,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_management.settings')
+os.environ.setdefault('STOCK_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'warehouse.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +55,8 @@ ROOT_URLCONF = 'stock_management.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render time reported to PerformanceMiddleware
+        'BACKEND': 'warehouse.services.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -69,17 +71,97 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'stock_management.wsgi.application'
+ASGI_APPLICATION = 'stock_management.asgi.application'
+
+# Async report views and the thread pool their queries run on (see asgi.py)
+ASYNC_REPORT_VIEWS = os.environ.get('STOCK_ASYNC_VIEWS') == '1'
+REPORT_QUERY_WORKERS = int(os.environ.get('STOCK_REPORT_QUERY_WORKERS', '4'))
 
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# STOCK_DB_PROFILE=production turns on WAL, tuned pragmas and persistent
+# connections, and adds a 'read' connection that report views use through
+# warehouse.db_router. STOCK_DB_NAME points at another database file.
+
+SQLITE_NAME = os.environ.get('STOCK_DB_NAME') or BASE_DIR / 'db.sqlite3'
+
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',       # readers and the writer no longer block each other
+    'PRAGMA synchronous = NORMAL',     # fsync at checkpoints only; safe with WAL
+    'PRAGMA busy_timeout = 5000',      # wait up to 5s for the write lock instead of failing
+    'PRAGMA mmap_size = 268435456',    # 256 MB memory-mapped reads
+    'PRAGMA cache_size = -65536',      # 64 MB page cache per connection
+    'PRAGMA temp_store = MEMORY',
+]
+
+if os.environ.get('STOCK_DB_PROFILE') == 'production':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_NAME,
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': '; '.join(SQLITE_PRAGMAS),
+                # Take the write lock at BEGIN, where busy_timeout applies,
+                # instead of failing on a read-to-write upgrade mid-transaction
+                'transaction_mode': 'IMMEDIATE',
+            },
+        },
+        'read': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_NAME,
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': '; '.join(SQLITE_PRAGMAS + ['PRAGMA query_only = ON']),
+            },
+            'TEST': {'MIRROR': 'default'},
+        },
     }
-}
+    DATABASE_ROUTERS = ['warehouse.db_router.ReadWriteRouter']
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_NAME,
+        }
+    }
+
+
+# Cache
+# Local memory by default (one process). Set STOCK_CACHE_DIR to share the
+# cache, and with it the catalog version and movement sequence, between
+# worker processes through the file-based backend.
+
+if os.environ.get('STOCK_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['STOCK_CACHE_DIR'],
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'stock-management',
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Seconds a cached report context or fragment may live (see services/report_cache.py)
+REPORT_CACHE_TTL = 300
+
+# With the per-process LocMem cache a catalog change in one worker cannot
+# reach the others, so each reloads its master-data catalog at least this
+# often (seconds; see services/catalog.py). Ignored with a shared cache.
+CATALOG_MAX_AGE = 60
 
 
 # Password validation
@@ -123,3 +205,44 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 LOGIN_URL = '/admin/login/'
 LOGIN_REDIRECT_URL = '/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cost the stock and warehouse reports value stock at: 'average' (moving
+# weighted average) or 'fifo' (warehouse.services.valuation)
+INVENTORY_VALUATION_METHOD = os.environ.get('STOCK_VALUATION_METHOD', 'average')
+
+# Demand-based reorder points (warehouse.services.replenishment, recomputed by
+# `manage.py compute_replenishment`): days of issue history used, supplier
+# lead time and review period in days, and the z-score of the service level
+# the safety stock is sized for (1.65 = 95%)
+REPLENISHMENT_HISTORY_DAYS = 365
+REPLENISHMENT_LEAD_TIME_DAYS = 7
+REPLENISHMENT_REVIEW_DAYS = 14
+REPLENISHMENT_SERVICE_Z = 1.65
+
+# Background report exports (warehouse.services.report_jobs, run by
+# `manage.py run_report_jobs`): where finished files are kept, how many jobs
+# may run at once, how long a running job's lease lasts without a heartbeat
+# from its runner before it counts as abandoned, and how long finished jobs
+# and their files are kept
+REPORT_JOB_DIR = os.environ.get('STOCK_REPORT_JOB_DIR') or BASE_DIR / 'report_jobs'
+REPORT_JOB_WORKERS = int(os.environ.get('STOCK_REPORT_JOB_WORKERS', '2'))
+REPORT_JOB_LEASE_SECONDS = 300
+REPORT_JOB_KEEP_DAYS = 7
+
+# Request profiling (warehouse.middleware.PerformanceMiddleware): Server-Timing
+# headers for everyone when on (always for staff), and a JSON log line for
+# slow requests and for requests repeating one query this many times
+PERF_SERVER_TIMING = DEBUG
+PERF_SLOW_REQUEST_MS = int(os.environ.get('STOCK_SLOW_REQUEST_MS', '1000'))
+PERF_DUPLICATE_QUERY_THRESHOLD = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'warehouse.performance': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
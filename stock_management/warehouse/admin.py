@@ -1,5 +1,97 @@
 from django.contrib import admin
-from .models import Category, Product, Warehouse, StockIn, StockOut
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.text import smart_split, unescape_string_literal
+from django.utils.functional import cached_property
+from .models import Category, Product, Warehouse, StockIn, StockOut, StockBalance, StockTransfer, DailyMovement, StockCheckpoint, ReportJob
+from .services.product_search import matching_products
+from .services.report_cache import cache_key, movement_sequence, report_cache_ttl
+from .services.stock_matrix import total_stock_subquery
+
+# ========== LARGE TABLES ==========
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never runs COUNT(*) over a whole large table per page view.
+    
+    An unfiltered changelist on SQLite counts the table once per movement
+    sequence (services/report_cache.py): the count is cached until the next
+    committed movement write, rebuild or import. On PostgreSQL it uses the
+    planner statistics and only counts exactly below EXACT_BELOW rows. A
+    filtered or searched changelist counts at most COUNT_LIMIT matching rows;
+    results past that are reached by narrowing the filter or the date
+    hierarchy instead of by page number.
+    """
+    EXACT_BELOW = 10000
+    COUNT_LIMIT = 100000
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return queryset.order_by()[:self.COUNT_LIMIT].count()
+        if connections[queryset.db].vendor != 'postgresql':
+            return self.cached_count(queryset)
+        estimate = self.estimate(queryset)
+        if estimate is None or estimate < self.EXACT_BELOW:
+            return queryset.count()
+        return estimate
+    
+    def cached_count(self, queryset):
+        # Exact, so deleted rows never leave empty trailing pages
+        key = cache_key('count', queryset.model._meta.db_table, movement_sequence(), [queryset.db])
+        return cache.get_or_set(key, queryset.order_by().count, report_cache_ttl())
+    
+    def estimate(self, queryset):
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row and row[0] > 0 else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables that grow without bound: cached page
+    count and no second COUNT(*) for the "N total" link.
+    
+    Search works like the stock admin (every word must match one of
+    search_fields), with two differences: a lookup through a relation runs
+    as IN (subquery) on that table instead of a join, and with
+    search_products on a word may also match the product's SKU or name
+    through the FTS index. Use '^field' prefix lookups for columns of the
+    table itself so the NOCASE indexes can serve them.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_products = True
+    
+    LOOKUP_PREFIXES = {'^': 'istartswith', '=': 'iexact', '@': 'search'}
+    
+    def field_condition(self, field_name, word):
+        lookup = self.LOOKUP_PREFIXES.get(field_name[0])
+        name = field_name[1:] if lookup else field_name
+        lookup = lookup or 'icontains'
+        first, _, rest = name.partition('__')
+        field = self.model._meta.get_field(first)
+        if rest and field.is_relation:
+            related = field.related_model._default_manager.filter(**{f'{rest}__{lookup}': word})
+            return Q(**{f'{first}__in': related})
+        return Q(**{f'{name}__{lookup}': word})
+    
+    def get_search_results(self, request, queryset, search_term):
+        search_fields = self.get_search_fields(request)
+        for word in smart_split(search_term):
+            if word.startswith(('"', "'")) and word[0] == word[-1]:
+                word = unescape_string_literal(word)
+            condition = Q()
+            for field_name in search_fields:
+                condition |= self.field_condition(field_name, word)
+            if self.search_products:
+                condition |= Q(product__in=matching_products(word, active_only=False))
+            queryset = queryset.filter(condition)
+        return queryset, False
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -8,9 +100,17 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'sku', 'category', 'unit_price', 'reorder_level']
+    list_display = ['name', 'sku', 'category', 'unit_price', 'reorder_level', 'current_stock']
     list_filter = ['category']
+    list_select_related = ['category']
     search_fields = ['name', 'sku']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(current_stock=total_stock_subquery())
+    
+    @admin.display(description='Stock iliyopo', ordering='current_stock')
+    def current_stock(self, obj):
+        return obj.current_stock
 
 @admin.register(Warehouse)
 class WarehouseAdmin(admin.ModelAdmin):
@@ -18,13 +118,84 @@ class WarehouseAdmin(admin.ModelAdmin):
     search_fields = ['name', 'location']
 
 @admin.register(StockIn)
-class StockInAdmin(admin.ModelAdmin):
+class StockInAdmin(LargeTableAdmin):
     list_display = ['product', 'quantity', 'supplier', 'date_received', 'warehouse']
-    list_filter = ['date_received', 'warehouse']
-    search_fields = ['product__name', 'supplier', 'reference_no']
+    list_filter = ['warehouse']
+    list_select_related = ['product', 'warehouse']
+    date_hierarchy = 'date_received'
+    search_fields = ['^supplier', '^reference_no']
+    raw_id_fields = ['product']
+    readonly_fields = ['transfer']
 
 @admin.register(StockOut)
-class StockOutAdmin(admin.ModelAdmin):
+class StockOutAdmin(LargeTableAdmin):
     list_display = ['product', 'quantity', 'customer', 'date_issued', 'warehouse']
-    list_filter = ['date_issued', 'warehouse']
-    search_fields = ['product__name', 'customer', 'reference_no']
\ No newline at end of file
+    list_filter = ['warehouse']
+    list_select_related = ['product', 'warehouse']
+    date_hierarchy = 'date_issued'
+    search_fields = ['^customer', '^reference_no']
+    raw_id_fields = ['product']
+    readonly_fields = ['transfer']
+
+@admin.register(StockBalance)
+class StockBalanceAdmin(LargeTableAdmin):
+    list_display = ['product', 'warehouse', 'quantity', 'updated_at']
+    list_filter = ['warehouse']
+    list_select_related = ['product', 'warehouse']
+    search_fields = ['=product__sku']
+    readonly_fields = ['product', 'warehouse', 'quantity', 'updated_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        # Derived from StockIn/StockOut; repair with the rebuild commands instead
+        return False
+
+@admin.register(DailyMovement)
+class DailyMovementAdmin(LargeTableAdmin):
+    list_display = ['day', 'product', 'warehouse', 'qty_in', 'qty_out', 'lines_in', 'lines_out']
+    list_filter = ['warehouse']
+    list_select_related = ['product', 'warehouse']
+    date_hierarchy = 'day'
+    search_fields = ['=product__sku']
+    readonly_fields = ['day', 'product', 'warehouse', 'qty_in', 'qty_out', 'lines_in', 'lines_out']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        # Derived from StockIn/StockOut; repair with the rebuild commands instead
+        return False
+
+@admin.register(StockTransfer)
+class StockTransferAdmin(admin.ModelAdmin):
+    list_display = ['number', 'from_warehouse', 'to_warehouse', 'created_at', 'created_by']
+    list_filter = ['from_warehouse', 'to_warehouse']
+    list_select_related = ['from_warehouse', 'to_warehouse', 'created_by']
+    readonly_fields = ['from_warehouse', 'to_warehouse', 'created_at', 'created_by']
+    
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(StockCheckpoint)
+class StockCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['cutoff_date', 'created_at', 'created_by', 'notes']
+    list_select_related = ['created_by']
+    readonly_fields = ['cutoff_date', 'created_at', 'created_by']
+    
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'report', 'export_format', 'status', 'request_count', 'created_at', 'finished_at', 'row_count', 'requested_by']
+    list_filter = ['status', 'report']
+    list_select_related = ['requested_by']
+    readonly_fields = [
+        'report', 'export_format', 'params', 'key', 'requested_by', 'request_count', 'attempts',
+        'created_at', 'started_at', 'heartbeat_at', 'finished_at', 'row_count', 'result_file', 'error',
+    ]
+    
+    def has_add_permission(self, request):
+        return False
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class WarehouseConfig(AppConfig):
     name = 'warehouse'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .services.catalog import schedule_warm_up
+        schedule_warm_up()
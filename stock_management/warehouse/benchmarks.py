@@ -0,0 +1,312 @@
+# warehouse/benchmarks.py
+"""
+View benchmarks: seed a catalogue of a given size, request every page and
+API endpoint, and record wall time and SQL query count for each.
+
+Used by the `benchmark_views` management command (JSON results that can be
+compared between runs) and by the query-budget tests in tests.py.
+`latency_benchmark` compares p50/p99 of the sync report views with their
+async versions under concurrent requests, and `mixed_workload` measures
+read/write throughput of concurrent writers and report readers on one
+database file (the `benchmark_mixed_workload` command).
+"""
+import asyncio
+import math
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .db_router import read_only
+from .models import Category, Product, Warehouse, StockIn, StockOut, StockBalance, DailyMovement
+from .services.stock_matrix import build_stock_matrix, low_stock_products
+
+
+class DataSize:
+    """products x warehouses x movements, written as e.g. '200x5x5000'"""
+
+    def __init__(self, products, warehouses, movements):
+        self.products = products
+        self.warehouses = warehouses
+        self.movements = movements
+
+    @classmethod
+    def parse(cls, text):
+        try:
+            products, warehouses, movements = (int(part) for part in text.lower().split('x'))
+        except ValueError:
+            raise ValueError(f"size '{text}' must look like PRODUCTSxWAREHOUSESxMOVEMENTS, e.g. 200x5x5000")
+        return cls(products, warehouses, movements)
+
+    def __str__(self):
+        return f'{self.products}x{self.warehouses}x{self.movements}'
+
+
+def seed(size, batch_size=2000):
+    """Replace catalogue and movement data with a deterministic data set of the given size"""
+    StockIn.objects.all().delete()
+    StockOut.objects.all().delete()
+    StockBalance.objects.all().delete()
+    Product.objects.all().delete()
+    Warehouse.objects.all().delete()
+    Category.objects.all().delete()
+
+    categories = Category.objects.bulk_create([Category(name=f'Kategoria {i}') for i in range(5)])
+    warehouses = Warehouse.objects.bulk_create([
+        Warehouse(name=f'Ghala {i}', code=f'BW{i:03d}') for i in range(size.warehouses)
+    ])
+    products = Product.objects.bulk_create([
+        Product(
+            name=f'Bidhaa {i}', sku=f'BENCH-{i:06d}', category=categories[i % len(categories)],
+            unit_price=1000 + i % 50, reorder_level=10 + i % 20,
+        )
+        for i in range(size.products)
+    ], batch_size=batch_size)
+
+    now = timezone.now()
+    stockins, stockouts = [], []
+    for i in range(size.movements):
+        product = products[i % len(products)]
+        warehouse = warehouses[(i // len(products)) % len(warehouses)]
+        date = now - timedelta(minutes=i * 7)
+        if i % 5 < 3:
+            stockins.append(StockIn(
+                product=product, warehouse=warehouse, quantity=10, supplier='Bench Supplier',
+                reference_no=f'BIN-{i}', date_received=date,
+            ))
+        else:
+            stockouts.append(StockOut(
+                product=product, warehouse=warehouse, quantity=3, customer='Bench Customer',
+                reference_no=f'BOUT-{i}', date_issued=date,
+            ))
+    StockIn.objects.bulk_create(stockins, batch_size=batch_size)
+    StockOut.objects.bulk_create(stockouts, batch_size=batch_size)
+    StockBalance.rebuild()
+    DailyMovement.rebuild()
+    cache.clear()
+    return products, warehouses
+
+
+def benchmark_targets(product, warehouse):
+    """(name, url) for every page and API endpoint worth timing"""
+    return [
+        ('dashboard', reverse('dashboard')),
+        ('product_list', reverse('product_list')),
+        ('product_detail', reverse('product_detail', args=[product.id])),
+        ('add_stockin', reverse('add_stockin')),
+        ('add_stockout', reverse('add_stockout')),
+        ('import_movements', reverse('import_movements')),
+        ('transaction_list', reverse('transaction_list')),
+        ('warehouse_stock', reverse('warehouse_stock', args=[warehouse.id])),
+        ('transfer_stock', reverse('transfer_stock')),
+        ('stock_report', reverse('stock_report')),
+        ('low_stock_report', reverse('low_stock_report')),
+        ('monthly_report', reverse('monthly_report')),
+        ('export_stock_csv', reverse('export_report', args=['stock']) + '?format=csv'),
+        ('export_transactions_csv', reverse('export_report', args=['transactions']) + '?format=csv'),
+        ('product_stock_api', reverse('product_stock_api', args=[product.id])),
+        ('product_stock_api_warehouse',
+         reverse('product_stock_api', args=[product.id]) + f'?warehouse={warehouse.id}'),
+        ('stock_lookup_api', reverse('stock_lookup_api') + f'?products={product.id},{product.sku}'),
+    ]
+
+
+def measure(client, url, repeat=3, cold_cache=True):
+    """Request a URL `repeat` times; return query count and timings in ms"""
+    timings, queries = [], 0
+    for _ in range(repeat):
+        if cold_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                for _chunk in response.streaming_content:
+                    pass
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned HTTP {response.status_code}')
+        queries = len(ctx.captured_queries)
+    return {
+        'queries': queries,
+        'median_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2),
+        'max_ms': round(max(timings), 2),
+    }
+
+
+def run_benchmarks(size, repeat=3, cold_cache=True):
+    """Seed `size`, then measure every target. Returns {name: result}"""
+    products, warehouses = seed(size)
+    user, _ = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+    client = Client()
+    client.force_login(user)
+    return {
+        name: measure(client, url, repeat=repeat, cold_cache=cold_cache)
+        for name, url in benchmark_targets(products[0], warehouses[0])
+    }
+
+
+def query_growth(results_by_size):
+    """Names of targets whose query count differs between data sizes"""
+    counts = {}
+    for results in results_by_size.values():
+        for name, result in results.items():
+            counts.setdefault(name, set()).add(result['queries'])
+    return sorted(name for name, values in counts.items() if len(values) > 1)
+
+
+# ========== SYNC VS ASYNC LATENCY ==========
+ASYNC_PAIRS = [
+    ('dashboard', 'dashboard', 'dashboard_async'),
+    ('stock_report', 'stock_report', 'stock_report_async'),
+    ('monthly_report', 'monthly_report', 'monthly_report_async'),
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _latency(timings):
+    return {
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'max_ms': round(max(timings), 2),
+    }
+
+
+def _sync_timings(cookies, url, requests, concurrency, cold_cache):
+    def one(_):
+        client = Client()
+        client.cookies = cookies
+        if cold_cache:
+            cache.clear()
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned HTTP {response.status_code}')
+        return elapsed
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+async def _async_timings(cookies, url, requests, concurrency, cold_cache):
+    limit = asyncio.Semaphore(concurrency)
+    
+    async def one():
+        async with limit:
+            client = AsyncClient()
+            client.cookies = cookies
+            if cold_cache:
+                await cache.aclear()
+            started = time.perf_counter()
+            response = await client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned HTTP {response.status_code}')
+            return elapsed
+    return await asyncio.gather(*(one() for _ in range(requests)))
+
+
+def latency_benchmark(requests=50, concurrency=8, cold_cache=True):
+    """
+    {name: {'sync': {...}, 'async': {...}}} with p50/p99/max in ms for each
+    view in ASYNC_PAIRS. Sync views are hit from `concurrency` threads (as a
+    threaded WSGI server would), async ones from `concurrency` concurrent
+    requests on one event loop (as one ASGI worker would). Expects seed() to
+    have run.
+    """
+    user, _ = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+    login = Client()
+    login.force_login(user)
+    results = {}
+    for name, sync_name, async_name in ASYNC_PAIRS:
+        sync_timings = _sync_timings(login.cookies, reverse(sync_name), requests, concurrency, cold_cache)
+        async_timings = asyncio.run(
+            _async_timings(login.cookies, reverse(async_name), requests, concurrency, cold_cache)
+        )
+        results[name] = {'sync': _latency(sync_timings), 'async': _latency(async_timings)}
+    return results
+
+
+# ========== MIXED READ/WRITE THROUGHPUT ==========
+def _workload_thread(operation, seconds, results, start):
+    done, errors, timings = 0, 0, []
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                operation(done)
+            except OperationalError:
+                # 'database is locked': the write or read was lost
+                errors += 1
+            else:
+                done += 1
+                timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        connections.close_all()
+        results.append((done, errors, timings))
+
+
+def _totals(results, seconds):
+    timings = [ms for _, _, thread_timings in results for ms in thread_timings]
+    done = sum(done for done, _, _ in results)
+    return {
+        'ops': done,
+        'ops_per_sec': round(done / seconds, 1),
+        'errors': sum(errors for _, errors, _ in results),
+        'p50_ms': round(percentile(timings, 50), 2) if timings else None,
+        'p99_ms': round(percentile(timings, 99), 2) if timings else None,
+    }
+
+
+def mixed_workload(products, warehouses, seconds=5, writers=4, readers=4):
+    """
+    Run `writers` threads saving stock-ins (signals included, each in its own
+    transaction, as add_stockin does) next to `readers` threads building the
+    stock matrix and low-stock list inside read_only(), for `seconds`.
+    Returns {'writes': {...}, 'reads': {...}} with throughput, p50/p99 and the
+    number of operations that failed with 'database is locked'.
+    """
+    def write(i):
+        with transaction.atomic():
+            StockIn.objects.create(
+                product=products[i % len(products)], warehouse=warehouses[i % len(warehouses)],
+                quantity=5, supplier='Bench Supplier', reference_no=f'MIX-{threading.get_ident()}-{i}',
+            )
+
+    def read(_):
+        with read_only():
+            build_stock_matrix()
+            list(low_stock_products(limit=10))
+
+    write_results, read_results = [], []
+    start = threading.Event()
+    threads = [
+        threading.Thread(target=_workload_thread, args=(write, seconds, write_results, start))
+        for _ in range(writers)
+    ] + [
+        threading.Thread(target=_workload_thread, args=(read, seconds, read_results, start))
+        for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return {'writes': _totals(write_results, seconds), 'reads': _totals(read_results, seconds)}
@@ -1,8 +1,8 @@
 # warehouse/context_processors.py
-from .models import Warehouse
+from .services.catalog import get_catalog
 
 def warehouses(request):
-    """Add all warehouses to template context"""
+    """Add all warehouses to template context (from the in-process catalog, no query)"""
     return {
-        'warehouses': Warehouse.objects.all().order_by('id', 'name')
-    }
\ No newline at end of file
+        'warehouses': sorted(get_catalog().warehouses, key=lambda warehouse: (warehouse.id, warehouse.name))
+    }
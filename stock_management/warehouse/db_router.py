@@ -0,0 +1,63 @@
+# warehouse/db_router.py
+"""
+Read/write split for the production database profile.
+
+Views wrapped in @read_only_view run their reads on the 'read' connection
+(same SQLite file, opened with query_only) so a long report never holds the
+connection that stock movements are written through. Everything else, and
+every write, uses 'default'. When no 'read' database is configured the
+router does nothing.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+READ_ALIAS = 'read'
+WRITE_ALIAS = 'default'
+
+_read_only = contextvars.ContextVar('warehouse_read_only', default=False)
+
+
+@contextmanager
+def read_only():
+    """Send ORM reads inside the block to the read connection"""
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def read_only_view(view):
+    """Decorator for report and lookup views that never write"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with read_only():
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with read_only():
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReadWriteRouter:
+    def db_for_read(self, model, **hints):
+        if _read_only.get() and READ_ALIAS in settings.DATABASES:
+            return READ_ALIAS
+        return WRITE_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return WRITE_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == WRITE_ALIAS
@@ -1,14 +1,81 @@
 from django import forms
+from django.urls import reverse_lazy
 from .models import Product, Warehouse, StockIn, StockOut
+from .services import catalog
+
+
+class CatalogChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField whose choices and lookups come from the in-process catalog, not the database"""
+    
+    def __init__(self, kind, model, **kwargs):
+        self.kind = kind
+        super().__init__(queryset=model.objects.none(), **kwargs)
+    
+    def _get_choices(self):
+        choices = [(obj.pk, self.label_from_instance(obj)) for obj in getattr(catalog.get_catalog(), self.kind)]
+        if self.empty_label is not None:
+            choices.insert(0, ('', self.empty_label))
+        return choices
+    
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+    
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        obj = catalog.product(value) if self.kind == 'products' else catalog.warehouse(value)
+        if obj is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
+
+
+class ProductSearchSelect(forms.Select):
+    """
+    Select that renders only the chosen product.
+    
+    main.js adds a search box in front of it and fills the options from the
+    product search API as the user types, so the page size no longer grows
+    with the catalogue.
+    """
+    
+    def __init__(self, attrs=None):
+        attrs = {'class': 'form-select', 'data-search-url': reverse_lazy('product_search_api'), **(attrs or {})}
+        super().__init__(attrs)
+    
+    def optgroups(self, name, value, attrs=None):
+        products = catalog.get_catalog().products_by_id
+        selected = [products.get(int(v)) for v in value if str(v).isdigit()]
+        self.choices = [('', '-- Tafuta bidhaa kwa SKU au jina --')] + [
+            (product.pk, str(product)) for product in selected if product
+        ]
+        return super().optgroups(name, value, attrs)
+
+
+class ProductSearchField(CatalogChoiceField):
+    """Product picker for large catalogues; any catalogue id is still validated on the server"""
+    widget = ProductSearchSelect
+    
+    def __init__(self, **kwargs):
+        super().__init__('products', Product, **kwargs)
+    
+    def _get_choices(self):
+        # Rendered by ProductSearchSelect; never build the full option list
+        return []
+    
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+
 
 class StockInForm(forms.ModelForm):
     class Meta:
         model = StockIn
-        fields = ['product', 'warehouse', 'quantity', 'supplier', 'reference_no', 'notes']
+        fields = ['product', 'warehouse', 'quantity', 'unit_cost', 'supplier', 'reference_no', 'notes']
         widgets = {
-            'product': forms.Select(attrs={'class': 'form-select'}),
             'warehouse': forms.Select(attrs={'class': 'form-select'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
+            'unit_cost': forms.NumberInput(attrs={'class': 'form-control', 'min': 0, 'step': '0.01'}),
             'supplier': forms.TextInput(attrs={'class': 'form-control'}),
             'reference_no': forms.TextInput(attrs={'class': 'form-control'}),
             'notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
@@ -16,16 +83,14 @@ class StockInForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Filter only active products
-        self.fields['product'].queryset = Product.objects.all()
-        self.fields['warehouse'].queryset = Warehouse.objects.all()
+        self.fields['product'] = ProductSearchField()
+        self.fields['warehouse'] = CatalogChoiceField('warehouses', Warehouse, widget=self.fields['warehouse'].widget)
 
 class StockOutForm(forms.ModelForm):
     class Meta:
         model = StockOut
         fields = ['product', 'warehouse', 'quantity', 'customer', 'reference_no', 'notes']
         widgets = {
-            'product': forms.Select(attrs={'class': 'form-select'}),
             'warehouse': forms.Select(attrs={'class': 'form-select'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
             'customer': forms.TextInput(attrs={'class': 'form-control'}),
@@ -35,26 +100,18 @@ class StockOutForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['product'].queryset = Product.objects.all()
-        self.fields['warehouse'].queryset = Warehouse.objects.all()
+        self.fields['product'] = ProductSearchField()
+        self.fields['warehouse'] = CatalogChoiceField('warehouses', Warehouse, widget=self.fields['warehouse'].widget)
     
     def clean(self):
         cleaned_data = super().clean()
         product = cleaned_data.get('product')
+        warehouse = cleaned_data.get('warehouse')
         quantity = cleaned_data.get('quantity')
         
-        if product and quantity:
-            # Calculate current stock
-            from django.db.models import Sum
-            total_in = StockIn.objects.filter(product=product).aggregate(
-                total=Sum('quantity')
-            )['total'] or 0
-            
-            total_out = StockOut.objects.filter(product=product).aggregate(
-                total=Sum('quantity')
-            )['total'] or 0
-            
-            current_stock = total_in - total_out
+        if product and warehouse and quantity:
+            # Early feedback only; the save re-checks atomically
+            current_stock = product.get_stock_by_warehouse(warehouse)
             
             if quantity > current_stock:
                 raise forms.ValidationError(
@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from warehouse.benchmarks import DataSize, mixed_workload, seed
+
+PROFILES = ['default', 'production']
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure read/write throughput of concurrent stock-in writers and report readers '
+        'with the default and the production SQLite profile (STOCK_DB_PROFILE). '
+        'Each profile runs in its own process on a throwaway database file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='200x6x6000', help='PRODUCTSxWAREHOUSESxMOVEMENTS to seed')
+        parser.add_argument('--seconds', type=float, default=5, help='Length of each run')
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads')
+        parser.add_argument('--readers', type=int, default=4, help='Reader threads')
+        parser.add_argument('--profile', action='append', choices=PROFILES, help='Only run these profiles')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        # Set in the child process that runs one profile
+        parser.add_argument('--run', action='store_true', help='Run in this process against the configured database')
+
+    def handle(self, *args, **options):
+        try:
+            size = DataSize.parse(options['size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['run']:
+            return self.run_here(size, options)
+
+        results = {}
+        for profile in options['profile'] or PROFILES:
+            self.stdout.write(f'Running {profile} profile ({size}, {options["seconds"]:g}s) ...')
+            results[profile] = self.run_profile(profile, options)
+            self.stdout.write(f'  journal_mode={results[profile]["journal_mode"]}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{options["writers"]} writers + {options["readers"]} readers, {options["seconds"]:g}s'
+        ))
+        self.stdout.write(
+            f'{"profile":12} {"kind":7} {"ops/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"locked":>7}'
+        )
+        for profile, result in results.items():
+            for kind in ('writes', 'reads'):
+                row = result[kind]
+                self.stdout.write(
+                    f'{profile:12} {kind:7} {row["ops_per_sec"]:>8.1f} {row["p50_ms"] or 0:>8.2f} '
+                    f'{row["p99_ms"] or 0:>8.2f} {row["errors"]:>7}'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'size': str(size), 'options': {
+                    key: options[key] for key in ('seconds', 'writers', 'readers')
+                }, 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'\nResults written to {options["output"]}'))
+
+    def run_profile(self, profile, options):
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, STOCK_DB_PROFILE=profile, STOCK_DB_NAME=os.path.join(directory, 'bench.sqlite3'))
+            command = [
+                sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_mixed_workload', '--run',
+                '--size', options['size'], '--seconds', str(options['seconds']),
+                '--writers', str(options['writers']), '--readers', str(options['readers']),
+            ]
+            finished = subprocess.run(command, env=env, capture_output=True, text=True)
+        if finished.returncode != 0:
+            raise CommandError(f'{profile} run failed:\n{finished.stderr}')
+        return json.loads(finished.stdout.strip().splitlines()[-1])
+
+    def run_here(self, size, options):
+        if 'STOCK_DB_NAME' not in os.environ:
+            raise CommandError('--run only works on a throwaway database named by STOCK_DB_NAME')
+        call_command('migrate', verbosity=0)
+        products, warehouses = seed(size)
+        result = mixed_workload(
+            products, warehouses, options['seconds'], options['writers'], options['readers']
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            result['journal_mode'] = cursor.fetchone()[0]
+        self.stdout.write(json.dumps(result))
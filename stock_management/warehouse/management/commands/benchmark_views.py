@@ -0,0 +1,119 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from warehouse.benchmarks import DataSize, latency_benchmark, query_growth, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every view and API endpoint against seeded data and record SQL query counts. '
+        'Runs on a throwaway test database, never on the real one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', action='append', dest='sizes',
+            help='PRODUCTSxWAREHOUSESxMOVEMENTS, may be repeated (default: 20x3x300 and 200x6x6000)',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Requests per view (median is reported)')
+        parser.add_argument('--warm-cache', action='store_true', help='Do not clear the cache between requests')
+        parser.add_argument(
+            '--latency', type=int, default=0, metavar='N',
+            help='Also compare p50/p99 of the sync and async report views over N requests each',
+        )
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent requests for --latency')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--compare', help='Previous JSON results to compare against')
+        parser.add_argument(
+            '--fail-on-growth', action='store_true',
+            help='Exit with an error if any view runs more queries on a larger data set',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [DataSize.parse(text) for text in (options['sizes'] or ['20x3x300', '200x6x6000'])]
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results, latency = {}, {}
+            for size in sizes:
+                self.stdout.write(f'Seeding and measuring {size} ...')
+                results[str(size)] = run_benchmarks(
+                    size, repeat=options['repeat'], cold_cache=not options['warm_cache']
+                )
+                if options['latency']:
+                    latency[str(size)] = latency_benchmark(
+                        options['latency'], options['concurrency'], cold_cache=not options['warm_cache']
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        previous = self.load(options['compare']) if options['compare'] else None
+        for size, size_results in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{size}'))
+            self.stdout.write(f'{"view":32} {"queries":>8} {"median ms":>10} {"max ms":>9}')
+            for name, result in size_results.items():
+                line = f'{name:32} {result["queries"]:>8} {result["median_ms"]:>10.2f} {result["max_ms"]:>9.2f}'
+                before = (previous or {}).get('results', {}).get(size, {}).get(name)
+                if before:
+                    line += (
+                        f'   (was {before["queries"]} q, {before["median_ms"]:.2f} ms; '
+                        f'{result["median_ms"] - before["median_ms"]:+.2f} ms)'
+                    )
+                self.stdout.write(line)
+
+        for size, size_latency in latency.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'\n{size} latency, {options["latency"]} requests x {options["concurrency"]} concurrent'
+            ))
+            self.stdout.write(f'{"view":20} {"sync p50":>9} {"sync p99":>9} {"async p50":>10} {"async p99":>10}')
+            for name, result in size_latency.items():
+                self.stdout.write(
+                    f'{name:20} {result["sync"]["p50_ms"]:>9.2f} {result["sync"]["p99_ms"]:>9.2f} '
+                    f'{result["async"]["p50_ms"]:>10.2f} {result["async"]["p99_ms"]:>10.2f}'
+                )
+
+        if options['output']:
+            payload = {
+                'meta': {
+                    'created': timezone.now().isoformat(),
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                    'database': connection.vendor,
+                    'repeat': options['repeat'],
+                    'cold_cache': not options['warm_cache'],
+                },
+                'results': results,
+            }
+            if latency:
+                payload['latency'] = latency
+            with open(options['output'], 'w') as f:
+                json.dump(payload, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'\nResults written to {options["output"]}'))
+
+        grown = query_growth(results) if len(results) > 1 else []
+        if grown:
+            message = f'Query count grows with data size for: {", ".join(grown)}'
+            if options['fail_on_growth']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        elif len(results) > 1:
+            self.stdout.write(self.style.SUCCESS('Query counts are constant across data sizes'))
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
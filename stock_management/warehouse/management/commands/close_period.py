@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from warehouse.models import StockCheckpoint
+from warehouse.services.checkpoints import checkpoint_drift, close_period
+from warehouse.services.report_cache import bump_movement_sequence
+
+
+class Command(BaseCommand):
+    help = (
+        'Record closing stock balances per product and warehouse at the end of a cutoff date, '
+        'so balance and as-of queries only sum movements after it'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('cutoff_date', nargs='?', help='Last day of the period (YYYY-MM-DD)')
+        parser.add_argument('--replace', action='store_true', help='Recompute an already closed period')
+        parser.add_argument('--notes', default='', help='Note stored on the checkpoint')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Compare stored checkpoints (or the given one) with the full movement history, do not write',
+        )
+    
+    def handle(self, *args, **options):
+        cutoff_date = None
+        if options['cutoff_date']:
+            cutoff_date = parse_date(options['cutoff_date'])
+            if cutoff_date is None:
+                raise CommandError(f"'{options['cutoff_date']}' is not a date (use YYYY-MM-DD)")
+        
+        if options['check']:
+            checkpoints = StockCheckpoint.objects.order_by('cutoff_date')
+            if cutoff_date:
+                checkpoints = checkpoints.filter(cutoff_date=cutoff_date)
+            stale = 0
+            for checkpoint in checkpoints:
+                drift = checkpoint_drift(checkpoint)
+                for product_id, warehouse_id, have, want in drift:
+                    self.stdout.write(
+                        f'{checkpoint.cutoff_date} product={product_id} warehouse={warehouse_id}: '
+                        f'stored {have}, expected {want}'
+                    )
+                stale += bool(drift)
+            if stale:
+                self.stdout.write(self.style.WARNING(
+                    f'{stale} checkpoint(s) out of step; re-close them with --replace, oldest first'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS('All checkpoints match the movement history'))
+            return
+        
+        if cutoff_date is None:
+            raise CommandError('cutoff_date is required unless --check is given')
+        try:
+            checkpoint = close_period(cutoff_date, notes=options['notes'], replace=options['replace'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['replace']:
+            # Replaced closing balances change as-of stock reports already cached
+            bump_movement_sequence()
+        self.stdout.write(self.style.SUCCESS(
+            f'Closed period at {checkpoint.cutoff_date}: {checkpoint.balances.count()} closing balance(s)'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from warehouse.services.replenishment import CHUNK_PRODUCTS, compute_replenishment
+from warehouse.services.report_cache import bump_movement_sequence
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute demand velocity, reorder points and order suggestions for every product from the '
+        'issue history (whole catalog at once with NumPy, per product without). Run daily, e.g. from cron.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_PRODUCTS, help='Products loaded and written per chunk'
+        )
+    
+    def handle(self, *args, **options):
+        def progress(done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {done} product(s) planned')
+        
+        summary = compute_replenishment(chunk_products=options['chunk_size'], progress=progress)
+        bump_movement_sequence()
+        self.stdout.write(self.style.SUCCESS(
+            f"Planned {summary['products']} product(s) in {summary['seconds']}s: "
+            f"{summary['with_demand']} with demand, {summary['to_order']} at or below their reorder point"
+        ))
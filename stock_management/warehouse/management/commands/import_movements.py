@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from warehouse.services.movement_import import DEFAULT_CHUNK_SIZE, import_movements
+
+
+class Command(BaseCommand):
+    help = 'Bulk import stock-in/stock-out lines from a CSV file'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='CSV file: type,sku,warehouse,quantity,party,reference_no[,date,notes,unit_cost] '
+                 '(unit_cost is the price paid per unit, stock-in lines only)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--user', help='Username recorded as received_by/issued_by')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+        parser.add_argument('--max-errors', type=int, default=50, help='How many line errors to print')
+    
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+        
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+                report = import_movements(
+                    stream, user=user, chunk_size=options['chunk_size'], dry_run=options['dry_run']
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+        
+        for line_no, message in report.errors[:options['max_errors']]:
+            self.stderr.write(f'line {line_no}: {message}')
+        if len(report.errors) > options['max_errors']:
+            self.stderr.write(f'... and {len(report.errors) - options["max_errors"]} more error(s)')
+        
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{report.rows} row(s) read, {report.created_in} in / {report.created_out} out imported, '
+            f'{len(report.errors)} error(s) in {report.elapsed:.2f}s ({report.rows_per_sec:.0f} rows/sec)'
+        ))
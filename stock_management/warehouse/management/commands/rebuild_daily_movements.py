@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from warehouse.models import DailyMovement
+from warehouse.services.report_cache import bump_movement_sequence
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the DailyMovement rollup from StockIn/StockOut, optionally for a date range only'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='first_day', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='last_day', help='Last day to rebuild (YYYY-MM-DD)')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report rollup rows that differ from the movement history, do not write',
+        )
+    
+    def parse_day(self, value):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"'{value}' is not a date (use YYYY-MM-DD)")
+        return day
+    
+    def handle(self, *args, **options):
+        first_day = self.parse_day(options['first_day'])
+        last_day = self.parse_day(options['last_day'])
+        
+        if options['check']:
+            expected = DailyMovement.compute_totals(first_day, last_day)
+            stored_rows = DailyMovement.objects.all()
+            if first_day:
+                stored_rows = stored_rows.filter(day__gte=first_day)
+            if last_day:
+                stored_rows = stored_rows.filter(day__lte=last_day)
+            stored = {
+                (row[0], row[1], row[2]): tuple(row[3:])
+                for row in stored_rows.values_list('day', 'product_id', 'warehouse_id', *DailyMovement.FIELDS)
+            }
+            empty = (0, 0, 0, 0)
+            drift = [
+                (key, stored.get(key, empty), expected.get(key, empty))
+                for key in set(expected) | set(stored)
+                if stored.get(key, empty) != expected.get(key, empty)
+            ]
+            for (day, product_id, warehouse_id), have, want in sorted(drift):
+                self.stdout.write(
+                    f'{day} product={product_id} warehouse={warehouse_id}: stored {have}, expected {want}'
+                )
+            if drift:
+                self.stdout.write(self.style.WARNING(f'{len(drift)} rollup row(s) out of step'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Daily rollup matches the movement history'))
+            return
+        
+        count = DailyMovement.rebuild(first_day, last_day)
+        bump_movement_sequence()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} daily movement row(s)'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from warehouse.models import StockBalance
+from warehouse.services.report_cache import bump_movement_sequence
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the StockBalance table from the full StockIn/StockOut history'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report balances that differ from the movement history, do not write',
+        )
+        parser.add_argument(
+            '--full-history',
+            action='store_true',
+            help='Sum every movement instead of starting from the latest period-close checkpoint',
+        )
+    
+    def handle(self, *args, **options):
+        if options['check']:
+            expected = StockBalance.compute_totals(options['full_history'])
+            stored = {
+                (row['product_id'], row['warehouse_id']): row['quantity']
+                for row in StockBalance.objects.values('product_id', 'warehouse_id', 'quantity')
+            }
+            drift = [
+                (key, stored.get(key, 0), expected.get(key, 0))
+                for key in set(expected) | set(stored)
+                if stored.get(key, 0) != expected.get(key, 0)
+            ]
+            for (product_id, warehouse_id), have, want in sorted(drift):
+                self.stdout.write(
+                    f'product={product_id} warehouse={warehouse_id}: stored {have}, expected {want}'
+                )
+            if drift:
+                self.stdout.write(self.style.WARNING(f'{len(drift)} balance(s) out of step'))
+            else:
+                self.stdout.write(self.style.SUCCESS('All balances match the movement history'))
+            return
+        
+        count = StockBalance.rebuild(options['full_history'])
+        bump_movement_sequence()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} stock balance(s)'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from warehouse.services.report_cache import bump_movement_sequence
+from warehouse.services.valuation import revalue
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the inventory cost state (weighted average and FIFO layers) by replaying every '
+        'movement. Streams the history, so memory does not grow with the number of movements.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Movements fetched per database round trip')
+    
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        
+        def progress(done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {done} pair(s) valued ({time.monotonic() - started:.1f}s)')
+        
+        count = revalue(chunk_size=options['chunk_size'], progress=progress)
+        bump_movement_sequence()
+        self.stdout.write(self.style.SUCCESS(
+            f'Revalued {count} product/warehouse pair(s) in {time.monotonic() - started:.1f}s'
+        ))
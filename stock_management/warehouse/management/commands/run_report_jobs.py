@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from warehouse.services.report_jobs import POLL_SECONDS, run_jobs, worker_count
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued report exports in the background on a pool of worker threads. '
+        'Keep it running next to the web server (systemd, supervisor), or use --once from cron.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Jobs run at once (default REPORT_JOB_WORKERS)'
+        )
+        parser.add_argument(
+            '--once', action='store_true', help='Run what is queued, then exit'
+        )
+        parser.add_argument(
+            '--poll', type=float, default=POLL_SECONDS, help='Seconds between looks at the queue'
+        )
+    
+    def handle(self, *args, **options):
+        workers = options['workers'] or worker_count()
+        
+        def progress(job):
+            if options['verbosity'] > 0:
+                line = f'Job #{job.pk} {job.report} ({job.export_format}): {job.status}'
+                if job.error:
+                    self.stdout.write(self.style.ERROR(f'{line} - {job.error}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{line}, {job.row_count} row(s)'))
+        
+        if options['verbosity'] > 0:
+            self.stdout.write(f'Running report jobs on {workers} worker(s)')
+        try:
+            run_jobs(workers=workers, once=options['once'], poll_seconds=options['poll'], progress=progress)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
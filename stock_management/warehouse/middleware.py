@@ -0,0 +1,64 @@
+# warehouse/middleware.py
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .services.instrumentation import end_profile, slow_request_ms, start_profile
+
+logger = logging.getLogger('warehouse.performance')
+
+
+class PerformanceMiddleware:
+    """
+    Profile every request: query count, SQL time, slowest statements with
+    their call sites, template time and total time.
+    
+    The numbers go out as a Server-Timing header (browser dev tools show them
+    under Timing) when PERF_SERVER_TIMING is on or the user is staff. Requests
+    slower than PERF_SLOW_REQUEST_MS, and requests that repeat one statement
+    PERF_DUPLICATE_QUERY_THRESHOLD or more times, are logged as one JSON line
+    on the 'warehouse.performance' logger. Streaming responses are measured
+    up to the first byte.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, token = start_profile()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_profile(token)
+        self.report(request, response, profile, getattr(request, 'user', None))
+        return response
+    
+    async def __acall__(self, request):
+        profile, token = start_profile()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_profile(token)
+        # request.user is lazy and would query the session synchronously here
+        user = None
+        if not getattr(settings, 'PERF_SERVER_TIMING', False) and hasattr(request, 'auser'):
+            user = await request.auser()
+        self.report(request, response, profile, user)
+        return response
+    
+    def report(self, request, response, profile, user=None):
+        total_ms = profile.elapsed_ms()
+        duplicates = profile.duplicates()
+        if getattr(settings, 'PERF_SERVER_TIMING', False) or (user is not None and user.is_staff):
+            response['Server-Timing'] = profile.server_timing(total_ms, duplicates)
+        if total_ms >= slow_request_ms():
+            logger.warning('slow_request %s', profile.log_line(request, response, total_ms, duplicates))
+        elif duplicates:
+            logger.warning('duplicate_queries %s', profile.log_line(request, response, total_ms, duplicates))
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_balances(apps, schema_editor):
+    StockIn = apps.get_model('warehouse', 'StockIn')
+    StockOut = apps.get_model('warehouse', 'StockOut')
+    StockBalance = apps.get_model('warehouse', 'StockBalance')
+    
+    totals = {}
+    for row in StockIn.objects.order_by().values('product_id', 'warehouse_id').annotate(total=Sum('quantity')):
+        key = (row['product_id'], row['warehouse_id'])
+        totals[key] = totals.get(key, 0) + row['total']
+    for row in StockOut.objects.order_by().values('product_id', 'warehouse_id').annotate(total=Sum('quantity')):
+        key = (row['product_id'], row['warehouse_id'])
+        totals[key] = totals.get(key, 0) - row['total']
+    
+    StockBalance.objects.bulk_create([
+        StockBalance(product_id=product_id, warehouse_id=warehouse_id, quantity=quantity)
+        for (product_id, warehouse_id), quantity in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='warehouse.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='warehouse.warehouse')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'warehouse'), name='unique_stock_balance')],
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
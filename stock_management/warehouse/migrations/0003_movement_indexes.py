@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0002_stockbalance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockin',
+            index=models.Index(fields=['product', 'warehouse', 'date_received'], name='stockin_prod_wh_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockin',
+            index=models.Index(fields=['date_received', 'id'], name='stockin_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockout',
+            index=models.Index(fields=['product', 'warehouse', 'date_issued'], name='stockout_prod_wh_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockout',
+            index=models.Index(fields=['date_issued', 'id'], name='stockout_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_movements(apps, schema_editor):
+    StockIn = apps.get_model('warehouse', 'StockIn')
+    StockOut = apps.get_model('warehouse', 'StockOut')
+    DailyMovement = apps.get_model('warehouse', 'DailyMovement')
+    
+    totals = {}
+    for model, date_field, offset in ((StockIn, 'date_received', 0), (StockOut, 'date_issued', 1)):
+        rows = model.objects.order_by().annotate(day=TruncDate(date_field)).values(
+            'day', 'product_id', 'warehouse_id'
+        ).annotate(quantity=Sum('quantity'), lines=Count('id'))
+        for row in rows:
+            key = (row['day'], row['product_id'], row['warehouse_id'])
+            values = totals.setdefault(key, [0, 0, 0, 0])
+            values[offset] += row['quantity']
+            values[offset + 2] += row['lines']
+    
+    DailyMovement.objects.bulk_create([
+        DailyMovement(
+            day=day, product_id=product_id, warehouse_id=warehouse_id,
+            qty_in=values[0], qty_out=values[1], lines_in=values[2], lines_out=values[3]
+        )
+        for (day, product_id, warehouse_id), values in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0004_stocktransfer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('qty_in', models.IntegerField(default=0)),
+                ('qty_out', models.IntegerField(default=0)),
+                ('lines_in', models.IntegerField(default=0)),
+                ('lines_out', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_movements', to='warehouse.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_movements', to='warehouse.warehouse')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['product', 'day'], name='dailymove_product_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'product', 'warehouse'), name='unique_daily_movement')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_movements, migrations.RunPython.noop),
+    ]
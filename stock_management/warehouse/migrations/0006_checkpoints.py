@@ -0,0 +1,42 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0005_dailymovement'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cutoff_date', models.DateField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('notes', models.TextField(blank=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-cutoff_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClosingBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closing_balances', to='warehouse.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closing_balances', to='warehouse.warehouse')),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='warehouse.stockcheckpoint')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('checkpoint', 'product', 'warehouse'), name='unique_closing_balance')],
+            },
+        ),
+    ]
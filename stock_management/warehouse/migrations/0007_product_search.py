@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:40
+
+from django.db import migrations
+
+
+FTS_TABLE = 'warehouse_product_fts'
+
+CREATE_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "sku, name, content='warehouse_product', content_rowid='id', "
+    "tokenize=\"unicode61 remove_diacritics 2 tokenchars '-_./'\", prefix='1 2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON warehouse_product BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, sku, name) VALUES (new.id, new.sku, new.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON warehouse_product BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF sku, name ON warehouse_product BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name); "
+    f"INSERT INTO {FTS_TABLE}(rowid, sku, name) VALUES (new.id, new.sku, new.name); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only; other databases search with plain lookups
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0006_checkpoints'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0007_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockin',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('received_at', models.DateTimeField()),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('remaining', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='warehouse.product')),
+                ('stockin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='warehouse.stockin')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='warehouse.warehouse')),
+            ],
+            options={
+                'ordering': ['received_at', 'id'],
+                'indexes': [models.Index(fields=['product', 'warehouse', 'received_at', 'id'], name='costlayer_fifo_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockValuation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('average_cost', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('fifo_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('valued_through', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valuations', to='warehouse.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valuations', to='warehouse.warehouse')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'warehouse'), name='unique_stock_valuation')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0008_valuation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplenishmentPlan',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='replenishment', serialize=False, to='warehouse.product')),
+                ('daily_demand', models.FloatField(default=0)),
+                ('demand_std', models.FloatField(default=0)),
+                ('history_days', models.IntegerField(default=0)),
+                ('safety_stock', models.IntegerField(default=0)),
+                ('reorder_point', models.IntegerField(default=0)),
+                ('order_up_to', models.IntegerField(default=0)),
+                ('stock', models.IntegerField(default=0)),
+                ('days_of_cover', models.FloatField(blank=True, null=True)),
+                ('suggested_quantity', models.IntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0009_replenishment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report', models.CharField(max_length=30)),
+                ('export_format', models.CharField(default='csv', max_length=10)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('key', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Inasubiri'), ('running', 'Inatengenezwa'), ('done', 'Tayari'), ('failed', 'Imeshindwa')], default='pending', max_length=10)),
+                ('request_count', models.PositiveIntegerField(default=1)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('row_count', models.IntegerField(blank=True, null=True)),
+                ('result_file', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='reportjob_status_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('key',), name='unique_active_report_job')],
+            },
+        ),
+    ]
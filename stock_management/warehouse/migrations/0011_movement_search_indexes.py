@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:20
+
+from django.db import migrations
+
+
+# Case-insensitive indexes for the admin's prefix searches (istartswith is
+# LIKE 'x%' on SQLite, which only uses an index with NOCASE collation)
+INDEXES = {
+    'stockin_supplier_nocase_idx': ('warehouse_stockin', 'supplier'),
+    'stockin_reference_nocase_idx': ('warehouse_stockin', 'reference_no'),
+    'stockout_customer_nocase_idx': ('warehouse_stockout', 'customer'),
+    'stockout_reference_nocase_idx': ('warehouse_stockout', 'reference_no'),
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, (table, column) in INDEXES.items():
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column} COLLATE NOCASE)")
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0010_reportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
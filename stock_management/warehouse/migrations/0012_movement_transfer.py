@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_transfer_lines(apps, schema_editor):
+    # Lines written before the link existed are found by their document reference and warehouse
+    StockTransfer = apps.get_model('warehouse', 'StockTransfer')
+    StockIn = apps.get_model('warehouse', 'StockIn')
+    StockOut = apps.get_model('warehouse', 'StockOut')
+    for transfer in StockTransfer.objects.order_by('pk').iterator():
+        number = f"TRF-{transfer.pk:06d}-"
+        StockOut.objects.filter(
+            reference_no__startswith=number, reference_no__endswith='-OUT', warehouse_id=transfer.from_warehouse_id,
+        ).update(transfer=transfer)
+        StockIn.objects.filter(
+            reference_no__startswith=number, reference_no__endswith='-IN', warehouse_id=transfer.to_warehouse_id,
+        ).update(transfer=transfer)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0011_movement_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockin',
+            name='transfer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stockins', to='warehouse.stocktransfer'),
+        ),
+        migrations.AddField(
+            model_name='stockout',
+            name='transfer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stockouts', to='warehouse.stocktransfer'),
+        ),
+        migrations.RunPython(link_transfer_lines, migrations.RunPython.noop),
+    ]
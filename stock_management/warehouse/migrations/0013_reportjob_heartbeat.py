@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0012_movement_transfer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
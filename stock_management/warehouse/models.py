@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Sum, Count, F, Q, Case, When
+from django.db.models.functions import TruncDate
+from .services.periods import day_range
+from django.core.exceptions import ValidationError
+from decimal import Decimal
 
 # ========== CATEGORY ==========
 class Category(models.Model):
@@ -49,49 +53,326 @@ class Product(models.Model):
     
     def get_stock_by_warehouse(self, warehouse):
         """Get current stock for this product in specific warehouse"""
-        total_in = StockIn.objects.filter(
-            product=self, 
+        return StockBalance.objects.filter(
+            product=self,
             warehouse=warehouse
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-        
-        total_out = StockOut.objects.filter(
-            product=self, 
-            warehouse=warehouse
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-        
-        return total_in - total_out
+        ).values_list('quantity', flat=True).first() or 0
     
     def get_total_stock(self):
         """Get total stock across all warehouses"""
-        total_in = StockIn.objects.filter(product=self).aggregate(
+        return StockBalance.objects.filter(product=self).aggregate(
             total=Sum('quantity')
         )['total'] or 0
+
+# ========== STOCK BALANCE ==========
+class StockBalance(models.Model):
+    """Current stock per (product, warehouse), kept in step with every movement"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='balances')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='balances')
+    quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'warehouse'], name='unique_stock_balance'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} @ {self.warehouse.name}: {self.quantity}"
+    
+    @classmethod
+    def apply(cls, product_id, warehouse_id, delta):
+        """Add delta to the (product, warehouse) balance, creating the row if needed"""
+        if not delta:
+            return
+        updated = cls.objects.filter(
+            product_id=product_id,
+            warehouse_id=warehouse_id
+        ).update(quantity=F('quantity') + delta, updated_at=timezone.now())
+        if not updated:
+            balance, created = cls.objects.get_or_create(
+                product_id=product_id,
+                warehouse_id=warehouse_id,
+                defaults={'quantity': delta}
+            )
+            if not created:
+                cls.objects.filter(pk=balance.pk).update(
+                    quantity=F('quantity') + delta, updated_at=timezone.now()
+                )
+    
+    @classmethod
+    def take(cls, product_id, warehouse_id, quantity):
+        """
+        Decrement the balance only if it still holds `quantity`.
         
-        total_out = StockOut.objects.filter(product=self).aggregate(
-            total=Sum('quantity')
-        )['total'] or 0
+        Check and decrement are one conditional UPDATE, so two concurrent
+        issues cannot both pass the check. Returns True on success.
+        """
+        return cls.objects.filter(
+            product_id=product_id,
+            warehouse_id=warehouse_id,
+            quantity__gte=quantity
+        ).update(quantity=F('quantity') - quantity, updated_at=timezone.now()) == 1
+    
+    @classmethod
+    def compute_totals(cls, full_history=False):
+        """
+        Derive {(product_id, warehouse_id): quantity} from the movements.
         
-        return total_in - total_out
+        Starts from the latest StockCheckpoint and sums only the movements
+        after its cutoff, unless full_history is set.
+        """
+        totals = {}
+        stockins = StockIn.objects.order_by()
+        stockouts = StockOut.objects.order_by()
+        checkpoint = None if full_history else StockCheckpoint.objects.order_by('-cutoff_date').first()
+        if checkpoint:
+            for product_id, warehouse_id, quantity in checkpoint.balances.values_list(
+                'product_id', 'warehouse_id', 'quantity'
+            ):
+                totals[(product_id, warehouse_id)] = quantity
+            since = day_range(checkpoint.cutoff_date)[1]
+            stockins = stockins.filter(date_received__gte=since)
+            stockouts = stockouts.filter(date_issued__gte=since)
+        for row in stockins.values('product_id', 'warehouse_id').annotate(total=Sum('quantity')):
+            key = (row['product_id'], row['warehouse_id'])
+            totals[key] = totals.get(key, 0) + row['total']
+        for row in stockouts.values('product_id', 'warehouse_id').annotate(total=Sum('quantity')):
+            key = (row['product_id'], row['warehouse_id'])
+            totals[key] = totals.get(key, 0) - row['total']
+        return totals
+    
+    @classmethod
+    def rebuild(cls, full_history=False):
+        """Replace every balance row with totals recomputed from StockIn/StockOut"""
+        with transaction.atomic():
+            totals = cls.compute_totals(full_history)
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(product_id=product_id, warehouse_id=warehouse_id, quantity=quantity)
+                for (product_id, warehouse_id), quantity in totals.items()
+            ], batch_size=1000)
+        return len(totals)
+    
+    @classmethod
+    def apply_many(cls, deltas):
+        """Apply a {(product_id, warehouse_id): delta} mapping in bulk, e.g. after bulk_create"""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            existing = {
+                (balance.product_id, balance.warehouse_id): balance
+                for balance in cls.objects.only('id', 'product_id', 'warehouse_id').filter(
+                    product_id__in={key[0] for key in deltas},
+                    warehouse_id__in={key[1] for key in deltas},
+                )
+            }
+            # Relative increments in one UPDATE, so concurrent writers are not overwritten
+            increments = {}
+            to_create = []
+            for (product_id, warehouse_id), delta in deltas.items():
+                balance = existing.get((product_id, warehouse_id))
+                if balance:
+                    increments[balance.pk] = delta
+                else:
+                    to_create.append(cls(product_id=product_id, warehouse_id=warehouse_id, quantity=delta))
+            pks = list(increments)
+            for start in range(0, len(pks), 500):
+                batch = pks[start:start + 500]
+                cls.objects.filter(pk__in=batch).update(
+                    quantity=Case(
+                        *[When(pk=pk, then=F('quantity') + increments[pk]) for pk in batch],
+                        default=F('quantity')
+                    ),
+                    updated_at=now
+                )
+            cls.objects.bulk_create(to_create, batch_size=500)
+
+
+# ========== DAILY MOVEMENT ROLLUP ==========
+class DailyMovement(models.Model):
+    """Stock in/out totals per local day, product and warehouse, kept in step with every movement"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_movements')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='daily_movements')
+    qty_in = models.IntegerField(default=0)
+    qty_out = models.IntegerField(default=0)
+    lines_in = models.IntegerField(default=0)
+    lines_out = models.IntegerField(default=0)
+    
+    FIELDS = ('qty_in', 'qty_out', 'lines_in', 'lines_out')
+    
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product', 'warehouse'], name='unique_daily_movement'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'day'], name='dailymove_product_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.product.name} @ {self.warehouse.name}: +{self.qty_in} -{self.qty_out}"
+    
+    @classmethod
+    def add_movement(cls, deltas, is_in, product_id, warehouse_id, date, quantity, sign=1):
+        """Add one movement's contribution (or take it away with sign=-1) to a deltas mapping"""
+        key = (timezone.localdate(date), product_id, warehouse_id)
+        change = (quantity, 0, 1, 0) if is_in else (0, quantity, 0, 1)
+        current = deltas.get(key, (0, 0, 0, 0))
+        deltas[key] = tuple(have + sign * value for have, value in zip(current, change))
+        return deltas
+    
+    @classmethod
+    def apply_many(cls, deltas):
+        """Apply a {(day, product_id, warehouse_id): (qty_in, qty_out, lines_in, lines_out)} mapping"""
+        deltas = {key: values for key, values in deltas.items() if any(values)}
+        if not deltas:
+            return
+        with transaction.atomic():
+            existing = {
+                (row.day, row.product_id, row.warehouse_id): row.pk
+                for row in cls.objects.order_by().only('id', 'day', 'product_id', 'warehouse_id').filter(
+                    day__in={key[0] for key in deltas},
+                    product_id__in={key[1] for key in deltas},
+                    warehouse_id__in={key[2] for key in deltas},
+                )
+            }
+            increments, to_create = {}, []
+            for key, values in deltas.items():
+                if key in existing:
+                    increments[existing[key]] = values
+                else:
+                    to_create.append(cls(
+                        day=key[0], product_id=key[1], warehouse_id=key[2], **dict(zip(cls.FIELDS, values))
+                    ))
+            pks = list(increments)
+            for start in range(0, len(pks), 500):
+                batch = pks[start:start + 500]
+                cls.objects.filter(pk__in=batch).update(**{
+                    field: Case(
+                        *[When(pk=pk, then=F(field) + increments[pk][i]) for pk in batch],
+                        default=F(field)
+                    )
+                    for i, field in enumerate(cls.FIELDS)
+                })
+            cls.objects.bulk_create(to_create, batch_size=500)
+    
+    @classmethod
+    def compute_totals(cls, first_day=None, last_day=None):
+        """Derive the rollup {(day, product_id, warehouse_id): values} from StockIn/StockOut"""
+        totals = {}
+        for model, date_field, offset in ((StockIn, 'date_received', 0), (StockOut, 'date_issued', 1)):
+            queryset = model.objects.order_by()
+            if first_day:
+                queryset = queryset.filter(**{f'{date_field}__gte': day_range(first_day)[0]})
+            if last_day:
+                queryset = queryset.filter(**{f'{date_field}__lt': day_range(last_day)[1]})
+            rows = queryset.annotate(day=TruncDate(date_field)).values(
+                'day', 'product_id', 'warehouse_id'
+            ).annotate(quantity=Sum('quantity'), lines=Count('id'))
+            for row in rows:
+                key = (row['day'], row['product_id'], row['warehouse_id'])
+                values = list(totals.get(key, (0, 0, 0, 0)))
+                values[offset] += row['quantity']
+                values[offset + 2] += row['lines']
+                totals[key] = tuple(values)
+        return totals
+    
+    @classmethod
+    def rebuild(cls, first_day=None, last_day=None):
+        """Replace rollup rows (optionally only for first_day..last_day) with recomputed totals"""
+        with transaction.atomic():
+            totals = cls.compute_totals(first_day, last_day)
+            stale = cls.objects.all()
+            if first_day:
+                stale = stale.filter(day__gte=first_day)
+            if last_day:
+                stale = stale.filter(day__lte=last_day)
+            stale.delete()
+            cls.objects.bulk_create([
+                cls(day=day, product_id=product_id, warehouse_id=warehouse_id, **dict(zip(cls.FIELDS, values)))
+                for (day, product_id, warehouse_id), values in totals.items()
+            ], batch_size=1000)
+        return len(totals)
+
+
+class MovementBalanceMixin:
+    """Keeps StockBalance and DailyMovement in step when a movement row is saved.
+    
+    Subclasses set BALANCE_SIGN to +1 (stock in) or -1 (stock out). Deletes
+    (including queryset and cascade deletes) are handled by the post_delete
+    receiver in signals.py.
+    """
+    BALANCE_SIGN = 1
+    DATE_FIELD = 'date_received'
+    
+    def add_to_rollup(self, deltas, sign=1):
+        """Add this row's DailyMovement contribution to a deltas mapping"""
+        return DailyMovement.add_movement(
+            deltas, self.BALANCE_SIGN > 0, self.product_id, self.warehouse_id,
+            getattr(self, self.DATE_FIELD), self.quantity, sign
+        )
+    
+    def _save_with_balance(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = type(self).objects.filter(pk=self.pk).values(
+                    'product_id', 'warehouse_id', 'quantity', self.DATE_FIELD
+                ).first()
+            # Read by the valuation receiver in signals.py
+            self._previous_movement = previous
+            super().save(*args, **kwargs)
+            rollup = {}
+            if previous:
+                StockBalance.apply(
+                    previous['product_id'],
+                    previous['warehouse_id'],
+                    -self.BALANCE_SIGN * previous['quantity']
+                )
+                DailyMovement.add_movement(
+                    rollup, self.BALANCE_SIGN > 0, previous['product_id'], previous['warehouse_id'],
+                    previous[self.DATE_FIELD], previous['quantity'], sign=-1
+                )
+            StockBalance.apply(self.product_id, self.warehouse_id, self.BALANCE_SIGN * self.quantity)
+            DailyMovement.apply_many(self.add_to_rollup(rollup))
+
 
 # ========== STOCK IN ==========
-class StockIn(models.Model):
+class StockIn(MovementBalanceMixin, models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stockins')
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='stockins')
     quantity = models.IntegerField()
     supplier = models.CharField(max_length=200)
     reference_no = models.CharField(max_length=100, unique=True)
     date_received = models.DateTimeField(default=timezone.now)
+    # What was paid per unit; receipts without it are valued at the product's unit_price
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     received_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     notes = models.TextField(blank=True)
+    # Set on the incoming line of a stock transfer
+    transfer = models.ForeignKey(
+        'StockTransfer', on_delete=models.PROTECT, null=True, blank=True, related_name='stockins'
+    )
     
     class Meta:
         ordering = ['-date_received']
+        indexes = [
+            models.Index(fields=['product', 'warehouse', 'date_received'], name='stockin_prod_wh_date_idx'),
+            models.Index(fields=['date_received', 'id'], name='stockin_date_id_idx'),
+        ]
     
     def __str__(self):
         return f"IN: {self.product.name} - {self.quantity} @ {self.warehouse.name}"
+    
+    def save(self, *args, **kwargs):
+        self._save_with_balance(*args, **kwargs)
 
 # ========== STOCK OUT ==========
-class StockOut(models.Model):
+class StockOut(MovementBalanceMixin, models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stockouts')
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='stockouts')
     quantity = models.IntegerField()
@@ -100,21 +381,222 @@ class StockOut(models.Model):
     date_issued = models.DateTimeField(default=timezone.now)
     issued_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     notes = models.TextField(blank=True)
+    # Set on the outgoing line of a stock transfer, which moves stock rather than consumes it
+    transfer = models.ForeignKey(
+        'StockTransfer', on_delete=models.PROTECT, null=True, blank=True, related_name='stockouts'
+    )
+    
+    BALANCE_SIGN = -1
+    DATE_FIELD = 'date_issued'
     
     class Meta:
         ordering = ['-date_issued']
+        indexes = [
+            models.Index(fields=['product', 'warehouse', 'date_issued'], name='stockout_prod_wh_date_idx'),
+            models.Index(fields=['date_issued', 'id'], name='stockout_date_id_idx'),
+        ]
     
     def __str__(self):
         return f"OUT: {self.product.name} - {self.quantity} @ {self.warehouse.name}"
     
     def save(self, *args, **kwargs):
         """Check stock availability before saving"""
-        if not self.pk:  # Only for new records
-            current_stock = self.product.get_stock_by_warehouse(self.warehouse)
-            if self.quantity > current_stock:
-                from django.core.exceptions import ValidationError
+        if self.pk:
+            self._save_with_balance(*args, **kwargs)
+            return
+        with transaction.atomic():
+            # Reserve and decrement in one conditional UPDATE; nothing can slip in between
+            if not StockBalance.take(self.product_id, self.warehouse_id, self.quantity):
+                current_stock = self.product.get_stock_by_warehouse(self.warehouse)
                 raise ValidationError(
                     f"Hakuna stock ya kutosha kwenye {self.warehouse.name}!\n"
                     f"Stock iliyopo: {current_stock}, unajaribu kutoa: {self.quantity}"
                 )
-        super().save(*args, **kwargs)
\ No newline at end of file
+            super().save(*args, **kwargs)
+            DailyMovement.apply_many(self.add_to_rollup({}))
+
+# ========== INVENTORY VALUATION ==========
+class StockValuation(models.Model):
+    """
+    Cost state per (product, warehouse), maintained by services/valuation.py.
+    
+    `average_cost` is the moving weighted average; `fifo_value` is the sum of
+    the open CostLayer rows. `valued_through` is the date of the latest
+    movement applied, so an earlier-dated movement triggers a replay.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='valuations')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='valuations')
+    quantity = models.IntegerField(default=0)
+    average_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    fifo_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    valued_through = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'warehouse'], name='unique_stock_valuation'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} @ {self.warehouse.name}: {self.quantity} x {self.average_cost}"
+    
+    @property
+    def average_value(self):
+        return (self.quantity * self.average_cost).quantize(Decimal('0.01'))
+
+
+class CostLayer(models.Model):
+    """An open FIFO layer: what is left of one receipt and what it cost"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_layers')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='cost_layers')
+    stockin = models.ForeignKey('StockIn', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    received_at = models.DateTimeField()
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2)
+    remaining = models.IntegerField()
+    
+    class Meta:
+        ordering = ['received_at', 'id']
+        indexes = [
+            models.Index(fields=['product', 'warehouse', 'received_at', 'id'], name='costlayer_fifo_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} @ {self.warehouse.name}: {self.remaining} x {self.unit_cost}"
+
+# ========== REPLENISHMENT ==========
+class ReplenishmentPlan(models.Model):
+    """
+    Demand-based reorder point of a product, over all warehouses, written by
+    services/replenishment.py for the whole catalog at once.
+    
+    `daily_demand` and `demand_std` are the mean and standard deviation of
+    units issued per day (transfers excluded) over `history_days`. Products
+    without demand in that window keep their reorder_level.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='replenishment')
+    daily_demand = models.FloatField(default=0)
+    demand_std = models.FloatField(default=0)
+    history_days = models.IntegerField(default=0)
+    safety_stock = models.IntegerField(default=0)
+    reorder_point = models.IntegerField(default=0)
+    order_up_to = models.IntegerField(default=0)
+    stock = models.IntegerField(default=0)
+    days_of_cover = models.FloatField(null=True, blank=True)
+    suggested_quantity = models.IntegerField(default=0)
+    computed_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.daily_demand:.2f}/siku, reorder {self.reorder_point}"
+
+# ========== STOCK TRANSFER ==========
+class StockTransfer(models.Model):
+    """Transfer document; its lines are StockOut/StockIn pairs pointing back at it, referenced as <number>-<line>-OUT/IN"""
+    from_warehouse = models.ForeignKey(Warehouse, on_delete=models.PROTECT, related_name='transfers_out')
+    to_warehouse = models.ForeignKey(Warehouse, on_delete=models.PROTECT, related_name='transfers_in')
+    created_at = models.DateTimeField(default=timezone.now)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    notes = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.number}: {self.from_warehouse.name} -> {self.to_warehouse.name}"
+    
+    @property
+    def number(self):
+        """Document number, unique because it is derived from the primary key"""
+        return f"TRF-{self.pk:06d}"
+    
+    def line_reference(self, line_no, direction):
+        return f"{self.number}-{line_no:03d}-{direction}"
+
+# ========== PERIOD CLOSE ==========
+class StockCheckpoint(models.Model):
+    """Period close: closing balances per (product, warehouse) at the end of cutoff_date"""
+    cutoff_date = models.DateField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    notes = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-cutoff_date']
+    
+    def __str__(self):
+        return f"Checkpoint {self.cutoff_date}"
+
+
+class ClosingBalance(models.Model):
+    checkpoint = models.ForeignKey(StockCheckpoint, on_delete=models.CASCADE, related_name='balances')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='closing_balances')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='closing_balances')
+    quantity = models.IntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['checkpoint', 'product', 'warehouse'], name='unique_closing_balance'),
+        ]
+    
+    def __str__(self):
+        return f"{self.checkpoint.cutoff_date} {self.product.name} @ {self.warehouse.name}: {self.quantity}"
+
+# ========== REPORT JOBS ==========
+class ReportJob(models.Model):
+    """
+    A report export queued from a report page and generated in the
+    background by `manage.py run_report_jobs` (services/report_jobs.py).
+    
+    `key` identifies the report, format and parameters; at most one pending
+    or running job may hold a key, so identical requests share one job.
+    The finished file lives under REPORT_JOB_DIR at `result_file`.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Inasubiri'),
+        (RUNNING, 'Inatengenezwa'),
+        (DONE, 'Tayari'),
+        (FAILED, 'Imeshindwa'),
+    ]
+    ACTIVE = [PENDING, RUNNING]
+    
+    report = models.CharField(max_length=30)
+    export_format = models.CharField(max_length=10, default='csv')
+    params = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    request_count = models.PositiveIntegerField(default=1)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Renewed by the runner while the job runs; an old one means the runner is gone
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    row_count = models.IntegerField(null=True, blank=True)
+    result_file = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='reportjob_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], condition=Q(status__in=['pending', 'running']), name='unique_active_report_job'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"#{self.pk} {self.report} ({self.export_format}): {self.get_status_display()}"
+    
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE
+    
+    @property
+    def filename(self):
+        return self.result_file.rsplit('/', 1)[-1]
@@ -0,0 +1,170 @@
+# warehouse/services/catalog.py
+"""
+Process-local cache of master data: products (with their category),
+warehouses and categories.
+
+These tables change a few times a day but are read on nearly every page
+(sidebar, form dropdowns, report headers). Each process keeps one loaded
+copy in memory. A version token in the shared Django cache says which copy
+is current: a write to Product/Category/Warehouse stores a new token (see
+signals.py) and every process reloads on its next read. If the token is
+missing (cache cleared or evicted) a new one is created, which also forces a
+reload, so a lost key can only cost a reload, never serve stale data.
+
+That token only reaches other processes through a shared cache backend
+(STOCK_CACHE_DIR). With the default per-process LocMem cache a write in one
+worker cannot tell the others, so there each loaded copy is also reloaded
+once it is older than CATALOG_MAX_AGE seconds: other workers see a change
+after at most that long instead of never.
+
+Objects handed out by the catalog are shared between requests and must be
+treated as read-only; `product()` / `warehouse()` return copies that are
+safe to attach to new rows.
+"""
+import copy
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import request_started
+from django.db import DatabaseError
+from django.utils import timezone
+
+from ..models import Category, Product, Warehouse
+
+VERSION_KEY = 'warehouse:catalog:version'
+
+_lock = threading.Lock()
+_current = None
+_stats = {'hits': 0, 'misses': 0, 'loaded_at': None}
+
+
+class Catalog:
+    """One loaded copy of the master tables"""
+
+    def __init__(self, version, products, warehouses, categories):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.products = products
+        self.warehouses = warehouses
+        self.categories = categories
+        self.products_by_id = {product.id: product for product in products}
+        self.products_by_sku = {product.sku: product for product in products}
+        self.warehouses_by_id = {warehouse.id: warehouse for warehouse in warehouses}
+        self.warehouses_by_code = {warehouse.code: warehouse for warehouse in warehouses if warehouse.code}
+
+
+def cache_is_shared():
+    """False when the default cache lives in this process only (a new version cannot reach other workers)"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def max_age():
+    """Seconds a loaded copy may be served without a version change; None with a shared cache"""
+    if cache_is_shared():
+        return None
+    return getattr(settings, 'CATALOG_MAX_AGE', 60)
+
+
+def is_current(loaded, version):
+    if loaded is None or loaded.version != version:
+        return False
+    limit = max_age()
+    return limit is None or time.monotonic() - loaded.loaded_at < limit
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY) or version
+    return version
+
+
+def _load(version):
+    return Catalog(
+        version,
+        products=list(Product.objects.select_related('category')),
+        warehouses=list(Warehouse.objects.all()),
+        categories=list(Category.objects.order_by('name')),
+    )
+
+
+def get_catalog():
+    """The current Catalog, reloaded when a write has bumped the version (or past max_age())"""
+    global _current
+    version = current_version()
+    loaded = _current
+    if is_current(loaded, version):
+        _stats['hits'] += 1
+        return loaded
+    with _lock:
+        if is_current(_current, version):
+            _stats['hits'] += 1
+            return _current
+        _stats['misses'] += 1
+        _current = _load(version)
+        _stats['loaded_at'] = timezone.now()
+        return _current
+
+
+def invalidate_catalog():
+    """Publish a new version so every process reloads on its next read"""
+    global _current
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    _current = None
+
+
+def catalog_stats():
+    total = _stats['hits'] + _stats['misses']
+    return {
+        'hits': _stats['hits'],
+        'misses': _stats['misses'],
+        'hit_ratio': round(_stats['hits'] / total, 4) if total else None,
+        'loaded_at': _stats['loaded_at'].isoformat() if _stats['loaded_at'] else None,
+        'version': _current.version if _current else None,
+        'products': len(_current.products) if _current else 0,
+        'warehouses': len(_current.warehouses) if _current else 0,
+        'categories': len(_current.categories) if _current else 0,
+    }
+
+
+def product(product_id):
+    """Copy of a cached product (None if unknown)"""
+    try:
+        found = get_catalog().products_by_id.get(int(product_id))
+    except (TypeError, ValueError):
+        return None
+    return copy.copy(found) if found else None
+
+
+def warehouse(warehouse_id):
+    """Copy of a cached warehouse (None if unknown)"""
+    try:
+        found = get_catalog().warehouses_by_id.get(int(warehouse_id))
+    except (TypeError, ValueError):
+        return None
+    return copy.copy(found) if found else None
+
+
+def _warm_on_first_request(sender, **kwargs):
+    request_started.disconnect(_warm_on_first_request, dispatch_uid='warehouse.catalog.warm')
+    try:
+        get_catalog()
+    except DatabaseError as e:
+        print(f"Catalog warm-up error: {e}")
+
+
+def schedule_warm_up():
+    """
+    Load the catalog when the first request starts.
+
+    Called from WarehouseConfig.ready(); querying inside ready() itself would
+    also run during migrate and test database setup, before the tables exist.
+    """
+    request_started.connect(_warm_on_first_request, dispatch_uid='warehouse.catalog.warm')
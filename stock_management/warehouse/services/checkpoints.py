@@ -0,0 +1,107 @@
+# warehouse/services/checkpoints.py
+"""
+Period-close checkpoints and as-of-date balances.
+
+Closing a period stores the balance of every (product, warehouse) at the end
+of the cutoff day as ClosingBalance rows. A balance "as of" any later day is
+then the nearest checkpoint plus the DailyMovement rollup rows after its
+cutoff, so the work is bounded by the time since the last close rather than
+by the whole history. Days before the first checkpoint are summed from the
+start of the rollup.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ..models import ClosingBalance, DailyMovement, StockCheckpoint, StockIn, StockOut
+from .periods import day_range
+
+
+def nearest_checkpoint(day, before=False):
+    """Latest checkpoint with cutoff on (or strictly before, with before=True) `day`"""
+    lookup = 'cutoff_date__lt' if before else 'cutoff_date__lte'
+    return StockCheckpoint.objects.filter(**{lookup: day}).order_by('-cutoff_date').first()
+
+
+def _narrow(queryset, products, warehouses):
+    if products is not None:
+        queryset = queryset.filter(product__in=products)
+    if warehouses is not None:
+        queryset = queryset.filter(warehouse__in=warehouses)
+    return queryset
+
+
+def _balances_from(checkpoint, day, products=None, warehouses=None):
+    cells = defaultdict(int)
+    movements = DailyMovement.objects.filter(day__lte=day)
+    if checkpoint:
+        closing = _narrow(ClosingBalance.objects.filter(checkpoint=checkpoint), products, warehouses)
+        for product_id, warehouse_id, quantity in closing.values_list('product_id', 'warehouse_id', 'quantity'):
+            cells[(product_id, warehouse_id)] += quantity
+        movements = movements.filter(day__gt=checkpoint.cutoff_date)
+    rows = _narrow(movements, products, warehouses).order_by().values(
+        'product_id', 'warehouse_id'
+    ).annotate(net=Sum(F('qty_in') - F('qty_out')))
+    for row in rows:
+        cells[(row['product_id'], row['warehouse_id'])] += row['net']
+    return {key: quantity for key, quantity in cells.items() if quantity}
+
+
+def balances_as_of(day, products=None, warehouses=None):
+    """
+    Stock per (product, warehouse) at the end of local day `day`.
+
+    Returns (cells, checkpoint) where cells is {(product_id, warehouse_id):
+    quantity} and checkpoint is the StockCheckpoint it started from (or None).
+    """
+    checkpoint = nearest_checkpoint(day)
+    return _balances_from(checkpoint, day, products, warehouses), checkpoint
+
+
+def close_period(cutoff_date, user=None, notes='', replace=False):
+    """
+    Record closing balances at the end of cutoff_date. Returns the checkpoint.
+
+    Raises ValueError for a day that has not finished yet, or for one that is
+    already closed unless replace is set.
+    """
+    if cutoff_date >= timezone.localdate():
+        raise ValueError(f'{cutoff_date} bado haijaisha; unaweza kufunga siku zilizopita tu')
+    with transaction.atomic():
+        existing = StockCheckpoint.objects.filter(cutoff_date=cutoff_date)
+        if existing.exists():
+            if not replace:
+                raise ValueError(f'kipindi {cutoff_date} kimeshafungwa (tumia replace)')
+            existing.delete()
+        cells = _balances_from(nearest_checkpoint(cutoff_date, before=True), cutoff_date)
+        checkpoint = StockCheckpoint.objects.create(cutoff_date=cutoff_date, created_by=user, notes=notes)
+        ClosingBalance.objects.bulk_create([
+            ClosingBalance(checkpoint=checkpoint, product_id=product_id, warehouse_id=warehouse_id, quantity=quantity)
+            for (product_id, warehouse_id), quantity in cells.items()
+        ], batch_size=1000)
+    return checkpoint
+
+
+def checkpoint_drift(checkpoint):
+    """[(product_id, warehouse_id, stored, expected)] where a checkpoint disagrees with the full movement history"""
+    end = day_range(checkpoint.cutoff_date)[1]
+    expected = defaultdict(int)
+    for model, date_field, sign in ((StockIn, 'date_received', 1), (StockOut, 'date_issued', -1)):
+        rows = model.objects.filter(**{f'{date_field}__lt': end}).order_by().values(
+            'product_id', 'warehouse_id'
+        ).annotate(total=Sum('quantity'))
+        for row in rows:
+            expected[(row['product_id'], row['warehouse_id'])] += sign * row['total']
+    stored = {
+        (product_id, warehouse_id): quantity
+        for product_id, warehouse_id, quantity in checkpoint.balances.values_list(
+            'product_id', 'warehouse_id', 'quantity'
+        )
+    }
+    return sorted(
+        (key[0], key[1], stored.get(key, 0), expected.get(key, 0))
+        for key in set(stored) | set(expected)
+        if stored.get(key, 0) != expected.get(key, 0)
+    )
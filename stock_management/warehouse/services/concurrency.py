@@ -0,0 +1,65 @@
+# warehouse/services/concurrency.py
+"""
+Run independent ORM queries of an async view at the same time.
+
+Django's database calls are synchronous, so an async view still has to hand
+each query to a thread. `gather_queries` runs a dict of zero-argument
+callables on one bounded, process-wide executor (REPORT_QUERY_WORKERS
+threads, default 4) and returns their results under the same keys. The bound
+keeps a burst of report requests from opening an unbounded number of
+database connections; each task closes its connection afterwards when
+CONN_MAX_AGE says it should, exactly like the end of a request.
+
+The queries fall back to running one after another on the request's own
+thread when concurrency is switched off (REPORT_QUERY_WORKERS <= 1) or when
+the caller is inside a transaction, because a query on another thread would
+use another connection and not see the transaction's writes.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+_lock = threading.Lock()
+_executor = {'pool': None}
+
+
+def worker_count():
+    return getattr(settings, 'REPORT_QUERY_WORKERS', 4)
+
+
+def executor():
+    """The shared executor, created on first use"""
+    with _lock:
+        if _executor['pool'] is None:
+            _executor['pool'] = ThreadPoolExecutor(max_workers=worker_count(), thread_name_prefix='report-query')
+        return _executor['pool']
+
+
+def _in_own_thread(fn):
+    def run():
+        try:
+            return fn()
+        finally:
+            close_old_connections()
+    return run
+
+
+def _run_all(tasks):
+    return {name: fn() for name, fn in tasks.items()}
+
+
+async def gather_queries(tasks):
+    """{name: fn} -> {name: fn()}, concurrently when it is safe to do so"""
+    in_transaction = await sync_to_async(lambda: connection.in_atomic_block)()
+    if worker_count() <= 1 or len(tasks) < 2 or in_transaction:
+        return await sync_to_async(_run_all)(tasks)
+    pool = executor()
+    results = await asyncio.gather(*(
+        sync_to_async(_in_own_thread(fn), thread_sensitive=False, executor=pool)()
+        for fn in tasks.values()
+    ))
+    return dict(zip(tasks, results))
@@ -0,0 +1,110 @@
+# warehouse/services/dashboard.py
+"""
+Cached dashboard KPI snapshot.
+
+The dashboard is polled by every open tab, so its numbers are computed once
+and kept in the Django cache. Any write to StockIn/StockOut/Product (and the
+other master tables shown on the page) drops the snapshot through the
+receivers in signals.py; the next viewer rebuilds it. The snapshot only holds
+plain dicts so it can live in any cache backend.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from ..models import StockIn, StockOut
+from .catalog import get_catalog
+from .concurrency import gather_queries
+from .periods import day_range
+from .stock_matrix import low_stock_products
+
+SNAPSHOT_KEY = 'warehouse:dashboard:snapshot'
+
+
+def snapshot_ttl():
+    """Upper bound on snapshot age, in case a write happens in another process"""
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 300)
+
+
+def _movement_row(movement, date_field):
+    return {
+        'product': {'id': movement.product_id, 'name': movement.product.name},
+        'warehouse': {'id': movement.warehouse_id, 'name': movement.warehouse.name},
+        'quantity': movement.quantity,
+        date_field: getattr(movement, date_field),
+    }
+
+
+def _today_total(model, date_field):
+    start, end = day_range(timezone.localdate())
+    return model.objects.filter(**{
+        f'{date_field}__gte': start, f'{date_field}__lt': end
+    }).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def _low_stock_rows():
+    return [{
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'current_stock': product.current_stock,
+        'reorder_level': product.reorder_point,
+        'category': product.category.name if product.category else '-'
+    } for product in low_stock_products(limit=10)]
+
+
+def _recent_rows(model, date_field):
+    latest = model.objects.select_related('product', 'warehouse').order_by(f'-{date_field}')[:5]
+    return [_movement_row(m, date_field) for m in latest]
+
+
+def snapshot_queries():
+    """The snapshot's independent queries as {key: callable}; none depends on another"""
+    return {
+        'catalog': get_catalog,
+        'today_stockins': lambda: _today_total(StockIn, 'date_received'),
+        'today_stockouts': lambda: _today_total(StockOut, 'date_issued'),
+        'low_stock_products': _low_stock_rows,
+        'recent_stockins': lambda: _recent_rows(StockIn, 'date_received'),
+        'recent_stockouts': lambda: _recent_rows(StockOut, 'date_issued'),
+    }
+
+
+def assemble_snapshot(results):
+    """Cacheable snapshot dict from the results of snapshot_queries()"""
+    catalog = results.pop('catalog')
+    return {
+        'date': timezone.localdate().isoformat(),
+        'total_products': len(catalog.products),
+        'total_categories': len(catalog.categories),
+        'total_warehouses': len(catalog.warehouses),
+        **results,
+    }
+
+
+def compute_dashboard_snapshot():
+    """Run the dashboard queries once and return a cacheable dict"""
+    return assemble_snapshot({key: fn() for key, fn in snapshot_queries().items()})
+
+
+def get_dashboard_snapshot():
+    """Return the cached snapshot, rebuilding it on a miss or after midnight"""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None or snapshot['date'] != timezone.localdate().isoformat():
+        snapshot = compute_dashboard_snapshot()
+        cache.set(SNAPSHOT_KEY, snapshot, snapshot_ttl())
+    return snapshot
+
+
+async def aget_dashboard_snapshot():
+    """get_dashboard_snapshot() for async views: a miss runs the queries concurrently"""
+    snapshot = await cache.aget(SNAPSHOT_KEY)
+    if snapshot is None or snapshot['date'] != timezone.localdate().isoformat():
+        snapshot = assemble_snapshot(await gather_queries(snapshot_queries()))
+        await cache.aset(SNAPSHOT_KEY, snapshot, snapshot_ttl())
+    return snapshot
+
+
+def invalidate_dashboard_snapshot():
+    cache.delete(SNAPSHOT_KEY)
@@ -0,0 +1,203 @@
+# warehouse/services/exports.py
+"""
+Server-side report exports.
+
+Each report is a header row plus a row generator that reads its querysets
+with .iterator(chunk_size=...), so rows flow from the database cursor to the
+client without the whole result being held in memory. CSV is streamed with
+StreamingHttpResponse; XLSX is written with openpyxl in write-only mode
+(rows go to disk, not memory) and then sent as a file. write_report() writes
+the same output to a file instead, for report jobs run in the background.
+"""
+import csv
+import heapq
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from ..models import StockIn, StockOut
+from .movement_summary import ReportPeriod
+from .replenishment import days_of_cover, plan_for
+from .stock_matrix import build_stock_matrix, low_stock_products, parse_as_of, suggested_order_quantity
+from .timeline import TimelineFilters
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer streaming"""
+
+    def write(self, value):
+        return value
+
+
+# ========== ROW SOURCES ==========
+def stock_rows(params):
+    matrix = build_stock_matrix(as_of=parse_as_of(params))
+    header = ['SKU', 'Bidhaa', 'Kategoria', 'Bei'] + [w.name for w in matrix.warehouses] + [
+        'Jumla', 'Thamani', 'Reorder Level'
+    ]
+
+    def rows():
+        for product in matrix.products:
+            total = matrix.total(product.id)
+            yield [
+                product.sku,
+                product.name,
+                product.category.name if product.category else '-',
+                product.unit_price,
+            ] + [matrix.stock(product.id, w.id) for w in matrix.warehouses] + [
+                total,
+                matrix.value(product.id),
+                product.reorder_level,
+            ]
+    return header, rows()
+
+
+def low_stock_rows(params):
+    header = [
+        'SKU', 'Bidhaa', 'Kategoria', 'Stock', 'Reorder Point', 'Mauzo kwa Siku', 'Siku za Kutosha',
+        'Kiasi Kinachohitajika', 'Thamani ya Oda',
+    ]
+
+    def rows():
+        for product in low_stock_products().iterator(chunk_size=CHUNK_SIZE):
+            plan = plan_for(product)
+            needed = suggested_order_quantity(product.current_stock, product.reorder_level, plan)
+            yield [
+                product.sku,
+                product.name,
+                product.category.name if product.category else '-',
+                product.current_stock,
+                product.reorder_point,
+                round(plan.daily_demand, 2) if plan else '',
+                days_of_cover(product.current_stock, plan),
+                needed,
+                needed * product.unit_price,
+            ]
+    return header, rows()
+
+
+MOVEMENT_HEADER = ['Aina', 'Tarehe', 'SKU', 'Bidhaa', 'Ghala', 'Idadi', 'Msambazaji/Mteja', 'Kumbukumbu']
+
+
+def movement_rows(stockins, stockouts):
+    """Merge stock-in and stock-out querysets into one newest-first stream"""
+    ins = stockins.order_by('-date_received', '-id').values_list(
+        'date_received', 'product__sku', 'product__name', 'warehouse__name', 'quantity', 'supplier', 'reference_no'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    outs = stockouts.order_by('-date_issued', '-id').values_list(
+        'date_issued', 'product__sku', 'product__name', 'warehouse__name', 'quantity', 'customer', 'reference_no'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+    merged = heapq.merge(
+        (('IN',) + row for row in ins),
+        (('OUT',) + row for row in outs),
+        key=lambda row: row[1],
+        reverse=True,
+    )
+    for kind, date, sku, name, warehouse, quantity, party, reference_no in merged:
+        yield [
+            kind, timezone.localtime(date).strftime('%Y-%m-%d %H:%M'),
+            sku, name, warehouse, quantity, party, reference_no,
+        ]
+
+
+def monthly_rows(params):
+    """Same period selection as the monthly report page"""
+    start, end = ReportPeriod.from_params(params).datetime_range()
+    return MOVEMENT_HEADER, movement_rows(
+        StockIn.objects.filter(date_received__gte=start, date_received__lt=end),
+        StockOut.objects.filter(date_issued__gte=start, date_issued__lt=end),
+    )
+
+
+def transaction_rows(params):
+    """Honours the same filters as the transaction timeline page"""
+    filters = TimelineFilters(params)
+    kinds = filters.kinds()
+    return MOVEMENT_HEADER, movement_rows(
+        filters.queryset('in') if 'in' in kinds else StockIn.objects.none(),
+        filters.queryset('out') if 'out' in kinds else StockOut.objects.none(),
+    )
+
+
+REPORTS = {
+    'stock': stock_rows,
+    'low-stock': low_stock_rows,
+    'monthly': monthly_rows,
+    'transactions': transaction_rows,
+}
+
+
+# ========== WRITERS ==========
+def csv_response(filename, header, rows):
+    writer = csv.writer(Echo())
+
+    def stream():
+        yield '\ufeff'  # BOM so Excel opens UTF-8 correctly
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def write_xlsx(output, filename, header, rows):
+    """Write rows with openpyxl's write-only workbook (raises ImportError if openpyxl is missing)"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=filename[:31])
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(output)
+
+
+def xlsx_response(filename, header, rows):
+    output = tempfile.TemporaryFile()
+    write_xlsx(output, filename, header, rows)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def export_filename(report):
+    return f"{report.replace('-', '_')}_{timezone.localdate():%Y%m%d}"
+
+
+def export_response(report, export_format, params):
+    """Build the download response for a report key from REPORTS"""
+    header, rows = REPORTS[report](params)
+    filename = export_filename(report)
+    if export_format == 'xlsx':
+        return xlsx_response(filename, header, rows)
+    return csv_response(filename, header, rows)
+
+
+def write_report(report, export_format, params, path):
+    """Write a report key from REPORTS to the file at `path`; returns the number of rows written"""
+    header, rows = REPORTS[report](params)
+    counted = {'rows': 0}
+
+    def counting():
+        for row in rows:
+            counted['rows'] += 1
+            yield row
+
+    if export_format == 'xlsx':
+        write_xlsx(path, export_filename(report), header, counting())
+    else:
+        with open(path, 'w', newline='', encoding='utf-8-sig') as output:
+            writer = csv.writer(output)
+            writer.writerow(header)
+            writer.writerows(counting())
+    return counted['rows']
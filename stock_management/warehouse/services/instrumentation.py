@@ -0,0 +1,184 @@
+# warehouse/services/instrumentation.py
+"""
+Per-request performance profile: SQL queries, template rendering and view time.
+
+PerformanceMiddleware (warehouse/middleware.py) opens a RequestProfile for
+each request in a context variable. Two hooks feed it:
+
+* `time_query` is installed as an execute wrapper on every database
+  connection when it is opened (see signals.py), so queries are recorded
+  whichever alias or thread runs them. Threads started through
+  sync_to_async (gather_queries) inherit the request's context and report
+  into the same profile.
+* TimedDjangoTemplates, the template backend in settings.TEMPLATES, times
+  each top-level render(); includes and fragments rendered inside it are
+  part of that time.
+
+Outside a request nothing is recorded and the hooks cost one context-variable
+lookup per query.
+"""
+import contextvars
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+SLOWEST_COUNT = 5
+MAX_RECORDED_QUERIES = 5000
+
+# '(%s, %s, %s)' and '(%s)' are the same statement for duplicate detection
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+# Frames that are never the call site: the profiler itself and the middleware around every request
+SKIPPED_FRAMES = (__file__, 'warehouse/middleware.py')
+
+_profile = contextvars.ContextVar('request_profile', default=None)
+
+
+def slow_request_ms():
+    return getattr(settings, 'PERF_SLOW_REQUEST_MS', 1000)
+
+
+def duplicate_threshold():
+    return getattr(settings, 'PERF_DUPLICATE_QUERY_THRESHOLD', 5)
+
+
+def query_signature(sql):
+    return WHITESPACE.sub(' ', IN_LIST.sub('(%s...)', sql)).strip()
+
+
+def call_site():
+    """'path/to/module.py:123 in function' of the innermost project frame running the query"""
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base) and 'site-packages' not in filename and not filename.endswith(SKIPPED_FRAMES):
+            return f'{filename[len(base) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ''
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.queries = []
+        self._template_depth = 0
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, elapsed_ms, site):
+        with self._lock:
+            self.query_count += 1
+            self.sql_ms += elapsed_ms
+            if len(self.queries) < MAX_RECORDED_QUERIES:
+                self.queries.append((sql, elapsed_ms, site))
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def slowest(self, count=SLOWEST_COUNT):
+        ordered = sorted(self.queries, key=lambda query: query[1], reverse=True)[:count]
+        return [{'sql': sql[:300], 'ms': round(ms, 2), 'site': site} for sql, ms, site in ordered]
+
+    def duplicates(self, threshold=None):
+        """Statements run `threshold` or more times in this request (N+1 loops), most repeated first"""
+        threshold = threshold or duplicate_threshold()
+        counts = Counter()
+        sites = {}
+        for sql, _, site in self.queries:
+            signature = query_signature(sql)
+            counts[signature] += 1
+            sites.setdefault(signature, set()).add(site)
+        return [
+            {'sql': signature[:300], 'count': count, 'sites': sorted(sites[signature])}
+            for signature, count in counts.most_common() if count >= threshold
+        ]
+
+    def server_timing(self, total_ms, duplicates=()):
+        parts = [
+            f'db;dur={self.sql_ms:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.template_ms:.1f}',
+            f'view;dur={total_ms:.1f}',
+        ]
+        if duplicates:
+            parts.append(f'dup;desc="{len(duplicates)} repeated queries"')
+        return ', '.join(parts)
+
+    def log_line(self, request, response, total_ms, duplicates):
+        return json.dumps({
+            'method': request.method,
+            'path': request.get_full_path()[:300],
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'total_ms': round(total_ms, 1),
+            'db_ms': round(self.sql_ms, 1),
+            'queries': self.query_count,
+            'template_ms': round(self.template_ms, 1),
+            'slowest': self.slowest(),
+            'duplicates': duplicates,
+        })
+
+
+def start_profile():
+    profile = RequestProfile()
+    return profile, _profile.set(profile)
+
+
+def end_profile(token):
+    _profile.reset(token)
+
+
+def current_profile():
+    return _profile.get()
+
+
+def time_query(execute, sql, params, many, context):
+    """Execute wrapper recording each statement in the current request's profile"""
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, (time.perf_counter() - started) * 1000, call_site())
+
+
+def install_query_timer(connection):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+# ========== TEMPLATE TIMING ==========
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = _profile.get()
+        if profile is None:
+            return super().render(context, request)
+        profile._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile._template_depth -= 1
+            if profile._template_depth == 0:
+                profile.template_ms += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time added to the request profile"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
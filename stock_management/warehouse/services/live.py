@@ -0,0 +1,283 @@
+# warehouse/services/live.py
+"""
+Live dashboard updates pushed over Server-Sent Events.
+
+Every committed StockIn/StockOut write turns into one compact event (today's
+in/out totals, the low-stock list when it changed, and the new movement
+rows), computed once by the writing process and fanned out to every open
+dashboard. Subscribers are asyncio queues owned by the ASGI event loop, so an
+idle connection costs a queue and a suspended coroutine, not a thread.
+
+Two transports decide how events reach the subscribers:
+
+* 'local' (default): the hub in this process delivers directly. Writes made
+  by another worker process are not seen, and no event is computed at all
+  while nobody in this process is listening.
+* 'cache': events are stored under a sequence number in the Django cache and
+  one poller task per process delivers them. With a cache shared between
+  workers this fans out across processes; it stands in for a real broker.
+
+A subscriber that falls too far behind gets a single 'resync' event and
+reloads its snapshot, so a slow client can never hold memory on the server.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import StockIn, StockOut
+from .catalog import get_catalog
+from .periods import day_range
+from .stock_matrix import low_stock_products
+
+QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+POLL_SECONDS = 0.5
+EVENT_TTL = 60
+SEQUENCE_KEY = 'warehouse:live:sequence'
+EVENT_KEY = 'warehouse:live:event:{}'
+LOW_STOCK_LIMIT = 10
+WSGI_RETRY_MS = 30000
+
+
+def transport():
+    return getattr(settings, 'LIVE_DASHBOARD_TRANSPORT', 'local')
+
+
+class BroadcastHub:
+    """Thread-safe fan-out of events to asyncio queues living on event loops"""
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._pollers = {}
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """New queue bound to the running loop; call from async code"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers[queue] = loop
+        if transport() == 'cache':
+            self._ensure_poller(loop)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def deliver(self, event):
+        """Hand an event to every subscriber (callable from any thread)"""
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Loop already closed: the connection is gone
+                self.unsubscribe(queue)
+
+    def _offer(self, queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({'type': 'resync'})
+
+    def _ensure_poller(self, loop):
+        with self._lock:
+            task = self._pollers.get(loop)
+            if task is None or task.done():
+                self._pollers[loop] = loop.create_task(self._poll_cache())
+
+    async def _poll_cache(self):
+        """Deliver events other processes stored in the cache; stops when the last subscriber leaves"""
+        seen = await cache.aget(SEQUENCE_KEY) or 0
+        while self._subscribers:
+            await asyncio.sleep(POLL_SECONDS)
+            latest = await cache.aget(SEQUENCE_KEY) or 0
+            if latest <= seen:
+                continue
+            keys = [EVENT_KEY.format(number) for number in range(seen + 1, latest + 1)]
+            stored = await cache.aget_many(keys)
+            for key in keys:
+                if key in stored:
+                    self.deliver(stored[key])
+            seen = latest
+
+
+hub = BroadcastHub()
+
+
+def publish(event):
+    """Send an event through the configured transport"""
+    if transport() == 'cache':
+        try:
+            number = cache.incr(SEQUENCE_KEY)
+        except ValueError:
+            cache.add(SEQUENCE_KEY, 0, None)
+            number = cache.incr(SEQUENCE_KEY)
+        event['id'] = number
+        cache.set(EVENT_KEY.format(number), event, EVENT_TTL)
+    else:
+        hub.deliver(event)
+
+
+def is_listened():
+    """False only when an event could not reach anyone, so building it can be skipped"""
+    return transport() == 'cache' or hub.subscriber_count > 0
+
+
+# ========== EVENT PAYLOADS ==========
+_last_low_stock = {'signature': None}
+
+
+def today_totals():
+    start, end = day_range(timezone.localdate())
+    return {
+        'today_stockins': StockIn.objects.filter(
+            date_received__gte=start, date_received__lt=end
+        ).aggregate(total=Sum('quantity'))['total'] or 0,
+        'today_stockouts': StockOut.objects.filter(
+            date_issued__gte=start, date_issued__lt=end
+        ).aggregate(total=Sum('quantity'))['total'] or 0,
+    }
+
+
+def low_stock_rows():
+    return [{
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'current_stock': product.current_stock,
+        'reorder_level': product.reorder_point,
+        'url': reverse('product_detail', args=[product.id]),
+    } for product in low_stock_products(limit=LOW_STOCK_LIMIT)]
+
+
+def movement_row(kind, movement):
+    """Compact row for a StockIn ('in') or StockOut ('out'); names come from the catalog"""
+    catalog = get_catalog()
+    product = catalog.products_by_id.get(movement.product_id)
+    warehouse = catalog.warehouses_by_id.get(movement.warehouse_id)
+    moved_at = movement.date_received if kind == 'in' else movement.date_issued
+    return {
+        'kind': kind,
+        'product': product.name if product else '',
+        'warehouse': warehouse.name if warehouse else '',
+        'quantity': movement.quantity,
+        'time': timezone.localtime(moved_at).strftime('%d/%m %H:%M'),
+    }
+
+
+def recent_rows(limit=5):
+    rows = []
+    for kind, model, date_field in (('in', StockIn, 'date_received'), ('out', StockOut, 'date_issued')):
+        latest = model.objects.order_by(f'-{date_field}')[:limit]
+        rows.extend(movement_row(kind, movement) for movement in latest)
+    return rows
+
+
+def build_event(movements=(), recent=False):
+    """
+    Delta event after a committed write.
+
+    `low_stock` is only included when the list differs from the last one this
+    process published; with recent=True the full recent lists are resent
+    (used after bulk writes and deletes) instead of individual new rows.
+    """
+    event = {'type': 'update', **today_totals()}
+    low_stock = low_stock_rows()
+    signature = tuple((row['id'], row['current_stock']) for row in low_stock)
+    if signature != _last_low_stock['signature']:
+        _last_low_stock['signature'] = signature
+        event['low_stock'] = low_stock
+    if recent:
+        event['recent'] = recent_rows()
+    else:
+        event['movements'] = list(movements)
+    return event
+
+
+def snapshot_event(snapshot):
+    """Initial event for a new connection, from the cached dashboard snapshot"""
+    return {
+        'type': 'snapshot',
+        'today_stockins': snapshot['today_stockins'],
+        'today_stockouts': snapshot['today_stockouts'],
+        'low_stock': [{
+            'id': row['id'],
+            'name': row['name'],
+            'sku': row['sku'],
+            'current_stock': row['current_stock'],
+            'reorder_level': row['reorder_level'],
+            'url': reverse('product_detail', args=[row['id']]),
+        } for row in snapshot['low_stock_products']],
+        'recent': [
+            _snapshot_row(kind, row, date_field)
+            for kind, key, date_field in (
+                ('in', 'recent_stockins', 'date_received'),
+                ('out', 'recent_stockouts', 'date_issued'),
+            )
+            for row in snapshot[key]
+        ],
+    }
+
+
+def _snapshot_row(kind, row, date_field):
+    return {
+        'kind': kind,
+        'product': row['product']['name'],
+        'warehouse': row['warehouse']['name'],
+        'quantity': row['quantity'],
+        'time': timezone.localtime(row[date_field]).strftime('%d/%m %H:%M'),
+    }
+
+
+def publish_movement(kind, movement):
+    """on_commit hook for a single saved movement"""
+    if is_listened():
+        publish(build_event([movement_row(kind, movement)]))
+
+
+def publish_refresh():
+    """on_commit hook for bulk writes (imports, transfers) and deletes"""
+    if is_listened():
+        publish(build_event(recent=True))
+
+
+def format_event(event):
+    """One SSE frame"""
+    lines = []
+    if event.get('id'):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(first_event, heartbeat=HEARTBEAT_SECONDS):
+    """SSE frames for one connection: the snapshot, then live events and heartbeats"""
+    queue = hub.subscribe()
+    try:
+        yield f"retry: 5000\n{format_event(first_event)}"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        hub.unsubscribe(queue)
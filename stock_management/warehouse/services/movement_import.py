@@ -0,0 +1,242 @@
+# warehouse/services/movement_import.py
+"""
+Streaming bulk import of stock-in / stock-out lines from CSV.
+
+Expected columns (header row required, extra columns are ignored):
+
+    type,sku,warehouse,quantity,party,reference_no,date,notes,unit_cost
+
+`type` is "in" or "out", `warehouse` is the warehouse code, `party` is the
+supplier (in) or customer (out). `date`, `notes` and `unit_cost` (what was
+paid per unit, stock-in lines only) are optional.
+
+The file is read row by row and processed in chunks: SKUs and warehouse codes
+are resolved from in-memory maps, reference numbers and stock availability
+are checked per chunk with one query each, and valid lines are written with
+bulk_create together with their StockBalance and DailyMovement deltas in one
+transaction per chunk. Invalid lines are skipped and reported with their line
+number.
+"""
+import csv
+import time as clock
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from ..models import StockIn, StockOut, StockBalance, DailyMovement
+from .catalog import get_catalog
+from .dashboard import invalidate_dashboard_snapshot
+from .live import publish_refresh
+from .report_cache import bump_movement_sequence
+from .valuation import apply_movements
+
+DEFAULT_CHUNK_SIZE = 1000
+REQUIRED_COLUMNS = {'type', 'sku', 'warehouse', 'quantity', 'party', 'reference_no'}
+
+
+class ImportReport:
+    """Outcome of one import run"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created_in = 0
+        self.created_out = 0
+        self.errors = []  # [(line_no, message)]
+        self.elapsed = 0.0
+
+    @property
+    def created(self):
+        return self.created_in + self.created_out
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def _parse_date(value):
+    if not value:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"tarehe '{value}' si sahihi")
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class MovementImporter:
+    def __init__(self, user=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        catalog = get_catalog()
+        self.products = {sku: product.id for sku, product in catalog.products_by_sku.items()}
+        self.warehouses = {code: warehouse.id for code, warehouse in catalog.warehouses_by_code.items()}
+        self.balances = {}
+        self.seen_refs = {'in': set(), 'out': set()}
+
+    def run(self, stream):
+        """Import every line from a text stream and return an ImportReport"""
+        report = ImportReport()
+        started = clock.monotonic()
+        reader = csv.DictReader(stream)
+        missing = REQUIRED_COLUMNS - {name.strip().lower() for name in (reader.fieldnames or [])}
+        if missing:
+            report.errors.append((1, f"safu zinakosekana: {', '.join(sorted(missing))}"))
+            return report
+
+        chunk = []
+        for row in reader:
+            report.rows += 1
+            chunk.append((reader.line_num, {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}))
+            if len(chunk) >= self.chunk_size:
+                self._process_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            self._process_chunk(chunk, report)
+
+        if report.created and not self.dry_run:
+            transaction.on_commit(invalidate_dashboard_snapshot)
+            transaction.on_commit(publish_refresh)
+            transaction.on_commit(bump_movement_sequence)
+        report.errors.sort(key=lambda error: error[0])
+        report.elapsed = clock.monotonic() - started
+        return report
+
+    def _parse_line(self, row):
+        kind = row.get('type', '').lower()
+        if kind not in ('in', 'out'):
+            raise ValueError(f"aina '{row.get('type')}' si sahihi (tumia in/out)")
+        product_id = self.products.get(row['sku'])
+        if product_id is None:
+            raise ValueError(f"SKU '{row['sku']}' haipo")
+        warehouse_id = self.warehouses.get(row['warehouse'])
+        if warehouse_id is None:
+            raise ValueError(f"ghala '{row['warehouse']}' halipo")
+        try:
+            quantity = int(row['quantity'])
+        except ValueError:
+            raise ValueError(f"idadi '{row['quantity']}' si namba")
+        if quantity <= 0:
+            raise ValueError('idadi lazima iwe zaidi ya 0')
+        reference_no = row['reference_no']
+        if not reference_no:
+            raise ValueError('namba ya kumbukumbu inahitajika')
+        unit_cost = None
+        if kind == 'in' and row.get('unit_cost'):
+            try:
+                unit_cost = Decimal(row['unit_cost'])
+            except InvalidOperation:
+                raise ValueError(f"gharama '{row['unit_cost']}' si namba")
+            if unit_cost < 0:
+                raise ValueError('gharama haiwezi kuwa chini ya 0')
+        return {
+            'kind': kind,
+            'product_id': product_id,
+            'warehouse_id': warehouse_id,
+            'quantity': quantity,
+            'party': row['party'],
+            'reference_no': reference_no,
+            'date': _parse_date(row.get('date')),
+            'notes': row.get('notes', ''),
+            'unit_cost': unit_cost,
+        }
+
+    def _load_balances(self, keys):
+        missing = {key for key in keys if key not in self.balances}
+        if not missing:
+            return
+        for key in missing:
+            self.balances[key] = 0
+        rows = StockBalance.objects.filter(
+            product_id__in={key[0] for key in missing},
+            warehouse_id__in={key[1] for key in missing},
+        ).values_list('product_id', 'warehouse_id', 'quantity')
+        for product_id, warehouse_id, quantity in rows:
+            if (product_id, warehouse_id) in missing:
+                self.balances[(product_id, warehouse_id)] = quantity
+
+    def _process_chunk(self, chunk, report):
+        parsed = []
+        for line_no, row in chunk:
+            try:
+                line = self._parse_line(row)
+            except ValueError as e:
+                report.errors.append((line_no, str(e)))
+                continue
+            parsed.append((line_no, line))
+
+        # Reference numbers already in the database, one query per table
+        existing = {
+            'in': set(StockIn.objects.filter(
+                reference_no__in=[l['reference_no'] for _, l in parsed if l['kind'] == 'in']
+            ).values_list('reference_no', flat=True)),
+            'out': set(StockOut.objects.filter(
+                reference_no__in=[l['reference_no'] for _, l in parsed if l['kind'] == 'out']
+            ).values_list('reference_no', flat=True)),
+        }
+
+        with transaction.atomic():
+            if not self.dry_run:
+                # Earlier chunks are committed; re-read so other writers are seen too
+                self.balances = {}
+            self._load_balances({(l['product_id'], l['warehouse_id']) for _, l in parsed})
+            stockins, stockouts, deltas = [], [], {}
+            for line_no, line in parsed:
+                if line['reference_no'] in existing[line['kind']]:
+                    report.errors.append((line_no, f"namba ya kumbukumbu '{line['reference_no']}' tayari ipo"))
+                    continue
+                if line['reference_no'] in self.seen_refs[line['kind']]:
+                    report.errors.append((line_no, f"namba ya kumbukumbu '{line['reference_no']}' imerudiwa kwenye faili"))
+                    continue
+                key = (line['product_id'], line['warehouse_id'])
+                if line['kind'] == 'in':
+                    stockins.append(StockIn(
+                        product_id=key[0], warehouse_id=key[1], quantity=line['quantity'],
+                        supplier=line['party'], reference_no=line['reference_no'],
+                        date_received=line['date'], unit_cost=line['unit_cost'], received_by=self.user,
+                        notes=line['notes'],
+                    ))
+                    delta = line['quantity']
+                else:
+                    available = self.balances[key]
+                    if line['quantity'] > available:
+                        report.errors.append((
+                            line_no,
+                            f"stock haitoshi: iliyopo {available}, unajaribu kutoa {line['quantity']}"
+                        ))
+                        continue
+                    stockouts.append(StockOut(
+                        product_id=key[0], warehouse_id=key[1], quantity=line['quantity'],
+                        customer=line['party'], reference_no=line['reference_no'],
+                        date_issued=line['date'], issued_by=self.user, notes=line['notes'],
+                    ))
+                    delta = -line['quantity']
+                # Only a line that is written claims its reference number
+                self.seen_refs[line['kind']].add(line['reference_no'])
+                self.balances[key] += delta
+                deltas[key] = deltas.get(key, 0) + delta
+
+            if not self.dry_run:
+                StockIn.objects.bulk_create(stockins, batch_size=500)
+                StockOut.objects.bulk_create(stockouts, batch_size=500)
+                StockBalance.apply_many(deltas)
+                rollup = {}
+                for movement in stockins + stockouts:
+                    movement.add_to_rollup(rollup)
+                DailyMovement.apply_many(rollup)
+                apply_movements(stockins + stockouts)
+
+        report.created_in += len(stockins)
+        report.created_out += len(stockouts)
+
+
+def import_movements(stream, user=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """Import a CSV text stream of stock movements; see the module docstring for the format"""
+    return MovementImporter(user=user, chunk_size=chunk_size, dry_run=dry_run).run(stream)
@@ -0,0 +1,188 @@
+# warehouse/services/movement_series.py
+"""
+Movement time series of one product: in, out, net and running balance per bucket.
+
+Read from the DailyMovement rollup. The database truncates each rollup day
+to its bucket (day, week, month, quarter or year) and sums per bucket, so
+one query returns at most `max_points` rows however long the range is. The
+bucket is widened until the range fits in `max_points`; empty buckets are
+filled with zeros here so the balance line has no gaps. A range is at most
+MAX_DAYS long and within MIN_DATE..MAX_DATE; if even yearly buckets do not
+fit in `max_points`, only the latest `max_points` years are returned.
+
+The running balance starts from the balance at the end of the day before
+the range, taken from the nearest checkpoint plus the rollup
+(balances_as_of).
+"""
+from datetime import date, timedelta
+
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ..models import DailyMovement
+from .checkpoints import balances_as_of
+
+DEFAULT_DAYS = 90
+DEFAULT_POINTS = 120
+MAX_POINTS = 500
+MAX_DAYS = 366 * 20
+MIN_DATE = date(1900, 1, 1)
+MAX_DATE = date(2999, 12, 31)
+
+# Narrowest first; 'auto' takes the first one that fits in max_points
+BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+    'year': TruncYear,
+}
+BUCKET_ORDER = list(BUCKETS)
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket that `day` falls in"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    if bucket == 'quarter':
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    if bucket == 'year':
+        return date(day.year, 1, 1)
+    return day
+
+
+def next_bucket(start, bucket):
+    if bucket == 'day':
+        return start + timedelta(days=1)
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[bucket]
+    month = start.month - 1 + months
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def bucket_starts(first_day, last_day, bucket):
+    start = bucket_start(first_day, bucket)
+    while start <= last_day:
+        yield start
+        start = next_bucket(start, bucket)
+
+
+def bucket_count(first_day, last_day, bucket):
+    """Number of buckets covering first_day..last_day, without listing them"""
+    first, last = bucket_start(first_day, bucket), bucket_start(last_day, bucket)
+    if bucket == 'day':
+        return (last - first).days + 1
+    if bucket == 'week':
+        return (last - first).days // 7 + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    return months // {'month': 1, 'quarter': 3, 'year': 12}[bucket] + 1
+
+
+def fitting_bucket(first_day, last_day, requested='auto', max_points=DEFAULT_POINTS):
+    """`requested` (or the narrowest bucket for 'auto'), widened until the range fits in max_points"""
+    start = BUCKET_ORDER.index(requested) if requested in BUCKETS else 0
+    for bucket in BUCKET_ORDER[start:]:
+        if bucket_count(first_day, last_day, bucket) <= max_points:
+            return bucket
+    return BUCKET_ORDER[-1]
+
+
+class InvalidSeries(ValueError):
+    """A series parameter that cannot be used (shown to the caller as a 400)"""
+
+
+def _int_param(params, name, default):
+    try:
+        return int(params.get(name) or default)
+    except ValueError:
+        return default
+
+
+def _date_param(params, name):
+    """YYYY-MM-DD parameter clamped to MIN_DATE..MAX_DATE, None when absent"""
+    value = (params.get(name) or '').strip()
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise InvalidSeries(f'{name} si tarehe sahihi (YYYY-MM-DD): {value}')
+    return min(max(parsed, MIN_DATE), MAX_DATE)
+
+
+class SeriesRequest:
+    """Range, bucket and size of a series, built from a request's GET parameters"""
+
+    def __init__(self, first_day, last_day, bucket='auto', max_points=DEFAULT_POINTS):
+        if first_day > last_day:
+            first_day, last_day = last_day, first_day
+        last_day = min(max(last_day, MIN_DATE), MAX_DATE)
+        first_day = max(first_day, MIN_DATE, last_day - timedelta(days=MAX_DAYS - 1))
+        self.max_points = max(2, min(max_points, MAX_POINTS))
+        self.requested = bucket if bucket in BUCKETS else 'auto'
+        self.bucket = fitting_bucket(first_day, last_day, self.requested, self.max_points)
+        if bucket_count(first_day, last_day, self.bucket) > self.max_points:
+            # Only possible with yearly buckets: keep the latest max_points years
+            first_day = max(first_day, date(last_day.year - self.max_points + 1, 1, 1))
+        self.first_day = first_day
+        self.last_day = last_day
+
+    @classmethod
+    def from_params(cls, params, today=None):
+        """
+        date_from/date_to (without date_from: the `days` days up to date_to,
+        today by default), bucket, points. Raises InvalidSeries for a date
+        that is not a valid YYYY-MM-DD.
+        """
+        today = today or timezone.localdate()
+        last_day = _date_param(params, 'date_to') or today
+        days = min(max(_int_param(params, 'days', DEFAULT_DAYS), 1), MAX_DAYS)
+        first_day = _date_param(params, 'date_from') or max(last_day - timedelta(days=days - 1), MIN_DATE)
+        max_points = _int_param(params, 'points', DEFAULT_POINTS)
+        return cls(first_day, last_day, params.get('bucket') or 'auto', max_points)
+
+    def cache_parts(self):
+        return (self.first_day, self.last_day, self.bucket)
+
+
+def product_series(product, series, warehouse=None):
+    """
+    {'bucket', 'opening_balance', 'points': [{'date', 'in', 'out', 'net', 'balance'}, ...]}
+    for `product` (at one warehouse, or all of them) over the series range.
+    """
+    warehouses = [warehouse] if warehouse is not None else None
+    opening, _ = balances_as_of(series.first_day - timedelta(days=1), [product], warehouses)
+    balance = sum(opening.values())
+
+    rows = DailyMovement.objects.filter(
+        product=product, day__gte=series.first_day, day__lte=series.last_day,
+    )
+    if warehouse is not None:
+        rows = rows.filter(warehouse=warehouse)
+    totals = {
+        row['bucket']: (row['qty_in'], row['qty_out'])
+        for row in rows.order_by().annotate(bucket=BUCKETS[series.bucket]('day')).values('bucket').annotate(
+            qty_in=Sum('qty_in'), qty_out=Sum('qty_out'),
+        )
+    }
+
+    points = []
+    opening_balance = balance
+    for start in bucket_starts(series.first_day, series.last_day, series.bucket):
+        qty_in, qty_out = totals.get(start, (0, 0))
+        balance += qty_in - qty_out
+        points.append({
+            'date': start.isoformat(),
+            'in': qty_in,
+            'out': qty_out,
+            'net': qty_in - qty_out,
+            'balance': balance,
+        })
+    return {'bucket': series.bucket, 'opening_balance': opening_balance, 'points': points}
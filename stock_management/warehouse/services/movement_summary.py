@@ -0,0 +1,101 @@
+# warehouse/services/movement_summary.py
+"""
+Period movement summaries read from the DailyMovement rollup.
+
+A period is a calendar month (?year=&month=) or an inclusive date range
+(?date_from=&date_to=). Totals are one aggregate over the rollup rows of
+the period and the top products are one grouped, ordered and limited query,
+so the cost depends on days x active products, not on the number of
+movement lines.
+"""
+import calendar
+from datetime import date
+
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ..models import DailyMovement
+from .periods import date_span
+
+TOP_PRODUCTS = 10
+
+
+class ReportPeriod:
+    """Inclusive first_day..last_day, built from a request's GET parameters"""
+
+    def __init__(self, first_day, last_day, is_month=False):
+        if first_day > last_day:
+            first_day, last_day = last_day, first_day
+        self.first_day = first_day
+        self.last_day = last_day
+        self.is_month = is_month
+
+    @classmethod
+    def month(cls, year, month):
+        last = calendar.monthrange(year, month)[1]
+        return cls(date(year, month, 1), date(year, month, last), is_month=True)
+
+    @classmethod
+    def from_params(cls, params, today=None):
+        """date_from/date_to win over year/month; anything invalid falls back to the current month"""
+        today = today or timezone.localdate()
+        date_from = parse_date(params.get('date_from') or '')
+        date_to = parse_date(params.get('date_to') or '')
+        if date_from or date_to:
+            return cls(date_from or date_to.replace(day=1), date_to or today)
+        try:
+            year = int(params.get('year') or today.year)
+            month = int(params.get('month') or today.month)
+            return cls.month(year, month)
+        except ValueError:
+            return cls.month(today.year, today.month)
+
+    @property
+    def year(self):
+        return self.first_day.year
+
+    @property
+    def label(self):
+        if self.is_month:
+            return self.first_day.strftime('%B %Y')
+        return f"{self.first_day:%d/%m/%Y} - {self.last_day:%d/%m/%Y}"
+
+    @property
+    def name(self):
+        """Short name used in sentences, e.g. 'Hakuna shughuli mwezi <name>'"""
+        return self.first_day.strftime('%B') if self.is_month else self.label
+
+    def datetime_range(self):
+        """[start, end) aware datetimes for filtering the movement tables"""
+        return date_span(self.first_day, self.last_day)
+
+
+def period_rows(period):
+    return DailyMovement.objects.filter(day__gte=period.first_day, day__lte=period.last_day)
+
+
+def period_totals(period):
+    """{'qty_in', 'qty_out', 'lines_in', 'lines_out'} for the period, one query"""
+    return period_rows(period).aggregate(**{
+        field: Coalesce(Sum(field), 0) for field in DailyMovement.FIELDS
+    })
+
+
+def top_products(period, limit=TOP_PRODUCTS):
+    """Most active products of the period (in + out), ranked and limited in the database"""
+    rows = period_rows(period).order_by().values(
+        'product_id', 'product__name', 'product__sku'
+    ).annotate(
+        period_in=Sum('qty_in'),
+        period_out=Sum('qty_out'),
+        total=Sum(F('qty_in') + F('qty_out')),
+    ).filter(total__gt=0).order_by('-total', 'product__name')[:limit]
+    return [{
+        'name': row['product__name'],
+        'sku': row['product__sku'],
+        'monthly_in': row['period_in'],
+        'monthly_out': row['period_out'],
+        'total': row['total'],
+    } for row in rows]
@@ -0,0 +1,34 @@
+# warehouse/services/periods.py
+"""
+Local-time date ranges as [start, end) datetimes.
+
+Filtering `date_received__gte=start, date_received__lt=end` lets the database
+use an index on the date column, unlike `date_received__date=day`, which wraps
+the column in a function.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(day=None):
+    """[start, end) for one local calendar day (today by default)"""
+    day = day or timezone.localdate()
+    start = _start_of(day)
+    return start, _start_of(day + timedelta(days=1))
+
+
+def month_range(year, month):
+    """[start, end) for a local calendar month"""
+    first_day = date(year, month, 1)
+    next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return _start_of(first_day), _start_of(next_month)
+
+
+def date_span(first_day, last_day):
+    """[start, end) covering first_day..last_day inclusive"""
+    return _start_of(first_day), _start_of(last_day + timedelta(days=1))
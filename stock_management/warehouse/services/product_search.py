@@ -0,0 +1,184 @@
+# warehouse/services/product_search.py
+"""
+Prefix search over product SKUs and names for the typeahead pickers.
+
+On SQLite the search runs against an FTS5 index (warehouse_product_fts, an
+external-content table over warehouse_product with prefix indexes). Triggers
+on warehouse_product keep it in step with every write, including
+bulk_create and queryset.update(). Rebuilding a table in a migration drops
+its triggers on SQLite, so ensure_search_index() runs after every migrate
+and puts them back, re-indexing if anything was missing. The NOCASE
+indexes behind the admin's supplier/customer/reference searches (migration
+0011) are not in the migration state either, so the same pass recreates
+any that a rebuild of warehouse_stockin or warehouse_stockout dropped.
+
+On other databases the same matching rules are applied with istartswith
+lookups. Either way the query returns ids only; the product objects come
+from the in-process catalog.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from ..models import Product
+from .catalog import get_catalog
+
+FTS_TABLE = 'warehouse_product_fts'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+MAX_TERMS = 6
+MIN_RANKED_LENGTH = 3
+
+# Same token characters as the FTS tokenizer, so 'SUK-00' is one prefix term
+TERM = re.compile(r"[\w\-./]+")
+
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "sku, name, content='warehouse_product', content_rowid='id', "
+    "tokenize=\"unicode61 remove_diacritics 2 tokenchars '-_./'\", prefix='1 2 3')"
+)
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON warehouse_product BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, sku, name) VALUES (new.id, new.sku, new.name); END"
+    ),
+    f'{FTS_TABLE}_ad': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON warehouse_product BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name); END"
+    ),
+    f'{FTS_TABLE}_au': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF sku, name ON warehouse_product BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name); "
+        f"INSERT INTO {FTS_TABLE}(rowid, sku, name) VALUES (new.id, new.sku, new.name); END"
+    ),
+}
+
+# Case-insensitive indexes for the admin's prefix searches (istartswith is
+# LIKE 'x%' on SQLite, which only uses an index with NOCASE collation)
+MOVEMENT_SEARCH_INDEXES = {
+    'stockin_supplier_nocase_idx': ('warehouse_stockin', 'supplier'),
+    'stockin_reference_nocase_idx': ('warehouse_stockin', 'reference_no'),
+    'stockout_customer_nocase_idx': ('warehouse_stockout', 'customer'),
+    'stockout_reference_nocase_idx': ('warehouse_stockout', 'reference_no'),
+}
+
+
+def uses_fts(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def ensure_search_index(using='default'):
+    """Create the FTS table and triggers if missing; returns True if the index had to be rebuilt"""
+    if not uses_fts(using):
+        return False
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, 'warehouse_product') "
+            "OR (type = 'trigger' AND tbl_name = 'warehouse_product')",
+            [FTS_TABLE],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = ({FTS_TABLE} | set(TRIGGERS)) - existing
+        if 'warehouse_product' not in existing or not missing:
+            return False
+        cursor.execute(CREATE_TABLE)
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def ensure_movement_search_indexes(using='default'):
+    """Create any missing NOCASE movement search index; returns the names created"""
+    if not uses_fts(using):
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('index', 'table')")
+        existing = {row[0] for row in cursor.fetchall()}
+        created = []
+        for name, (table, column) in MOVEMENT_SEARCH_INDEXES.items():
+            if table in existing and name not in existing:
+                cursor.execute(f"CREATE INDEX {name} ON {table} ({column} COLLATE NOCASE)")
+                created.append(name)
+    return created
+
+
+def search_terms(text):
+    return [term.lower() for term in TERM.findall(text or '')][:MAX_TERMS]
+
+
+def _fts_match(terms):
+    # Every term must prefix-match a token of the SKU or the name
+    return ' AND '.join(f'"{term}"*' for term in terms)
+
+
+def _fts_ids(terms, limit, active_only=True):
+    # SKU hits rank higher. Very short input matches most of the catalogue, so it is not worth ranking.
+    match = _fts_match(terms)
+    ranked = sum(len(term) for term in terms) >= MIN_RANKED_LENGTH
+    order = f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), p.name " if ranked else ""
+    active = "AND p.is_active " if active_only else ""
+    with connections[router.db_for_read(Product)].cursor() as cursor:
+        cursor.execute(
+            f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} JOIN warehouse_product p ON p.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s {active}{order}LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _orm_filter(queryset, terms):
+    for term in terms:
+        queryset = queryset.filter(
+            Q(sku__istartswith=term) | Q(name__istartswith=term) | Q(name__icontains=f' {term}')
+        )
+    return queryset
+
+
+def _orm_ids(terms, limit, active_only=True):
+    queryset = Product.objects.filter(is_active=True) if active_only else Product.objects.all()
+    return list(_orm_filter(queryset, terms).order_by('name').values_list('id', flat=True)[:limit])
+
+
+def matching_product_ids(text, limit, active_only=True):
+    """Ids of products matching every term of `text`, best match first (no catalog lookup)"""
+    terms = search_terms(text)
+    if not terms:
+        return []
+    if uses_fts():
+        return _fts_ids(terms, limit, active_only)
+    return _orm_ids(terms, limit, active_only)
+
+
+def matching_products(text, active_only=True):
+    """All products matching every term of `text`, unranked and unevaluated (for use as a subquery)"""
+    terms = search_terms(text)
+    queryset = Product.objects.filter(is_active=True) if active_only else Product.objects.all()
+    if not terms:
+        return queryset.none()
+    if uses_fts():
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts_match(terms)])
+        )
+    return _orm_filter(queryset, terms)
+
+
+def search_products(text, limit=DEFAULT_LIMIT):
+    """Active products whose SKU/name words start with every term of `text`, best match first"""
+    limit = max(1, min(limit, MAX_LIMIT))
+    ids = matching_product_ids(text, limit)
+    if not ids:
+        return []
+    catalog = get_catalog()
+    found = {pk: catalog.products_by_id[pk] for pk in ids if pk in catalog.products_by_id}
+    if len(found) < len(ids):
+        # Written without signals (bulk_create), so not in the catalog yet
+        found.update(Product.objects.select_related('category').in_bulk([pk for pk in ids if pk not in found]))
+    products = [found[pk] for pk in ids if pk in found]
+    # A scanned or typed-in full SKU always comes first
+    exact = catalog.products_by_sku.get((text or '').strip())
+    if exact is not None and exact.is_active:
+        products = [exact] + [product for product in products if product.id != exact.id][:limit - 1]
+    return products
@@ -0,0 +1,306 @@
+# warehouse/services/replenishment.py
+"""
+Demand velocity, reorder points and order suggestions for the whole catalog.
+
+compute_replenishment() takes the units issued per product and local day
+over the last history_days complete days from the DailyMovement rollup (all
+warehouses), minus transfer lines (stock-outs linked to a StockTransfer),
+which move stock between warehouses rather than consume it. The database reduces that history to a sum and a sum
+of squares per product in one grouped pass; from there, with NumPy
+installed, everything is array arithmetic over the whole catalog at once,
+with no per-product query or loop:
+
+    daily_demand   mean units issued per day since the product's first
+                   movement, over at most history_days
+    demand_std     standard deviation of those daily totals, zero days included
+    safety_stock   z * demand_std * sqrt(lead_time_days)
+    reorder_point  daily_demand * lead_time_days + safety_stock
+    order_up_to    reorder_point + daily_demand * review_days
+    days_of_cover  stock / daily_demand
+    suggested      order_up_to - stock, when positive
+
+Products without demand in the window keep reorder_level as their reorder
+point and twice that as the order-up-to level, as before. The results are
+upserted into ReplenishmentPlan; the low-stock report, dashboard and export
+read them together with the live stock.
+
+NumPy is optional. Without it plan_values() applies the same formulas one
+product at a time in plain Python: the same results, only slower on a large
+catalog.
+"""
+import math
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..models import DailyMovement, Product, ReplenishmentPlan, StockBalance, StockOut
+from .periods import date_span
+
+MIN_HISTORY_DAYS = 14
+CHUNK_PRODUCTS = 20000
+WRITE_BATCH = 1000
+
+PLAN_FIELDS = [
+    'daily_demand', 'demand_std', 'history_days', 'safety_stock', 'reorder_point', 'order_up_to',
+    'stock', 'days_of_cover', 'suggested_quantity', 'computed_at',
+]
+
+
+def history_days():
+    return getattr(settings, 'REPLENISHMENT_HISTORY_DAYS', 365)
+
+
+def lead_time_days():
+    return getattr(settings, 'REPLENISHMENT_LEAD_TIME_DAYS', 7)
+
+
+def review_days():
+    return getattr(settings, 'REPLENISHMENT_REVIEW_DAYS', 14)
+
+
+def service_z():
+    return getattr(settings, 'REPLENISHMENT_SERVICE_Z', 1.65)
+
+
+def plan_for(product):
+    """The product's ReplenishmentPlan, or None (use with select_related('replenishment'))"""
+    return getattr(product, 'replenishment', None)
+
+
+def _numpy():
+    """The numpy module, or None when it is not installed"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def days_of_cover(stock, plan):
+    """Days the current stock lasts at the plan's demand, or None without demand"""
+    if plan is None or plan.daily_demand <= 0:
+        return None
+    return round(max(stock, 0) / plan.daily_demand, 1)
+
+
+# ========== LOADING ==========
+def _per_product(np, ids, rows, fields=('value',)):
+    """(product_id, *values) rows placed on the positions of the sorted `ids` (0 elsewhere), one array per field"""
+    found_rows = np.fromiter(rows, dtype=[('product', 'i8')] + [(field, 'f8') for field in fields])
+    columns = {field: np.zeros(len(ids)) for field in fields}
+    if len(found_rows):
+        positions = np.searchsorted(ids, found_rows['product'])
+        found = (positions < len(ids)) & (ids[np.minimum(positions, len(ids) - 1)] == found_rows['product'])
+        for field in fields:
+            columns[field][positions[found]] = found_rows[field][found]
+    return columns if len(fields) > 1 else columns[fields[0]]
+
+
+def issue_statistics(first_day, last_day, using=None):
+    """
+    (product_id, total, sum of squares) of the units issued per local day,
+    transfers taken out, for every product with issues in first_day..last_day.
+
+    The rollup rows and the transfer lines are summed per product and day,
+    and those daily totals per product, in one grouped database query: only
+    one row per product reaches Python, however long the history is.
+    """
+    start, end = date_span(first_day, last_day)
+    issued = DailyMovement.objects.filter(day__gte=first_day, day__lte=last_day, qty_out__gt=0).order_by().annotate(
+        item=F('product_id'), moved_on=F('day'), units=F('qty_out'),
+    ).values_list('item', 'moved_on', 'units')
+    transferred = StockOut.objects.filter(
+        date_issued__gte=start, date_issued__lt=end, transfer__isnull=False,
+    ).order_by().annotate(
+        item=F('product_id'), moved_on=TruncDate('date_issued'), units=-F('quantity'),
+    ).values_list('item', 'moved_on', 'units')
+    using = using or router.db_for_read(DailyMovement)
+    moves_sql, params = issued.union(transferred, all=True).query.get_compiler(using).as_sql()
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT item, SUM(units), SUM(units * units) FROM ("
+            "SELECT item, CASE WHEN SUM(units) > 0 THEN SUM(units) ELSE 0 END AS units "
+            f"FROM ({moves_sql}) moves GROUP BY item, moved_on"
+            ") daily GROUP BY item",
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(WRITE_BATCH)
+            if not rows:
+                return
+            yield from rows
+
+
+# ========== COMPUTING ==========
+def compute_plans(np, reorder_levels, stock, first_seen, total, squares, first_day, last_day):
+    """
+    Plan arrays for a set of products: a dict of NumPy arrays, one entry per
+    ReplenishmentPlan field, every input array aligned on the same products.
+
+    `first_seen` holds the ordinal of each product's first movement (0 for
+    none); `total` and `squares` are the sum and the sum of squares of the
+    daily issue totals in first_day..last_day.
+    """
+    span = last_day.toordinal() - first_day.toordinal() + 1
+
+    # Days the product could have been issued on: since its first movement, within the window
+    since = np.where(first_seen > 0, np.maximum(first_seen, first_day.toordinal()), first_day.toordinal())
+    observed = np.clip(last_day.toordinal() - since + 1, MIN_HISTORY_DAYS, span)
+
+    demand = total / observed
+    std = np.sqrt(np.maximum(squares / observed - demand * demand, 0))
+    has_demand = total > 0
+    lead, review = lead_time_days(), review_days()
+
+    safety = np.where(has_demand, np.ceil(service_z() * std * math.sqrt(lead)), 0)
+    reorder_point = np.where(has_demand, np.ceil(demand * lead + safety), reorder_levels)
+    order_up_to = np.where(
+        has_demand, np.maximum(np.ceil(reorder_point + demand * review), reorder_point), reorder_levels * 2
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cover = np.where(has_demand, np.maximum(stock, 0) / demand, np.nan)
+    suggested = np.maximum(order_up_to - np.maximum(stock, 0), 0)
+    return {
+        'daily_demand': demand,
+        'demand_std': std,
+        'history_days': np.where(has_demand, observed, 0),
+        'safety_stock': safety,
+        'reorder_point': reorder_point,
+        'order_up_to': order_up_to,
+        'stock': stock,
+        'days_of_cover': cover,
+        'suggested_quantity': suggested,
+    }
+
+
+def plan_values(reorder_level, stock, first_seen, total, squares, first_day, last_day):
+    """One product's plan fields, as compute_plans() computes them for many products at once"""
+    span = last_day.toordinal() - first_day.toordinal() + 1
+    since = max(first_seen, first_day.toordinal()) if first_seen > 0 else first_day.toordinal()
+    observed = min(max(last_day.toordinal() - since + 1, MIN_HISTORY_DAYS), span)
+
+    demand = total / observed
+    std = math.sqrt(max(squares / observed - demand * demand, 0))
+    on_hand = max(stock, 0)
+    if total > 0:
+        lead, review = lead_time_days(), review_days()
+        safety = math.ceil(service_z() * std * math.sqrt(lead))
+        reorder_point = math.ceil(demand * lead + safety)
+        order_up_to = max(math.ceil(reorder_point + demand * review), reorder_point)
+        cover, days = on_hand / demand, observed
+    else:
+        safety, reorder_point, order_up_to = 0, reorder_level, reorder_level * 2
+        cover, days = math.nan, 0
+    return {
+        'daily_demand': demand,
+        'demand_std': std,
+        'history_days': days,
+        'safety_stock': safety,
+        'reorder_point': reorder_point,
+        'order_up_to': order_up_to,
+        'stock': stock,
+        'days_of_cover': cover,
+        'suggested_quantity': max(order_up_to - on_hand, 0),
+    }
+
+
+def _numpy_plans(np, first_day, last_day):
+    products = np.fromiter(
+        Product.objects.order_by('id').values_list('id', 'reorder_level').iterator(chunk_size=WRITE_BATCH),
+        dtype=[('id', 'i8'), ('reorder_level', 'f8')],
+    )
+    ids = products['id']
+    stock = _per_product(np, ids, StockBalance.objects.order_by().values_list('product_id').annotate(
+        total=Sum('quantity')
+    ).iterator(chunk_size=WRITE_BATCH))
+    first_seen = _per_product(np, ids, (
+        (product_id, day.toordinal()) for product_id, day in DailyMovement.objects.order_by().values_list(
+            'product_id'
+        ).annotate(first=Min('day')).iterator(chunk_size=WRITE_BATCH)
+    ))
+    issues = _per_product(np, ids, issue_statistics(first_day, last_day), fields=('total', 'squares'))
+    plans = compute_plans(
+        np, products['reorder_level'], stock, first_seen, issues['total'], issues['squares'], first_day, last_day
+    )
+    return ids.tolist(), {field: values.tolist() for field, values in plans.items()}
+
+
+def _python_plans(first_day, last_day):
+    stock = dict(StockBalance.objects.order_by().values_list('product_id').annotate(total=Sum('quantity')))
+    first_seen = {
+        product_id: day.toordinal() for product_id, day in DailyMovement.objects.order_by().values_list(
+            'product_id'
+        ).annotate(first=Min('day'))
+    }
+    issues = {product_id: (total, squares) for product_id, total, squares in issue_statistics(first_day, last_day)}
+    ids, plans = [], {field: [] for field in PLAN_FIELDS[:-1]}
+    products = Product.objects.order_by('id').values_list('id', 'reorder_level').iterator(chunk_size=WRITE_BATCH)
+    for product_id, reorder_level in products:
+        total, squares = issues.get(product_id, (0, 0))
+        values = plan_values(
+            reorder_level, stock.get(product_id, 0), first_seen.get(product_id, 0), total, squares, first_day, last_day
+        )
+        ids.append(product_id)
+        for field, value in values.items():
+            plans[field].append(value)
+    return ids, plans
+
+
+def _plan_rows(ids, plans, computed_at):
+    columns = [plans[field] for field in PLAN_FIELDS[:-1]]
+    for product_id, values in zip(ids, zip(*columns)):
+        demand, std, days, safety, reorder_point, order_up_to, stock, cover, suggested = values
+        yield ReplenishmentPlan(
+            product_id=product_id,
+            daily_demand=round(demand, 4),
+            demand_std=round(std, 4),
+            history_days=int(days),
+            safety_stock=int(safety),
+            reorder_point=int(reorder_point),
+            order_up_to=int(order_up_to),
+            stock=int(stock),
+            days_of_cover=None if math.isnan(cover) else round(cover, 1),
+            suggested_quantity=int(suggested),
+            computed_at=computed_at,
+        )
+
+
+def compute_replenishment(today=None, chunk_products=CHUNK_PRODUCTS, progress=None):
+    """
+    Recompute and store the ReplenishmentPlan of every product.
+
+    Returns {'products', 'with_demand', 'to_order', 'seconds'}. The plans
+    are written `chunk_products` at a time, each chunk in its own short
+    transaction; `progress(done)` is called after each chunk.
+    """
+    started = time.monotonic()
+    last_day = (today or timezone.localdate()) - timedelta(days=1)
+    first_day = last_day - timedelta(days=history_days() - 1)
+    computed_at = timezone.now()
+
+    np = _numpy()
+    if np is not None:
+        ids, plans = _numpy_plans(np, first_day, last_day)
+    else:
+        ids, plans = _python_plans(first_day, last_day)
+
+    for start in range(0, len(ids), chunk_products):
+        chunk = slice(start, start + chunk_products)
+        with transaction.atomic():
+            ReplenishmentPlan.objects.bulk_create(
+                _plan_rows(ids[chunk], {field: values[chunk] for field, values in plans.items()}, computed_at),
+                batch_size=WRITE_BATCH, update_conflicts=True, unique_fields=['product'], update_fields=PLAN_FIELDS,
+            )
+        if progress:
+            progress(min(start + chunk_products, len(ids)))
+    return {
+        'products': len(ids),
+        'with_demand': sum(1 for days in plans['history_days'] if days),
+        'to_order': sum(1 for stock, point in zip(plans['stock'], plans['reorder_point']) if stock <= point),
+        'seconds': round(time.monotonic() - started, 2),
+    }
@@ -0,0 +1,137 @@
+# warehouse/services/report_cache.py
+"""
+Report contexts and rendered fragments cached under a movement sequence.
+
+The movement sequence is a counter in the Django cache that goes up once
+for every committed write to StockIn, StockOut, Product, Category or
+Warehouse (see signals.py; bulk imports and transfers bump it themselves).
+Every cached report context and template fragment has the sequence value in
+its key, so after a write the old entries are simply never asked for again
+and age out through REPORT_CACHE_TTL. Nothing has to be deleted.
+
+The counter lives in the configured cache. With the default local-memory
+backend it is per process, which is only right for a single worker; give
+several workers a shared backend (STOCK_CACHE_DIR selects the file-based one
+in settings.py). A counter lost to eviction restarts from the current time
+in microseconds, which is above any value it could have reached, so a lost
+key can never bring old entries back.
+
+Hits and misses are counted per report and fragment in this process and
+shown by the cache stats view.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+SEQUENCE_KEY = 'warehouse:movement:sequence'
+KEY_PREFIX = 'warehouse:report'
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def report_cache_ttl():
+    return getattr(settings, 'REPORT_CACHE_TTL', 300)
+
+
+def movement_sequence():
+    """Current sequence value, starting a new one if the key is missing"""
+    sequence = cache.get(SEQUENCE_KEY)
+    if sequence is None:
+        cache.add(SEQUENCE_KEY, time.time_ns() // 1000, None)
+        sequence = cache.get(SEQUENCE_KEY)
+    return sequence
+
+
+def bump_movement_sequence():
+    """Move every report to a new cache version (run after the write commits)"""
+    try:
+        return cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        movement_sequence()
+        return cache.incr(SEQUENCE_KEY)
+
+
+def cache_key(kind, name, sequence, parts=()):
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{kind}:{name}:{sequence}:{digest}'
+
+
+def record(kind, name, hit):
+    with _lock:
+        counters = _stats.setdefault((kind, name), {'hits': 0, 'misses': 0})
+        counters['hits' if hit else 'misses'] += 1
+
+
+def cached_context(name, parts, build):
+    """
+    build() for this report and parameters, cached under the current sequence.
+
+    The returned dict is a copy carrying `report_version`, which the
+    report_fragment template tag uses to version the fragments it caches.
+    """
+    sequence = movement_sequence()
+    key = cache_key('context', name, sequence, parts)
+    context = cache.get(key)
+    record('context', name, context is not None)
+    if context is None:
+        context = build()
+        cache.set(key, context, report_cache_ttl())
+    return dict(context, report_version=sequence)
+
+
+async def acached_context(name, parts, abuild):
+    """cached_context() for async views; abuild is a coroutine function"""
+    sequence = await cache.aget(SEQUENCE_KEY)
+    if sequence is None:
+        await cache.aadd(SEQUENCE_KEY, time.time_ns() // 1000, None)
+        sequence = await cache.aget(SEQUENCE_KEY)
+    key = cache_key('context', name, sequence, parts)
+    context = await cache.aget(key)
+    record('context', name, context is not None)
+    if context is None:
+        context = await abuild()
+        await cache.aset(key, context, report_cache_ttl())
+    return dict(context, report_version=sequence)
+
+
+def cached_fragment(name, sequence, parts, render):
+    """Rendered HTML of a template fragment for this sequence and parameters"""
+    key = cache_key('fragment', name, sequence, parts)
+    html = cache.get(key)
+    record('fragment', name, html is not None)
+    if html is None:
+        html = render()
+        cache.set(key, html, report_cache_ttl())
+    return html
+
+
+def report_cache_stats():
+    with _lock:
+        entries = sorted(_stats.items())
+    rows = [{
+        'kind': kind,
+        'name': name,
+        'hits': counters['hits'],
+        'misses': counters['misses'],
+        'hit_ratio': round(counters['hits'] / (counters['hits'] + counters['misses']), 4),
+    } for (kind, name), counters in entries]
+    hits = sum(row['hits'] for row in rows)
+    total = hits + sum(row['misses'] for row in rows)
+    return {
+        'movement_sequence': cache.get(SEQUENCE_KEY),
+        'backend': settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1],
+        'ttl': report_cache_ttl(),
+        'hits': hits,
+        'misses': total - hits,
+        'hit_ratio': round(hits / total, 4) if total else None,
+        'entries': rows,
+    }
+
+
+def reset_report_cache_stats():
+    with _lock:
+        _stats.clear()
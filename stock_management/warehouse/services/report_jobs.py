@@ -0,0 +1,296 @@
+# warehouse/services/report_jobs.py
+"""
+Report exports generated in the background instead of inside a request.
+
+queue_report() stores a ReportJob and returns at once; the page then polls
+the job and downloads the file when it is done. A request identical to a
+job that is still pending or running (same report, format and the
+parameters that report reads) gets that job back instead of a new one. A
+partial unique index on ReportJob.key backs this up, so two requests racing
+each other cannot both insert.
+
+`manage.py run_report_jobs` calls run_jobs(): a loop that claims pending
+jobs oldest first and runs them on a pool of REPORT_JOB_WORKERS threads.
+A job is claimed with a conditional UPDATE, so two runner processes never
+take the same one, and no job is claimed while REPORT_JOB_WORKERS jobs
+are already running. Jobs read through the 'read' connection like the
+report views do, and their files are written under REPORT_JOB_DIR by the
+same row sources as the direct exports.
+
+A claimed job holds a lease: the runner renews heartbeat_at every
+HEARTBEAT_SECONDS for as long as the job runs, however long that is. A
+running job whose heartbeat is older than REPORT_JOB_LEASE_SECONDS belonged
+to a runner that died; it is queued again, and fails after MAX_ATTEMPTS.
+Each claim writes its file under its own attempt directory and records the
+outcome only if the job is still held by that claim (same started_at), so a
+runner that lost its lease cannot overwrite or report over a newer attempt.
+Finished jobs and their files are removed after REPORT_JOB_KEEP_DAYS.
+"""
+import hashlib
+import json
+import random
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..db_router import read_only
+from ..models import ReportJob
+from .exports import REPORTS, export_filename, write_report
+from .stock_issue import BACKOFF_SECONDS, is_lock_error
+
+FORMATS = ('csv', 'xlsx')
+MAX_ATTEMPTS = 3
+MAX_WRITE_ATTEMPTS = 20
+POLL_SECONDS = 2
+HEARTBEAT_SECONDS = 30
+HOUSEKEEPING_SECONDS = 300
+RECENT_JOBS = 50
+
+# The GET parameters each report reads; anything else does not change the result
+REPORT_PARAMS = {
+    'stock': ['as_of'],
+    'low-stock': [],
+    'monthly': ['year', 'month', 'date_from', 'date_to'],
+    'transactions': ['type', 'date_from', 'date_to', 'warehouse', 'product', 'party', 'reference_no'],
+}
+REPORT_TITLES = {
+    'stock': 'Ripoti ya Stock',
+    'low-stock': 'Stock Ndogo',
+    'monthly': 'Ripoti ya Mwezi',
+    'transactions': 'Historia ya Miamala',
+}
+
+
+def worker_count():
+    return max(getattr(settings, 'REPORT_JOB_WORKERS', 2), 1)
+
+
+def lease_duration():
+    return timedelta(seconds=getattr(settings, 'REPORT_JOB_LEASE_SECONDS', 300))
+
+
+def keep_for():
+    return timedelta(days=getattr(settings, 'REPORT_JOB_KEEP_DAYS', 7))
+
+
+def job_dir():
+    return Path(getattr(settings, 'REPORT_JOB_DIR', Path(settings.BASE_DIR) / 'report_jobs'))
+
+
+def result_path(job):
+    return job_dir() / job.result_file
+
+
+# ========== QUEUE ==========
+def job_params(report, params, today=None):
+    """The parameters of `params` that `report` reads, without blanks"""
+    selected = {name: params.get(name) for name in REPORT_PARAMS[report] if params.get(name)}
+    if report == 'monthly' and not (selected.get('date_from') or selected.get('date_to')):
+        # "This month" is fixed when the job is queued, not when it runs
+        today = today or timezone.localdate()
+        selected.setdefault('year', str(today.year))
+        selected.setdefault('month', str(today.month))
+    return selected
+
+
+def job_key(report, export_format, params):
+    payload = json.dumps([report, export_format, params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def queue_report(report, export_format, params, user=None):
+    """
+    (job, created) for a report export. `params` is a request's GET (or any
+    mapping); an identical pending or running job is returned instead of a
+    new one. Raises ValueError for an unknown report or format.
+    """
+    if report not in REPORTS:
+        raise ValueError(f'Ripoti "{report}" haipo')
+    if export_format not in FORMATS:
+        raise ValueError(f'Aina ya faili "{export_format}" haikubaliki')
+    params = job_params(report, params)
+    key = job_key(report, export_format, params)
+
+    for _ in range(2):
+        existing = ReportJob.objects.filter(key=key, status__in=ReportJob.ACTIVE).first()
+        if existing is not None:
+            ReportJob.objects.filter(pk=existing.pk).update(request_count=F('request_count') + 1)
+            return existing, False
+        try:
+            with transaction.atomic():
+                job = ReportJob.objects.create(
+                    report=report, export_format=export_format, params=params, key=key,
+                    requested_by=user if user is not None and user.is_authenticated else None,
+                )
+            return job, True
+        except IntegrityError:
+            # Queued by a concurrent request between the lookup and the insert
+            continue
+    raise ValueError('Ripoti hii inawekwa kwenye foleni na ombi jingine, jaribu tena')
+
+
+def job_status(job):
+    """JSON-friendly state of a job for the polling page"""
+    return {
+        'id': job.pk,
+        'report': job.report,
+        'title': REPORT_TITLES.get(job.report, job.report),
+        'format': job.export_format,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'rows': job.row_count,
+        'error': job.error,
+        'ready': job.status == ReportJob.DONE,
+    }
+
+
+# ========== RUNNER ==========
+def _retrying(write):
+    """Run a short job-state write, retrying while SQLite reports a lock (as stock_issue does)"""
+    for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+        try:
+            return write()
+        except OperationalError as e:
+            if attempt == MAX_WRITE_ATTEMPTS or not is_lock_error(e):
+                raise
+            time.sleep(BACKOFF_SECONDS * attempt * (1 + random.random()))
+
+
+def _claim(limit):
+    with transaction.atomic():
+        if ReportJob.objects.filter(status=ReportJob.RUNNING).count() >= limit:
+            return None
+        job = ReportJob.objects.filter(status=ReportJob.PENDING).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        started_at = timezone.now()
+        claimed = ReportJob.objects.filter(pk=job.pk, status=ReportJob.PENDING).update(
+            status=ReportJob.RUNNING, started_at=started_at, heartbeat_at=started_at, attempts=F('attempts') + 1,
+        )
+    if not claimed:
+        # Another runner took it first; the caller simply asks again
+        return None
+    job.status, job.started_at, job.heartbeat_at = ReportJob.RUNNING, started_at, started_at
+    job.attempts += 1
+    return job
+
+
+def claim_next(limit=None):
+    """Mark the oldest pending job running and return it; None if nothing is pending or `limit` jobs already run"""
+    return _retrying(lambda: _claim(limit or worker_count()))
+
+
+def held(job):
+    """The job's row while it is still running under this claim"""
+    return ReportJob.objects.filter(pk=job.pk, status=ReportJob.RUNNING, started_at=job.started_at)
+
+
+def renew_leases(jobs):
+    """Heartbeat for claimed jobs that are still running"""
+    if jobs:
+        now = timezone.now()
+        _retrying(lambda: ReportJob.objects.filter(
+            pk__in=[job.pk for job in jobs], status=ReportJob.RUNNING
+        ).update(heartbeat_at=now))
+
+
+def _finish(job, path, **fields):
+    fields['finished_at'] = timezone.now()
+    if not _retrying(lambda: held(job).update(**fields)):
+        # The lease expired and the job was queued again; the newer attempt owns it now
+        print(f"Report job {job.pk} lost its lease, result discarded")
+        path.unlink(missing_ok=True)
+        job.refresh_from_db()
+        return job
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return job
+
+
+def run_job(job):
+    """Generate a claimed job's file and record the outcome; returns the job, never raises"""
+    relative = f'{job.pk}/{job.attempts}/{export_filename(job.report)}.{job.export_format}'
+    path = job_dir() / relative
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with read_only():
+            rows = write_report(job.report, job.export_format, job.params, path)
+    except Exception as e:
+        print(f"Report job {job.pk} error: {e}")
+        error = 'Kutengeneza XLSX kunahitaji openpyxl kwenye server. Tumia CSV.' if isinstance(e, ImportError) else str(e)
+        path.unlink(missing_ok=True)
+        return _finish(job, path, status=ReportJob.FAILED, error=error[:1000])
+    return _finish(job, path, status=ReportJob.DONE, row_count=rows, result_file=relative)
+
+
+def requeue_stale(now=None):
+    """Put back (or fail, after MAX_ATTEMPTS) running jobs whose lease expired; returns how many were touched"""
+    cutoff = (now or timezone.now()) - lease_duration()
+    stale = ReportJob.objects.filter(status=ReportJob.RUNNING).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=ReportJob.FAILED, finished_at=timezone.now(), error='Ripoti ilichukua muda mrefu mno',
+    )
+    return failed + stale.update(status=ReportJob.PENDING, started_at=None)
+
+
+def purge_finished(now=None):
+    """Delete finished jobs older than REPORT_JOB_KEEP_DAYS together with their files"""
+    cutoff = (now or timezone.now()) - keep_for()
+    old = ReportJob.objects.filter(status__in=[ReportJob.DONE, ReportJob.FAILED], finished_at__lt=cutoff)
+    for job_id in old.values_list('pk', flat=True):
+        shutil.rmtree(job_dir() / str(job_id), ignore_errors=True)
+    return old.delete()[0]
+
+
+def _run_in_own_thread(job):
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+def run_jobs(workers=None, once=False, poll_seconds=POLL_SECONDS, progress=None):
+    """
+    Claim and run queued jobs on a pool of `workers` threads until
+    interrupted, or with `once` until nothing is left to claim.
+    `progress(job)` is called as each job finishes.
+    """
+    workers = workers or worker_count()
+    running = {}  # future -> claimed job
+    housekeeping_due = heartbeat_due = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report-job') as pool:
+        while True:
+            if time.monotonic() >= housekeeping_due:
+                requeue_stale()
+                purge_finished()
+                housekeeping_due = time.monotonic() + HOUSEKEEPING_SECONDS
+            while len(running) < workers:
+                job = claim_next(workers)
+                if job is None:
+                    break
+                running[pool.submit(_run_in_own_thread, job)] = job
+            if not running:
+                if once:
+                    return
+                time.sleep(poll_seconds)
+                continue
+            if time.monotonic() >= heartbeat_due:
+                renew_leases(list(running.values()))
+                heartbeat_due = time.monotonic() + HEARTBEAT_SECONDS
+            finished, _ = wait(running, timeout=poll_seconds, return_when=FIRST_COMPLETED)
+            for future in finished:
+                del running[future]
+                if progress:
+                    progress(future.result())
@@ -0,0 +1,54 @@
+# warehouse/services/stock_issue.py
+"""
+Issuing stock (StockOut) safely under concurrent requests.
+
+The availability check and the balance decrement are a single conditional
+UPDATE (see StockBalance.take), so two clerks issuing the last units of a
+product at the same moment cannot both succeed. On SQLite a writer that
+finds the database locked gets OperationalError; the issue is retried a few
+times with a short backoff before giving up.
+"""
+import random
+import time
+
+from django.db import OperationalError, connection, transaction
+
+from ..models import StockOut
+
+MAX_ATTEMPTS = 20
+BACKOFF_SECONDS = 0.02
+
+
+def is_lock_error(error):
+    """True for SQLite 'database is locked' / 'database table is locked' errors"""
+    return 'locked' in str(error).lower()
+
+
+def issue_stock(stockout, attempts=MAX_ATTEMPTS):
+    """
+    Save a new StockOut, retrying on write-lock contention.
+
+    Raises ValidationError if the warehouse does not hold enough stock.
+    Inside an outer transaction a retry cannot help (the outer block is
+    already broken), so the error is raised straight away.
+    """
+    if connection.in_atomic_block:
+        attempts = 1
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                stockout.save()
+            return stockout
+        except OperationalError as e:
+            if attempt == attempts or not is_lock_error(e):
+                raise
+            stockout.pk = None
+            time.sleep(BACKOFF_SECONDS * attempt * (1 + random.random()))
+
+
+def create_stockout(product, warehouse, quantity, customer, reference_no, user=None, notes=''):
+    """Build and issue a StockOut in one call"""
+    return issue_stock(StockOut(
+        product=product, warehouse=warehouse, quantity=quantity, customer=customer,
+        reference_no=reference_no, issued_by=user, notes=notes,
+    ))
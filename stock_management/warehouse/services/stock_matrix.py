@@ -0,0 +1,195 @@
+# warehouse/services/stock_matrix.py
+"""
+Set-based stock queries shared by the report views.
+
+Everything here runs a fixed number of queries regardless of how many
+products or warehouses exist: the matrix is one query for products, one for
+warehouses and one over the StockBalance rows; per-product totals and the
+low-stock list are a single GROUP BY. Views should use these helpers instead
+of calling Product.get_stock_by_warehouse()/get_total_stock() inside a loop.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Sum, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ..models import Product, StockBalance
+from .catalog import get_catalog
+from .checkpoints import balances_as_of
+from .concurrency import gather_queries
+from .valuation import unit_costs
+
+
+def stock_status(stock, reorder_level):
+    """'out', 'low' or 'ok' - the badge states used across the templates"""
+    if stock <= 0:
+        return 'out'
+    if stock <= reorder_level:
+        return 'low'
+    return 'ok'
+
+
+def parse_as_of(params):
+    """?as_of=YYYY-MM-DD as a date, or None for current stock (also for today or later)"""
+    as_of = parse_date(params.get('as_of') or '')
+    if as_of is None or as_of >= timezone.localdate():
+        return None
+    return as_of
+
+
+def suggested_order_quantity(stock, reorder_level, plan=None):
+    """
+    Quantity to order: up to the demand-based order-up-to level of `plan`
+    (a ReplenishmentPlan), or up to twice the reorder level without one
+    """
+    if plan is not None:
+        return max(plan.order_up_to - max(stock, 0), 0)
+    return (reorder_level * 2) - stock if stock > 0 else reorder_level * 2
+
+
+class StockMatrix:
+    """
+    Product x warehouse balances plus per-product and per-warehouse totals.
+    
+    Values use `costs` ({(product_id, warehouse_id): unit cost} from the
+    valuation state) and fall back to the product's unit_price for cells
+    without a cost.
+    """
+    
+    def __init__(self, products, warehouses, cells, costs=None):
+        self.products = list(products)
+        self.warehouses = list(warehouses)
+        self.cells = cells
+        costs = costs or {}
+        
+        prices = {product.id: product.unit_price for product in self.products}
+        self.product_totals = defaultdict(int)
+        self.product_values = defaultdict(Decimal)
+        self.warehouse_totals = defaultdict(int)
+        self.warehouse_values = defaultdict(Decimal)
+        for key, quantity in cells.items():
+            product_id, warehouse_id = key
+            value = quantity * costs.get(key, prices.get(product_id, 0))
+            self.product_totals[product_id] += quantity
+            self.product_values[product_id] += value
+            self.warehouse_totals[warehouse_id] += quantity
+            self.warehouse_values[warehouse_id] += value
+    
+    def stock(self, product_id, warehouse_id):
+        return self.cells.get((product_id, warehouse_id), 0)
+    
+    def total(self, product_id):
+        return self.product_totals.get(product_id, 0)
+    
+    def value(self, product_id):
+        return self.product_values.get(product_id, Decimal(0))
+    
+    def by_warehouse(self, product_id):
+        """{warehouse_id: stock} for every warehouse in the matrix"""
+        return {warehouse.id: self.stock(product_id, warehouse.id) for warehouse in self.warehouses}
+    
+    @property
+    def total_items(self):
+        return sum(self.product_totals.values())
+    
+    @property
+    def total_value(self):
+        return sum(self.warehouse_values.values(), Decimal(0))
+
+
+def build_stock_matrix(products=None, warehouses=None, as_of=None):
+    """
+    Build a StockMatrix in three queries.
+    
+    `products` / `warehouses` may be querysets (or lists) to narrow the
+    matrix, e.g. a single warehouse for warehouse_stock or a single product
+    for product_detail. Defaults to the whole catalogue.
+    
+    With `as_of` (a date) the cells are the balances at the end of that day,
+    read from the nearest period-close checkpoint plus the daily rollup after
+    it; `matrix.checkpoint` is set to the checkpoint used. Cost state is
+    only kept for the present, so past balances are valued at today's cost.
+    """
+    cells, checkpoint = _cells(products, warehouses, as_of)
+    costs = unit_costs(products, warehouses)
+    if products is None:
+        products = get_catalog().products
+    if warehouses is None:
+        warehouses = get_catalog().warehouses
+    matrix = StockMatrix(products, warehouses, cells, costs)
+    matrix.checkpoint = checkpoint
+    return matrix
+
+
+def _cells(products, warehouses, as_of):
+    """(cells, checkpoint) for build_stock_matrix"""
+    if as_of is not None:
+        return balances_as_of(as_of, products, warehouses)
+    balances = StockBalance.objects.all()
+    if products is not None:
+        balances = balances.filter(product__in=products)
+    if warehouses is not None:
+        balances = balances.filter(warehouse__in=warehouses)
+    return {
+        (product_id, warehouse_id): quantity
+        for product_id, warehouse_id, quantity in balances.values_list(
+            'product_id', 'warehouse_id', 'quantity'
+        ).iterator(chunk_size=2000)
+    }, None
+
+
+async def abuild_stock_matrix(as_of=None):
+    """Whole-catalogue build_stock_matrix() for async views; balances and catalog load concurrently"""
+    results = await gather_queries({
+        'cells': lambda: _cells(None, None, as_of),
+        'costs': unit_costs,
+        'catalog': get_catalog,
+    })
+    cells, checkpoint = results['cells']
+    catalog = results['catalog']
+    matrix = StockMatrix(catalog.products, catalog.warehouses, cells, results['costs'])
+    matrix.checkpoint = checkpoint
+    return matrix
+
+
+def with_total_stock(queryset=None):
+    """Annotate products with `current_stock` summed over all warehouses (one query)"""
+    if queryset is None:
+        queryset = Product.objects.select_related('category')
+    return queryset.annotate(
+        current_stock=Coalesce(Sum('balances__quantity'), Value(0), output_field=IntegerField())
+    )
+
+
+def total_stock_subquery():
+    """
+    A product's stock over all warehouses as a correlated subquery.
+    
+    Unlike with_total_stock() there is no GROUP BY over the product table, so
+    a paginated list only sums the balances of the rows on its page.
+    """
+    totals = StockBalance.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('quantity')
+    ).values('total')
+    return Coalesce(Subquery(totals), Value(0), output_field=IntegerField())
+
+
+def low_stock_products(limit=None):
+    """
+    Products at or below their reorder point, emptiest first, in one query.
+    
+    The reorder point (annotated as `reorder_point`) is the demand-based one
+    from the product's ReplenishmentPlan, or reorder_level without a plan.
+    The plan comes along as `product.replenishment` when there is one.
+    """
+    queryset = with_total_stock(Product.objects.select_related('category', 'replenishment')).annotate(
+        reorder_point=Coalesce(F('replenishment__reorder_point'), F('reorder_level'))
+    ).filter(
+        current_stock__lte=F('reorder_point')
+    ).order_by('current_stock', 'name')
+    if limit is not None:
+        queryset = queryset[:limit]
+    return queryset
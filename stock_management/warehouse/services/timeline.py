@@ -0,0 +1,135 @@
+# warehouse/services/timeline.py
+"""
+Unified stock-in / stock-out timeline with keyset (cursor) pagination.
+
+Both tables are ordered newest first on (date, id). A page is read by taking
+`page_size + 1` rows past the cursor from each table and merging them, so
+the cost of a page does not depend on how deep into history it is (no
+OFFSET). The cursor is the (date, kind, id) of the last row shown.
+"""
+import base64
+import heapq
+from datetime import datetime
+
+from django.db.models import Count, Q, Sum
+from django.utils.dateparse import parse_date
+
+from ..models import StockIn, StockOut
+from .periods import day_range
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# (model, date field, party field) per movement kind
+KINDS = {
+    'in': (StockIn, 'date_received', 'supplier'),
+    'out': (StockOut, 'date_issued', 'customer'),
+}
+
+
+class TimelineFilters:
+    """Filters taken from a request's GET parameters"""
+
+    def __init__(self, params):
+        self.type = params.get('type') if params.get('type') in KINDS else 'all'
+        self.date_from = parse_date(params.get('date_from') or '')
+        self.date_to = parse_date(params.get('date_to') or '')
+        self.warehouse = params.get('warehouse') or ''
+        self.product = (params.get('product') or '').strip()
+        self.party = (params.get('party') or '').strip()
+        self.reference_no = (params.get('reference_no') or '').strip()
+
+    def kinds(self):
+        return list(KINDS) if self.type == 'all' else [self.type]
+
+    def queryset(self, kind):
+        """Filtered queryset for one movement kind"""
+        model, date_field, party_field = KINDS[kind]
+        queryset = model.objects.all()
+        if self.date_from:
+            queryset = queryset.filter(**{f'{date_field}__gte': day_range(self.date_from)[0]})
+        if self.date_to:
+            queryset = queryset.filter(**{f'{date_field}__lt': day_range(self.date_to)[1]})
+        if self.warehouse.isdigit():
+            queryset = queryset.filter(warehouse_id=int(self.warehouse))
+        if self.product:
+            if self.product.isdigit():
+                queryset = queryset.filter(Q(product_id=int(self.product)) | Q(product__sku=self.product))
+            else:
+                queryset = queryset.filter(product__sku=self.product)
+        if self.party:
+            queryset = queryset.filter(**{f'{party_field}__icontains': self.party})
+        if self.reference_no:
+            queryset = queryset.filter(reference_no__startswith=self.reference_no)
+        return queryset
+
+
+def encode_cursor(date, kind, pk):
+    raw = f'{date.isoformat()}|{kind}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (date, kind, id) or None for a missing/garbled cursor"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, kind, pk = raw.split('|')
+        if kind not in KINDS:
+            return None
+        return datetime.fromisoformat(date), kind, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _after_cursor(queryset, kind, date_field, cursor):
+    """Rows that sort strictly after the cursor in (date, kind, id) descending order"""
+    if cursor is None:
+        return queryset
+    date, cursor_kind, pk = cursor
+    if kind < cursor_kind:
+        return queryset.filter(**{f'{date_field}__lte': date})
+    if kind > cursor_kind:
+        return queryset.filter(**{f'{date_field}__lt': date})
+    return queryset.filter(Q(**{f'{date_field}__lt': date}) | Q(**{date_field: date, 'id__lt': pk}))
+
+
+def timeline_page(filters, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    One page of the merged timeline.
+
+    Returns (entries, next_cursor). Each entry is a StockIn/StockOut with
+    `kind`, `date` and `party` attributes added for the template.
+    """
+    cursor = decode_cursor(cursor)
+    streams = []
+    for kind in filters.kinds():
+        model, date_field, party_field = KINDS[kind]
+        rows = _after_cursor(filters.queryset(kind), kind, date_field, cursor).select_related(
+            'product', 'warehouse'
+        ).order_by(f'-{date_field}', '-id')[:page_size + 1]
+        entries = []
+        for row in rows:
+            row.kind = kind
+            row.date = getattr(row, date_field)
+            row.party = getattr(row, party_field)
+            entries.append(row)
+        streams.append(entries)
+
+    merged = list(heapq.merge(*streams, key=lambda row: (row.date, row.kind, row.id), reverse=True))
+    page = merged[:page_size]
+    next_cursor = None
+    if len(merged) > page_size:
+        last = page[-1]
+        next_cursor = encode_cursor(last.date, last.kind, last.id)
+    return page, next_cursor
+
+
+def timeline_totals(filters):
+    """Quantity and row count per kind for the whole filtered set, from the database"""
+    totals = {'in': {'quantity': 0, 'count': 0}, 'out': {'quantity': 0, 'count': 0}}
+    for kind in filters.kinds():
+        result = filters.queryset(kind).aggregate(quantity=Sum('quantity'), count=Count('id'))
+        totals[kind] = {'quantity': result['quantity'] or 0, 'count': result['count']}
+    return totals
@@ -0,0 +1,127 @@
+# warehouse/services/transfers.py
+"""
+Multi-line stock transfers between two warehouses.
+
+A transfer is one StockTransfer document plus a StockOut (source) and
+StockIn (destination) per product line, written in a single transaction:
+
+1. the document row is inserted, which fixes its number (TRF-<id>),
+2. all balance deltas are applied with StockBalance.apply_many,
+3. one grouped query looks for source balances that went below zero; any
+   hit rolls the whole transfer back and is reported per product,
+4. the movements are written with bulk_create and added to DailyMovement
+   and the cost state; the incoming lines carry the source warehouse's
+   average cost.
+
+Decrementing before checking means the check sees the balance after this
+transfer *and* any writer that committed before it, so two transfers of the
+last units cannot both pass.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from ..models import DailyMovement, StockBalance, StockIn, StockOut, StockTransfer
+from .catalog import get_catalog
+from .dashboard import invalidate_dashboard_snapshot
+from .live import publish_refresh
+from .report_cache import bump_movement_sequence
+from .valuation import apply_movements, current_average_costs
+
+
+class TransferError(ValueError):
+    """Transfer rejected; `errors` lists one message per problem"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def normalize_lines(lines):
+    """Merge [(product_id, quantity), ...] into {product_id: quantity}, rejecting bad values"""
+    merged, errors = {}, []
+    for line_no, (product_id, quantity) in enumerate(lines, start=1):
+        try:
+            product_id, quantity = int(product_id), int(quantity)
+        except (TypeError, ValueError):
+            errors.append(f"mstari {line_no}: bidhaa au idadi si sahihi")
+            continue
+        if quantity <= 0:
+            errors.append(f"mstari {line_no}: idadi lazima iwe zaidi ya 0")
+            continue
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    if not merged and not errors:
+        errors.append('hakuna bidhaa za kuhamisha')
+    if errors:
+        raise TransferError(errors)
+    return merged
+
+
+def create_transfer(from_warehouse, to_warehouse, lines, user=None, notes=''):
+    """
+    Move stock for many products from one warehouse to another, atomically.
+
+    `lines` is an iterable of (product_id, quantity). Returns the saved
+    StockTransfer; raises TransferError if anything is invalid or short.
+    """
+    if from_warehouse.pk == to_warehouse.pk:
+        raise TransferError(['maghala lazima yawe tofauti'])
+    quantities = normalize_lines(lines)
+    products = {product_id: get_catalog().products_by_id.get(product_id) for product_id in quantities}
+    products = {product_id: product for product_id, product in products.items() if product}
+    missing = sorted(set(quantities) - set(products))
+    if missing:
+        raise TransferError([f"bidhaa {product_id} haipo" for product_id in missing])
+
+    with transaction.atomic():
+        transfer = StockTransfer.objects.create(
+            from_warehouse=from_warehouse, to_warehouse=to_warehouse, created_by=user, notes=notes
+        )
+        deltas = {}
+        for product_id, quantity in quantities.items():
+            deltas[(product_id, from_warehouse.pk)] = -quantity
+            deltas[(product_id, to_warehouse.pk)] = quantity
+        StockBalance.apply_many(deltas)
+
+        short = StockBalance.objects.filter(
+            warehouse=from_warehouse, product_id__in=list(quantities), quantity__lt=0
+        ).values_list('product_id', 'quantity')
+        errors = [
+            f"{products[product_id].name}: stock iliyopo {quantity + quantities[product_id]}, "
+            f"unajaribu kuhamisha {quantities[product_id]}"
+            for product_id, quantity in short
+        ]
+        if errors:
+            # Raising inside atomic() rolls back the document and the balance changes
+            raise TransferError(sorted(errors))
+
+        costs = current_average_costs(list(quantities), from_warehouse.pk)
+        note = f'Stock transfer {transfer.number} from {from_warehouse.name} to {to_warehouse.name}'
+        stockouts, stockins = [], []
+        for line_no, (product_id, quantity) in enumerate(sorted(quantities.items()), start=1):
+            stockouts.append(StockOut(
+                product_id=product_id, warehouse=from_warehouse, quantity=quantity,
+                customer=f'Transfer to {to_warehouse.name}',
+                reference_no=transfer.line_reference(line_no, 'OUT'), transfer=transfer,
+                date_issued=transfer.created_at, issued_by=user, notes=note,
+            ))
+            stockins.append(StockIn(
+                product_id=product_id, warehouse=to_warehouse, quantity=quantity,
+                supplier=f'Transfer from {from_warehouse.name}',
+                reference_no=transfer.line_reference(line_no, 'IN'), transfer=transfer,
+                date_received=transfer.created_at, received_by=user, notes=note,
+                unit_cost=costs[product_id].quantize(Decimal('0.01')) if product_id in costs else None,
+            ))
+        StockOut.objects.bulk_create(stockouts, batch_size=500)
+        StockIn.objects.bulk_create(stockins, batch_size=500)
+        rollup = {}
+        for movement in stockouts + stockins:
+            movement.add_to_rollup(rollup)
+        DailyMovement.apply_many(rollup)
+        apply_movements(stockouts + stockins)
+        transaction.on_commit(invalidate_dashboard_snapshot)
+        transaction.on_commit(publish_refresh)
+        transaction.on_commit(bump_movement_sequence)
+
+    transfer.line_count = len(stockouts)
+    return transfer
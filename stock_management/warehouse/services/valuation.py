@@ -0,0 +1,409 @@
+# warehouse/services/valuation.py
+"""
+Inventory valuation at cost: moving weighted average and FIFO layers.
+
+Cost state is kept per (product, warehouse) in StockValuation, with the
+unconsumed part of every receipt in CostLayer. Movements are applied in
+(date, stock-in before stock-out, id) order:
+
+* a receipt moves the average towards its unit cost (StockIn.unit_cost, or
+  the product's unit_price when no cost was captured) and opens a layer;
+* an issue leaves the average unchanged and consumes the oldest layers.
+
+New movements are applied incrementally by apply_movements(), inside the
+transaction that writes them (signals.py, the CSV import and transfers). A
+movement dated before the state it would be added to, an edited movement
+and a pair without state yet are replayed from their history instead, and
+deletes are replayed after commit (schedule_revalue). Reports read the
+state; nothing is replayed at request time.
+
+revalue() with no arguments rebuilds everything. It streams the movements
+merged in pair order from two ordered iterators and writes in batches, so
+memory holds one pair's open layers plus a batch, whatever the history size.
+"""
+import heapq
+import threading
+from collections import deque
+from decimal import Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from ..models import CostLayer, Product, StockIn, StockOut, StockValuation
+from .catalog import get_catalog
+
+ZERO = Decimal('0')
+COST_PLACES = Decimal('0.0001')
+MONEY_PLACES = Decimal('0.01')
+CHUNK_SIZE = 2000
+WRITE_BATCH = 1000
+LAYER_CHUNK = 100
+
+RECEIPT, ISSUE = 0, 1
+
+
+def valuation_method():
+    """'average' or 'fifo' (settings.INVENTORY_VALUATION_METHOD), the cost the reports use"""
+    return getattr(settings, 'INVENTORY_VALUATION_METHOD', 'average')
+
+
+class Layer:
+    __slots__ = ('id', 'stockin_id', 'received_at', 'unit_cost', 'remaining')
+
+    def __init__(self, id, stockin_id, received_at, unit_cost, remaining):
+        self.id = id
+        self.stockin_id = stockin_id
+        self.received_at = received_at
+        self.unit_cost = unit_cost
+        self.remaining = remaining
+
+
+class PairState:
+    """
+    Cost state of one (product, warehouse) while movements are applied.
+
+    Layers already in the database are read lazily, oldest first, only when
+    an issue needs them (`stored_layers` is an iterator). Layers opened by
+    the movements being applied are kept in `new_layers`.
+    """
+
+    def __init__(self, quantity=0, average_cost=ZERO, fifo_value=ZERO, valued_through=None, stored_layers=None):
+        self.quantity = quantity
+        self.average_cost = average_cost
+        self.fifo_value = fifo_value
+        self.valued_through = valued_through
+        self.stored_layers = stored_layers
+        self.loaded = deque()
+        self.new_layers = deque()
+        self.consumed_ids = []
+        self.touched = {}
+
+    def receive(self, quantity, unit_cost, date, stockin_id=None):
+        # A negative balance (issued before its receipt was recorded) is made good first
+        covered = min(max(-self.quantity, 0), quantity)
+        if self.quantity <= 0:
+            self.average_cost = unit_cost
+        else:
+            total = self.quantity * self.average_cost + quantity * unit_cost
+            self.average_cost = (total / (self.quantity + quantity)).quantize(COST_PLACES)
+        self.quantity += quantity
+        if quantity > covered:
+            self.new_layers.append(Layer(None, stockin_id, date, unit_cost, quantity - covered))
+            self.fifo_value += (quantity - covered) * unit_cost
+        self._seen(date)
+
+    def issue(self, quantity, date):
+        remaining = quantity
+        while remaining > 0:
+            layer, queue = self._oldest()
+            if layer is None:
+                # More issued than received: nothing left to cost the rest against
+                break
+            used = min(layer.remaining, remaining)
+            layer.remaining -= used
+            remaining -= used
+            self.fifo_value -= used * layer.unit_cost
+            if layer.remaining == 0:
+                queue.popleft()
+                if layer.id is not None:
+                    self.consumed_ids.append(layer.id)
+                    self.touched.pop(layer.id, None)
+            elif layer.id is not None:
+                self.touched[layer.id] = layer
+        self.quantity -= quantity
+        self._seen(date)
+
+    def _oldest(self):
+        if not self.loaded and self.stored_layers is not None:
+            layer = next(self.stored_layers, None)
+            if layer is None:
+                self.stored_layers = None
+            else:
+                self.loaded.append(layer)
+        if self.loaded:
+            return self.loaded[0], self.loaded
+        if self.new_layers:
+            return self.new_layers[0], self.new_layers
+        return None, None
+
+    def _seen(self, date):
+        if self.valued_through is None or date > self.valued_through:
+            self.valued_through = date
+
+
+def stored_layers(product_id, warehouse_id, first=None, chunk=LAYER_CHUNK):
+    """
+    Open layers of a pair, oldest first, read in keyset-paginated chunks.
+    
+    `first` is the pair's first chunk when it was already fetched (see
+    first_layers), so the database is only asked again for long layer lists.
+    """
+    after = None
+    if first is not None:
+        yield from first
+        if len(first) < chunk:
+            return
+        after = (first[-1].received_at, first[-1].id)
+    while True:
+        layers = CostLayer.objects.filter(product_id=product_id, warehouse_id=warehouse_id)
+        if after:
+            layers = layers.filter(Q(received_at__gt=after[0]) | Q(received_at=after[0], id__gt=after[1]))
+        rows = list(layers.order_by('received_at', 'id').values_list(
+            'id', 'stockin_id', 'received_at', 'unit_cost', 'remaining'
+        )[:chunk])
+        for row in rows:
+            yield Layer(*row)
+        if len(rows) < chunk:
+            return
+        after = (rows[-1][2], rows[-1][0])
+
+
+def first_layers(pairs, chunk=LAYER_CHUNK):
+    """{pair: [Layer, ...]} with up to `chunk` oldest open layers of every pair, in one query"""
+    ranked = _narrow(CostLayer.objects, pairs).annotate(rank=Window(
+        RowNumber(),
+        partition_by=[F('product_id'), F('warehouse_id')],
+        order_by=[F('received_at').asc(), F('id').asc()],
+    ))
+    layers = {pair: [] for pair in pairs}
+    for product_id, warehouse_id, *row in ranked.filter(rank__lte=chunk).order_by(
+        'product_id', 'warehouse_id', 'received_at', 'id'
+    ).values_list('product_id', 'warehouse_id', 'id', 'stockin_id', 'received_at', 'unit_cost', 'remaining'):
+        if (product_id, warehouse_id) in layers:
+            layers[(product_id, warehouse_id)].append(Layer(*row))
+    return layers
+
+
+def movement_entry(movement):
+    """(pair, sort key, kind, quantity, unit_cost, date, stockin_id) for a saved StockIn/StockOut"""
+    pair = (movement.product_id, movement.warehouse_id)
+    if isinstance(movement, StockIn):
+        date = movement.date_received
+        return pair, (date, RECEIPT, movement.pk), RECEIPT, movement.quantity, movement.unit_cost, date, movement.pk
+    date = movement.date_issued
+    return pair, (date, ISSUE, movement.pk), ISSUE, movement.quantity, None, date, None
+
+
+# ========== INCREMENTAL ==========
+def apply_movements(movements):
+    """
+    Bring the cost state up to date with newly saved movements.
+
+    Call inside the transaction that wrote them. Pairs whose state is missing
+    or already past the earliest new movement are replayed instead. The
+    number of queries does not depend on how many movements or pairs there
+    are, except for pairs with more than LAYER_CHUNK open layers to consume.
+    """
+    entries = sorted((movement_entry(movement) for movement in movements), key=lambda entry: (entry[0], entry[1]))
+    if not entries:
+        return
+    pairs = {entry[0] for entry in entries}
+    with transaction.atomic():
+        states = {
+            (state.product_id, state.warehouse_id): state
+            for state in _narrow(StockValuation.objects.select_for_update(), pairs)
+            if (state.product_id, state.warehouse_id) in pairs
+        }
+        by_pair = {
+            pair: list(pair_entries) for pair, pair_entries in groupby(entries, key=lambda entry: entry[0])
+        }
+        replay = {
+            pair for pair, pair_entries in by_pair.items()
+            if pair not in states or (states[pair].valued_through and pair_entries[0][5] < states[pair].valued_through)
+        }
+        issuing = {pair for pair, pair_entries in by_pair.items() if pair not in replay and any(
+            entry[2] == ISSUE for entry in pair_entries
+        )}
+        layers = first_layers(issuing) if issuing else {}
+        prices = _prices({pair[0] for pair in pairs})
+        now = timezone.now()
+        rows, consumed, touched, created = [], [], [], []
+        for pair, pair_entries in by_pair.items():
+            if pair in replay:
+                continue
+            row = states[pair]
+            state = PairState(
+                row.quantity, row.average_cost, row.fifo_value, row.valued_through,
+                stored_layers=stored_layers(*pair, first=layers[pair]) if pair in issuing else None,
+            )
+            for _, _, kind, quantity, unit_cost, date, stockin_id in pair_entries:
+                if kind == RECEIPT:
+                    state.receive(quantity, unit_cost if unit_cost is not None else prices[pair[0]], date, stockin_id)
+                else:
+                    state.issue(quantity, date)
+            row.quantity = state.quantity
+            row.average_cost = state.average_cost
+            row.fifo_value = state.fifo_value.quantize(MONEY_PLACES)
+            row.valued_through = state.valued_through
+            row.updated_at = now
+            rows.append(row)
+            consumed.extend(state.consumed_ids)
+            touched.extend(CostLayer(pk=pk, remaining=layer.remaining) for pk, layer in state.touched.items())
+            created.extend(_layer_row(pair, layer) for layer in state.new_layers)
+        if rows:
+            StockValuation.objects.bulk_update(
+                rows, ['quantity', 'average_cost', 'fifo_value', 'valued_through', 'updated_at'], batch_size=500
+            )
+        if consumed:
+            CostLayer.objects.filter(pk__in=consumed).delete()
+        if touched:
+            CostLayer.objects.bulk_update(touched, ['remaining'], batch_size=500)
+        if created:
+            CostLayer.objects.bulk_create(created, batch_size=500)
+        if replay:
+            revalue(replay)
+
+
+def _layer_row(pair, layer):
+    return CostLayer(
+        product_id=pair[0], warehouse_id=pair[1], stockin_id=layer.stockin_id,
+        received_at=layer.received_at, unit_cost=layer.unit_cost, remaining=layer.remaining,
+    )
+
+
+def _prices(product_ids):
+    catalog = get_catalog()
+    prices = {pk: catalog.products_by_id[pk].unit_price for pk in product_ids if pk in catalog.products_by_id}
+    missing = set(product_ids) - set(prices)
+    if missing:
+        prices.update(Product.objects.filter(pk__in=missing).values_list('id', 'unit_price'))
+    return prices
+
+
+def _narrow(queryset, pairs):
+    """Rows for any product and any warehouse in `pairs`: a superset, callers keep the exact pairs"""
+    return queryset.filter(
+        product_id__in={product_id for product_id, _ in pairs},
+        warehouse_id__in={warehouse_id for _, warehouse_id in pairs},
+    )
+
+
+def _delete_pairs(model, pairs):
+    if pairs is None:
+        model.objects.all().delete()
+        return
+    ids = [
+        pk for pk, product_id, warehouse_id in _narrow(model.objects.order_by(), pairs).values_list(
+            'id', 'product_id', 'warehouse_id'
+        )
+        if (product_id, warehouse_id) in pairs
+    ]
+    for start in range(0, len(ids), 500):
+        model.objects.filter(pk__in=ids[start:start + 500]).delete()
+
+
+# ========== REPLAY ==========
+def _stream(model, date_field, kind, pairs, chunk_size):
+    movements = model.objects.order_by('product_id', 'warehouse_id', date_field, 'id')
+    if pairs is not None:
+        movements = _narrow(movements, pairs)
+    fields = ['id', 'product_id', 'warehouse_id', date_field, 'quantity']
+    if kind == RECEIPT:
+        fields.append('unit_cost')
+    for row in movements.values_list(*fields).iterator(chunk_size=chunk_size):
+        pk, product_id, warehouse_id, date, quantity = row[:5]
+        if pairs is not None and (product_id, warehouse_id) not in pairs:
+            continue
+        unit_cost = row[5] if kind == RECEIPT else None
+        yield (product_id, warehouse_id, date, kind, pk), quantity, unit_cost
+
+
+def revalue(pairs=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Replay the movement history of `pairs` (all pairs when None) into fresh
+    cost state. Returns the number of pairs valued. `progress(pairs_done)`
+    is called after each written batch.
+    """
+    if pairs is not None and not pairs:
+        return 0
+    with transaction.atomic():
+        _delete_pairs(CostLayer, pairs)
+        _delete_pairs(StockValuation, pairs)
+
+        prices = dict(Product.objects.values_list('id', 'unit_price')) if pairs is None else _prices(
+            {pair[0] for pair in pairs}
+        )
+        merged = heapq.merge(
+            _stream(StockIn, 'date_received', RECEIPT, pairs, chunk_size),
+            _stream(StockOut, 'date_issued', ISSUE, pairs, chunk_size),
+            key=lambda item: item[0],
+        )
+        states, layers, done = [], [], 0
+        for pair, pair_items in groupby(merged, key=lambda item: item[0][:2]):
+            state = PairState()
+            for (_, _, date, kind, pk), quantity, unit_cost in pair_items:
+                if kind == RECEIPT:
+                    state.receive(quantity, unit_cost if unit_cost is not None else prices.get(pair[0], ZERO), date, pk)
+                else:
+                    state.issue(quantity, date)
+            states.append(StockValuation(
+                product_id=pair[0], warehouse_id=pair[1], quantity=state.quantity,
+                average_cost=state.average_cost, fifo_value=state.fifo_value.quantize(MONEY_PLACES),
+                valued_through=state.valued_through,
+            ))
+            layers.extend(_layer_row(pair, layer) for layer in state.new_layers)
+            done += 1
+            if len(states) >= WRITE_BATCH or len(layers) >= WRITE_BATCH * 5:
+                _flush(states, layers)
+                if progress:
+                    progress(done)
+        _flush(states, layers)
+    return done
+
+
+def _flush(states, layers):
+    StockValuation.objects.bulk_create(states, batch_size=500)
+    CostLayer.objects.bulk_create(layers, batch_size=500)
+    states.clear()
+    layers.clear()
+
+
+# ========== DELETES ==========
+_pending = threading.local()
+
+
+def schedule_revalue(pair):
+    """Replay a pair after the current transaction commits (deletes; repeated pairs are replayed once)"""
+    pending = getattr(_pending, 'pairs', None)
+    if pending is None:
+        pending = _pending.pairs = set()
+    pending.add(pair)
+    transaction.on_commit(_revalue_pending)
+
+
+def _revalue_pending():
+    pairs = getattr(_pending, 'pairs', None)
+    if pairs:
+        _pending.pairs = set()
+        revalue(pairs)
+
+
+# ========== READING ==========
+def unit_costs(products=None, warehouses=None, method=None):
+    """{(product_id, warehouse_id): unit cost} from the stored state, for the chosen method"""
+    method = method or valuation_method()
+    rows = StockValuation.objects.all()
+    if products is not None:
+        rows = rows.filter(product__in=products)
+    if warehouses is not None:
+        rows = rows.filter(warehouse__in=warehouses)
+    costs = {}
+    for product_id, warehouse_id, quantity, average_cost, fifo_value in rows.values_list(
+        'product_id', 'warehouse_id', 'quantity', 'average_cost', 'fifo_value'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        if method == 'fifo' and quantity > 0:
+            costs[(product_id, warehouse_id)] = fifo_value / quantity
+        else:
+            costs[(product_id, warehouse_id)] = average_cost
+    return costs
+
+
+def current_average_costs(product_ids, warehouse_id):
+    """{product_id: average cost} at one warehouse, for carrying cost across a transfer"""
+    return dict(StockValuation.objects.filter(
+        product_id__in=product_ids, warehouse_id=warehouse_id
+    ).values_list('product_id', 'average_cost'))
@@ -0,0 +1,106 @@
+# warehouse/signals.py
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .models import Category, Product, Warehouse, StockIn, StockOut, StockBalance, DailyMovement
+from .services.catalog import invalidate_catalog
+from .services.dashboard import invalidate_dashboard_snapshot
+from .services.instrumentation import install_query_timer
+from .services.live import publish_movement, publish_refresh
+from .services.product_search import ensure_movement_search_indexes, ensure_search_index
+from .services.report_cache import bump_movement_sequence
+from .services.valuation import apply_movements, revalue, schedule_revalue
+
+
+def deleted_with_parent(origin):
+    """True when a movement is deleted because its product or warehouse is (the same cascade drops the totals)"""
+    if isinstance(origin, QuerySet):
+        return issubclass(origin.model, (Product, Warehouse))
+    return isinstance(origin, (Product, Warehouse))
+
+
+@receiver(post_delete, sender=StockIn)
+@receiver(post_delete, sender=StockOut)
+def reverse_movement_balance(sender, instance, origin=None, **kwargs):
+    """Take a deleted movement back out of StockBalance and DailyMovement, and revalue its pair after commit"""
+    if deleted_with_parent(origin):
+        # Balances, rollup rows and cost state of the pair cascade away too;
+        # writing to them here would recreate rows for a parent being deleted
+        return
+    StockBalance.apply(instance.product_id, instance.warehouse_id, -sender.BALANCE_SIGN * instance.quantity)
+    DailyMovement.apply_many(instance.add_to_rollup({}, sign=-1))
+    schedule_revalue((instance.product_id, instance.warehouse_id))
+
+
+@receiver(post_save, sender=StockIn)
+@receiver(post_save, sender=StockOut)
+def value_movement(sender, instance, created=False, raw=False, **kwargs):
+    """Apply a saved movement to the cost state; an edit replays the pairs it touched"""
+    if raw:
+        return
+    if created:
+        apply_movements([instance])
+        return
+    pairs = {(instance.product_id, instance.warehouse_id)}
+    previous = getattr(instance, '_previous_movement', None)
+    if previous:
+        pairs.add((previous['product_id'], previous['warehouse_id']))
+    revalue(pairs)
+
+
+@receiver(post_save, sender=StockIn)
+@receiver(post_save, sender=StockOut)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=StockIn)
+@receiver(post_delete, sender=StockOut)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Warehouse)
+def expire_dashboard_snapshot(sender, **kwargs):
+    """Drop the cached dashboard and move the reports to a new cache version once the write is committed"""
+    transaction.on_commit(invalidate_dashboard_snapshot)
+    transaction.on_commit(bump_movement_sequence)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Warehouse)
+def expire_catalog(sender, **kwargs):
+    """New catalog version now (this process) and again on commit (readers that reloaded mid-transaction)"""
+    invalidate_catalog()
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=StockIn)
+@receiver(post_save, sender=StockOut)
+@receiver(post_delete, sender=StockIn)
+@receiver(post_delete, sender=StockOut)
+def push_live_dashboard(sender, instance, created=False, **kwargs):
+    """Push a dashboard delta to open SSE connections once the write is committed"""
+    if created:
+        kind = 'in' if sender is StockIn else 'out'
+        transaction.on_commit(lambda: publish_movement(kind, instance))
+    else:
+        transaction.on_commit(publish_refresh)
+
+
+@receiver(post_migrate)
+def restore_product_search_index(sender, using='default', **kwargs):
+    """Put back FTS triggers and search indexes that a table rebuild in a later migration dropped"""
+    if sender.name == 'warehouse':
+        ensure_search_index(using)
+        ensure_movement_search_indexes(using)
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    """Report this connection's queries to the request profile (PerformanceMiddleware)"""
+    install_query_timer(connection)
@@ -0,0 +1,38 @@
+from django import template
+
+from warehouse.services.report_cache import cached_fragment
+
+register = template.Library()
+
+
+class ReportFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        version = context.get('report_version')
+        if version is None:
+            return self.nodelist.render(context)
+        parts = [var.resolve(context) for var in self.vary_on]
+        return cached_fragment(self.name, version, parts, lambda: self.nodelist.render(context))
+
+
+@register.tag('report_fragment')
+def report_fragment(parser, token):
+    """
+    Cache the enclosed HTML under the report's movement sequence:
+
+        {% report_fragment "stock_table" as_of %} ... {% endreport_fragment %}
+
+    Extra arguments are variables the fragment depends on besides the data.
+    Without a `report_version` in the context the block renders uncached.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError("'report_fragment' needs a fragment name")
+    nodelist = parser.parse(('endreport_fragment',))
+    parser.delete_first_token()
+    name = bits[1].strip('"\'')
+    return ReportFragmentNode(nodelist, name, [parser.compile_filter(bit) for bit in bits[2:]])
@@ -1,3 +1,1775 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import (
+    Product, Warehouse, StockIn, StockOut, StockBalance, StockTransfer, DailyMovement,
+    StockValuation, CostLayer, ReportJob,
+)
+from .services.movement_import import import_movements
+from .services.report_cache import bump_movement_sequence
+from .services.stock_issue import create_stockout
+from .services.transfers import TransferError, create_transfer
+from .services.valuation import revalue
+
+
+class StockBalanceTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Sukari', sku='SUK-001')
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.branch = Warehouse.objects.create(name='Branch', code='WH002')
+    
+    def receive(self, quantity, warehouse=None, ref='IN-1'):
+        return StockIn.objects.create(
+            product=self.product, warehouse=warehouse or self.main,
+            quantity=quantity, supplier='Supplier', reference_no=ref,
+        )
+    
+    def issue(self, quantity, warehouse=None, ref='OUT-1'):
+        return StockOut.objects.create(
+            product=self.product, warehouse=warehouse or self.main,
+            quantity=quantity, customer='Customer', reference_no=ref,
+        )
+    
+    def test_movements_update_balance(self):
+        self.receive(50)
+        self.receive(20, warehouse=self.branch, ref='IN-2')
+        self.issue(15)
+        self.assertEqual(self.product.get_stock_by_warehouse(self.main), 35)
+        self.assertEqual(self.product.get_stock_by_warehouse(self.branch), 20)
+        self.assertEqual(self.product.get_total_stock(), 55)
+    
+    def test_edit_moves_quantity_between_warehouses(self):
+        stockin = self.receive(50)
+        stockin.quantity = 30
+        stockin.warehouse = self.branch
+        stockin.save()
+        self.assertEqual(self.product.get_stock_by_warehouse(self.main), 0)
+        self.assertEqual(self.product.get_stock_by_warehouse(self.branch), 30)
+    
+    def test_delete_reverses_balance(self):
+        self.receive(50)
+        self.issue(10).delete()
+        self.assertEqual(self.product.get_stock_by_warehouse(self.main), 50)
+        StockIn.objects.all().delete()
+        self.assertEqual(self.product.get_total_stock(), 0)
+    
+    def test_stockout_cannot_exceed_balance(self):
+        self.receive(5)
+        with self.assertRaises(ValidationError):
+            self.issue(6)
+        self.assertEqual(self.product.get_stock_by_warehouse(self.main), 5)
+    
+    def test_deleting_product_or_warehouse_with_movements(self):
+        self.receive(50)
+        self.issue(10)
+        self.receive(5, warehouse=self.branch, ref='IN-2')
+        self.branch.delete()
+        self.assertEqual(self.product.get_total_stock(), 40)
+        self.assertFalse(StockIn.objects.filter(reference_no='IN-2').exists())
+        Product.objects.filter(pk=self.product.pk).delete()
+        self.assertFalse(StockBalance.objects.exists())
+        self.assertFalse(DailyMovement.objects.exists())
+        self.assertFalse(StockValuation.objects.exists())
+        self.assertFalse(CostLayer.objects.exists())
+    
+    def test_rebuild_command_repairs_drift(self):
+        self.receive(50)
+        self.issue(10)
+        StockBalance.objects.update(quantity=999)
+        call_command('rebuild_stock_balances', verbosity=0, stdout=StringIO())
+        self.assertEqual(self.product.get_stock_by_warehouse(self.main), 40)
+
+
+class ConcurrentIssueTests(TransactionTestCase):
+    """Many threads issuing the same stock at once must never oversell"""
+    
+    THREADS = 8
+    ATTEMPTS_PER_THREAD = 20
+    
+    def test_parallel_issues_never_oversell(self):
+        product = Product.objects.create(name='Sukari', sku='SUK-001')
+        warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        StockIn.objects.create(
+            product=product, warehouse=warehouse, quantity=100, supplier='Supplier', reference_no='IN-1'
+        )
+        issued, rejected, errors = [], [], []
+        
+        def worker(n):
+            try:
+                for i in range(self.ATTEMPTS_PER_THREAD):
+                    try:
+                        create_stockout(product, warehouse, 1, 'Customer', f'OUT-{n}-{i}')
+                        issued.append(1)
+                    except ValidationError:
+                        rejected.append(1)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(errors, [])
+        self.assertEqual(len(issued), 100)
+        self.assertEqual(len(rejected), self.THREADS * self.ATTEMPTS_PER_THREAD - 100)
+        self.assertEqual(StockOut.objects.count(), 100)
+        self.assertEqual(product.get_stock_by_warehouse(warehouse), 0)
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.branch = Warehouse.objects.create(name='Branch', code='WH002')
+        self.sugar = Product.objects.create(name='Sukari', sku='SUK-001')
+        self.rice = Product.objects.create(name='Mchele', sku='MCH-001')
+        for n, product in enumerate([self.sugar, self.rice]):
+            StockIn.objects.create(
+                product=product, warehouse=self.main, quantity=50, supplier='Supplier', reference_no=f'IN-{n}'
+            )
+    
+    def test_multi_line_transfer_moves_all_lines(self):
+        transfer = create_transfer(self.main, self.branch, [(self.sugar.id, 20), (self.rice.id, 5), (self.sugar.id, 10)])
+        self.assertEqual(self.sugar.get_stock_by_warehouse(self.main), 20)
+        self.assertEqual(self.sugar.get_stock_by_warehouse(self.branch), 30)
+        self.assertEqual(self.rice.get_stock_by_warehouse(self.branch), 5)
+        self.assertEqual(
+            set(StockOut.objects.values_list('reference_no', flat=True)),
+            {f'{transfer.number}-001-OUT', f'{transfer.number}-002-OUT'}
+        )
+        self.assertEqual(StockIn.objects.filter(reference_no__startswith=transfer.number).count(), 2)
+    
+    def test_back_to_back_transfers_get_unique_numbers(self):
+        first = create_transfer(self.main, self.branch, [(self.sugar.id, 1)])
+        second = create_transfer(self.main, self.branch, [(self.sugar.id, 1)])
+        self.assertNotEqual(first.number, second.number)
+        self.assertEqual(StockOut.objects.count(), 2)
+    
+    def test_short_line_rolls_back_whole_transfer(self):
+        with self.assertRaises(TransferError) as ctx:
+            create_transfer(self.main, self.branch, [(self.sugar.id, 10), (self.rice.id, 51)])
+        self.assertIn('Mchele', str(ctx.exception))
+        self.assertEqual(StockTransfer.objects.count(), 0)
+        self.assertEqual(StockOut.objects.count(), 0)
+        self.assertEqual(self.sugar.get_stock_by_warehouse(self.main), 50)
+        self.assertEqual(self.sugar.get_stock_by_warehouse(self.branch), 0)
+    
+    def test_transfer_api(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        self.client.force_login(User.objects.create_user('clerk'))
+        body = {
+            'from_warehouse': self.main.id, 'to_warehouse': self.branch.id,
+            'lines': [{'product': self.sugar.id, 'quantity': 5}, {'product': self.rice.id, 'quantity': 5}],
+        }
+        # Includes valuing the lines: the branch pairs have no cost state yet and are replayed
+        with self.assertNumQueries(33):
+            response = self.client.post(reverse('transfer_api'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['lines'], 2)
+        
+        body['lines'] = [{'product': self.sugar.id, 'quantity': 500}]
+        response = self.client.post(reverse('transfer_api'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+    
+    def test_transfer_api_rejects_bad_warehouses_and_lines(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        self.client.force_login(User.objects.create_user('clerk'))
+        lines = [{'product': self.sugar.id, 'quantity': 5}]
+        cases = [
+            ({'to_warehouse': self.branch.id, 'lines': lines}, 'namba za ghala'),
+            ({'from_warehouse': 'main', 'to_warehouse': self.branch.id, 'lines': lines}, 'namba za ghala'),
+            ({'from_warehouse': [self.main.id], 'to_warehouse': self.branch.id, 'lines': lines}, 'namba za ghala'),
+            ({'from_warehouse': self.main.id, 'to_warehouse': 9999, 'lines': lines}, 'ghala halipo'),
+            ({'from_warehouse': str(self.main.id), 'to_warehouse': self.branch.id, 'lines': 5}, 'orodha ya bidhaa'),
+            ({'from_warehouse': self.main.id, 'to_warehouse': self.branch.id, 'lines': [5]}, 'orodha ya bidhaa'),
+            ({'from_warehouse': self.main.id, 'to_warehouse': self.branch.id, 'lines': [{'product': None, 'quantity': 1}]}, 'mstari 1'),
+        ]
+        for body, error in cases:
+            with self.subTest(body=body):
+                response = self.client.post(reverse('transfer_api'), body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(error, response.json()['errors'][0])
+        self.assertEqual(StockTransfer.objects.count(), 0)
+
+
+class ValuationTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Sukari', sku='SUK-001', unit_price=Decimal('3000'))
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.branch = Warehouse.objects.create(name='Branch', code='WH002')
+        self.start = timezone.now() - timedelta(days=10)
+    
+    def receive(self, quantity, unit_cost, days, ref):
+        return StockIn.objects.create(
+            product=self.product, warehouse=self.main, quantity=quantity, unit_cost=unit_cost,
+            supplier='Supplier', reference_no=ref, date_received=self.start + timedelta(days=days),
+        )
+    
+    def issue(self, quantity, days, ref):
+        return StockOut.objects.create(
+            product=self.product, warehouse=self.main, quantity=quantity,
+            customer='Customer', reference_no=ref, date_issued=self.start + timedelta(days=days),
+        )
+    
+    def state(self, warehouse=None):
+        return StockValuation.objects.get(product=self.product, warehouse=warehouse or self.main)
+    
+    def snapshot(self):
+        return (
+            list(StockValuation.objects.order_by('warehouse_id').values_list(
+                'warehouse_id', 'quantity', 'average_cost', 'fifo_value', 'valued_through'
+            )),
+            list(CostLayer.objects.order_by('warehouse_id', 'received_at').values_list(
+                'warehouse_id', 'stockin_id', 'unit_cost', 'remaining'
+            )),
+        )
+    
+    def test_average_and_fifo(self):
+        self.receive(10, Decimal('100'), 0, 'IN-1')
+        self.receive(30, Decimal('200'), 1, 'IN-2')
+        self.issue(15, 2, 'OUT-1')
+        state = self.state()
+        self.assertEqual(state.quantity, 25)
+        self.assertEqual(state.average_cost, Decimal('175'))
+        # FIFO: the first receipt is used up, 25 left of the second
+        self.assertEqual(state.fifo_value, Decimal('5000'))
+        self.assertEqual(list(CostLayer.objects.values_list('unit_cost', 'remaining')), [(Decimal('200'), 25)])
+    
+    def test_receipt_without_cost_uses_unit_price(self):
+        self.receive(4, None, 0, 'IN-1')
+        self.assertEqual(self.state().average_cost, Decimal('3000'))
+    
+    def test_backdated_and_edited_movements_match_full_revalue(self):
+        self.receive(10, Decimal('100'), 0, 'IN-1')
+        self.issue(5, 3, 'OUT-1')
+        self.receive(10, Decimal('400'), 1, 'IN-2')
+        stockin = self.receive(10, Decimal('250'), 4, 'IN-3')
+        stockin.unit_cost = Decimal('300')
+        stockin.save()
+        incremental = self.snapshot()
+        self.assertEqual(revalue(), 1)
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(self.state().fifo_value, Decimal('7500'))
+    
+    def test_delete_revalues_after_commit(self):
+        self.receive(10, Decimal('100'), 0, 'IN-1')
+        stockin = self.receive(10, Decimal('300'), 1, 'IN-2')
+        with self.captureOnCommitCallbacks(execute=True):
+            stockin.delete()
+        state = self.state()
+        self.assertEqual((state.quantity, state.average_cost, state.fifo_value), (10, Decimal('100'), Decimal('1000')))
+    
+    def test_transfer_carries_source_cost(self):
+        self.receive(10, Decimal('100'), 0, 'IN-1')
+        self.receive(10, Decimal('300'), 1, 'IN-2')
+        create_transfer(self.main, self.branch, [(self.product.id, 5)])
+        self.assertEqual(StockIn.objects.get(warehouse=self.branch).unit_cost, Decimal('200'))
+        self.assertEqual(self.state(self.branch).average_cost, Decimal('200'))
+        self.assertEqual(self.state().fifo_value, Decimal('3500'))
+    
+    def test_import_applies_costs(self):
+        csv_text = (
+            "type,sku,warehouse,quantity,party,reference_no,unit_cost\n"
+            "in,SUK-001,WH001,10,Supplier,IMP-1,150\n"
+            "out,SUK-001,WH001,4,Customer,IMP-2,\n"
+        )
+        import_movements(StringIO(csv_text))
+        state = self.state()
+        self.assertEqual((state.quantity, state.average_cost, state.fifo_value), (6, Decimal('150'), Decimal('900')))
+    
+    def test_stock_report_values_at_cost(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        self.receive(10, Decimal('100'), 0, 'IN-1')
+        self.client.force_login(User.objects.create_user('clerk'))
+        response = self.client.get(reverse('stock_report'))
+        self.assertEqual(response.context['total_value'], Decimal('1000'))
+    
+    def test_revalue_command(self):
+        self.receive(10, Decimal('100'), 0, 'IN-1')
+        StockValuation.objects.all().delete()
+        CostLayer.objects.all().delete()
+        out = StringIO()
+        call_command('revalue_inventory', stdout=out)
+        self.assertEqual(self.state().fifo_value, Decimal('1000'))
+        self.assertIn('1', out.getvalue())
+
+
+@override_settings(
+    REPLENISHMENT_HISTORY_DAYS=28, REPLENISHMENT_LEAD_TIME_DAYS=7,
+    REPLENISHMENT_REVIEW_DAYS=14, REPLENISHMENT_SERVICE_Z=1.65,
+)
+class ReplenishmentTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.branch = Warehouse.objects.create(name='Branch', code='WH002')
+        self.sugar = Product.objects.create(name='Sukari', sku='SUK-001', reorder_level=10, unit_price=Decimal('100'))
+        self.rice = Product.objects.create(name='Mchele', sku='MCH-001', reorder_level=50)
+        # The window ends today (the engine's "yesterday")
+        self.today = timezone.localdate() + timedelta(days=1)
+    
+    def at(self, days_ago):
+        return timezone.now() - timedelta(days=days_ago)
+    
+    def stock_sugar(self):
+        StockIn.objects.create(
+            product=self.sugar, warehouse=self.main, quantity=100, supplier='S', reference_no='IN-1',
+            date_received=self.at(40),
+        )
+        # 4 units every other day for 28 days: 2/day on average, standard deviation 2
+        for n in range(14):
+            StockOut.objects.create(
+                product=self.sugar, warehouse=self.main, quantity=4, customer='C', reference_no=f'OUT-{n}',
+                date_issued=self.at(n * 2),
+            )
+    
+    def test_demand_and_reorder_point(self):
+        from .models import ReplenishmentPlan
+        from .services.replenishment import compute_replenishment
+        self.stock_sugar()
+        summary = compute_replenishment(today=self.today)
+        self.assertEqual((summary['products'], summary['with_demand']), (2, 1))
+        plan = ReplenishmentPlan.objects.get(product=self.sugar)
+        self.assertAlmostEqual(plan.daily_demand, 2.0)
+        self.assertAlmostEqual(plan.demand_std, 2.0)
+        self.assertEqual(plan.history_days, 28)
+        # ceil(1.65 * 2 * sqrt(7)) = 9; 2 * 7 + 9 = 23; 23 + 2 * 14 = 51
+        self.assertEqual((plan.safety_stock, plan.reorder_point, plan.order_up_to), (9, 23, 51))
+        self.assertEqual((plan.stock, plan.days_of_cover, plan.suggested_quantity), (44, 22.0, 7))
+        
+        # No demand: the fixed reorder level, as before
+        plan = ReplenishmentPlan.objects.get(product=self.rice)
+        self.assertEqual((plan.daily_demand, plan.reorder_point, plan.order_up_to), (0, 50, 100))
+        self.assertIsNone(plan.days_of_cover)
+    
+    def test_transfers_are_not_demand(self):
+        from .models import ReplenishmentPlan
+        from .services.replenishment import compute_replenishment
+        self.stock_sugar()
+        create_transfer(self.main, self.branch, [(self.sugar.id, 30)])
+        compute_replenishment(today=self.today)
+        plan = ReplenishmentPlan.objects.get(product=self.sugar)
+        self.assertAlmostEqual(plan.daily_demand, 2.0)
+        self.assertEqual(plan.stock, 44)
+        
+        # Only lines linked to a transfer document are left out, whatever their reference looks like
+        StockOut.objects.create(
+            product=self.sugar, warehouse=self.branch, quantity=28, customer='C', reference_no='TRF-MANUAL-1',
+        )
+        compute_replenishment(today=self.today)
+        self.assertAlmostEqual(ReplenishmentPlan.objects.get(product=self.sugar).daily_demand, 3.0)
+    
+    def test_recompute_updates_in_place(self):
+        from .models import ReplenishmentPlan
+        from .services.replenishment import compute_replenishment
+        compute_replenishment(today=self.today)
+        self.stock_sugar()
+        compute_replenishment(today=self.today, chunk_products=1)
+        self.assertEqual(ReplenishmentPlan.objects.count(), 2)
+        self.assertEqual(ReplenishmentPlan.objects.get(product=self.sugar).reorder_point, 23)
+    
+    def test_matches_per_product_loop(self):
+        import random
+        import statistics
+        from .models import ReplenishmentPlan
+        from .services.replenishment import compute_replenishment
+        random.seed(7)
+        last_day = self.today - timedelta(days=1)
+        daily = {self.sugar.id: [0] * 28, self.rice.id: [0] * 28}
+        deltas = {}
+        for _ in range(80):
+            product_id = random.choice(list(daily))
+            offset, quantity = random.randrange(28), random.randint(1, 9)
+            # Both warehouses on the same day must add up before squaring
+            warehouse = random.choice([self.main, self.branch])
+            daily[product_id][offset] += quantity
+            DailyMovement.add_movement(
+                deltas, False, product_id, warehouse.id,
+                timezone.make_aware(datetime.combine(last_day - timedelta(days=27 - offset), datetime.min.time())),
+                quantity,
+            )
+        DailyMovement.apply_many(deltas)
+        DailyMovement.objects.create(day=last_day - timedelta(days=60), product=self.sugar, warehouse=self.main)
+        DailyMovement.objects.create(day=last_day - timedelta(days=60), product=self.rice, warehouse=self.main)
+        compute_replenishment(today=self.today)
+        for product_id, days in daily.items():
+            plan = ReplenishmentPlan.objects.get(product_id=product_id)
+            self.assertAlmostEqual(plan.daily_demand, statistics.fmean(days), places=3)
+            self.assertAlmostEqual(plan.demand_std, statistics.pstdev(days), places=3)
+    
+    def test_python_fallback_matches_numpy(self):
+        from unittest import mock
+        from .models import ReplenishmentPlan
+        from .services import replenishment
+        if replenishment._numpy() is None:
+            self.skipTest('numpy is not installed')
+        self.stock_sugar()
+        fields = ['product_id'] + replenishment.PLAN_FIELDS[:-1]
+        replenishment.compute_replenishment(today=self.today)
+        with_numpy = list(ReplenishmentPlan.objects.order_by('product_id').values_list(*fields))
+        with mock.patch.object(replenishment, '_numpy', return_value=None):
+            replenishment.compute_replenishment(today=self.today)
+        self.assertEqual(list(ReplenishmentPlan.objects.order_by('product_id').values_list(*fields)), with_numpy)
+    
+    def test_low_stock_report_uses_plans(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        from .services.replenishment import compute_replenishment
+        self.stock_sugar()
+        StockIn.objects.create(
+            product=self.rice, warehouse=self.main, quantity=30, supplier='S', reference_no='IN-2',
+            date_received=self.at(40),
+        )
+        self.client.force_login(User.objects.create_user('clerk'))
+        # reorder_level 10 < 44 on hand, rice 30 <= 50: only rice is low
+        response = self.client.get(reverse('low_stock_report'))
+        self.assertEqual([p['sku'] for p in response.context['products']], ['MCH-001'])
+        
+        StockOut.objects.create(
+            product=self.sugar, warehouse=self.main, quantity=24, customer='C', reference_no='OUT-X',
+            date_issued=self.at(100),
+        )
+        compute_replenishment(today=self.today)
+        from django.core.cache import cache
+        cache.clear()
+        response = self.client.get(reverse('low_stock_report'))
+        rows = {p['sku']: p for p in response.context['products']}
+        self.assertEqual(set(rows), {'SUK-001', 'MCH-001'})
+        sugar = rows['SUK-001']
+        self.assertEqual((sugar['current_stock'], sugar['reorder_level'], sugar['needed_quantity']), (20, 23, 31))
+        self.assertEqual(sugar['days_of_cover'], 10.0)
+    
+    def test_command(self):
+        out = StringIO()
+        call_command('compute_replenishment', stdout=out)
+        self.assertIn('Planned 2 product(s)', out.getvalue())
+
+
+class DailyMovementTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user('clerk', password='pass')
+        self.sugar = Product.objects.create(name='Sukari', sku='SUK-001')
+        self.rice = Product.objects.create(name='Mchele', sku='MCH-001')
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.branch = Warehouse.objects.create(name='Branch', code='WH002')
+    
+    def stored(self):
+        return {
+            (row[0], row[1], row[2]): tuple(row[3:])
+            for row in DailyMovement.objects.exclude(
+                qty_in=0, qty_out=0, lines_in=0, lines_out=0
+            ).values_list('day', 'product_id', 'warehouse_id', *DailyMovement.FIELDS)
+        }
+    
+    def test_every_write_path_keeps_rollup_in_step(self):
+        from datetime import timedelta
+        last_month = timezone.now() - timedelta(days=40)
+        StockIn.objects.create(product=self.sugar, warehouse=self.main, quantity=50, supplier='S', reference_no='IN-1')
+        old = StockIn.objects.create(
+            product=self.rice, warehouse=self.main, quantity=30, supplier='S', reference_no='IN-2',
+            date_received=last_month,
+        )
+        StockOut.objects.create(product=self.sugar, warehouse=self.main, quantity=5, customer='C', reference_no='OUT-1')
+        old.quantity = 40
+        old.date_received = timezone.now()
+        old.save()
+        StockOut.objects.get(reference_no='OUT-1').delete()
+        create_transfer(self.main, self.branch, [(self.sugar.id, 10)])
+        import_movements(StringIO(
+            'type,sku,warehouse,quantity,party,reference_no\n'
+            'out,MCH-001,WH001,7,Duka,INV-9\n'
+        ))
+        self.assertEqual(self.stored(), DailyMovement.compute_totals())
+        today = timezone.localdate()
+        self.assertEqual(self.stored()[(today, self.rice.id, self.main.id)], (40, 7, 1, 1))
+    
+    def test_backfill_command(self):
+        StockIn.objects.create(product=self.sugar, warehouse=self.main, quantity=50, supplier='S', reference_no='IN-1')
+        DailyMovement.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_daily_movements', '--check', stdout=out)
+        self.assertIn('1 rollup row(s) out of step', out.getvalue())
+        from .services.report_cache import movement_sequence
+        sequence = movement_sequence()
+        call_command('rebuild_daily_movements', '--check', stdout=StringIO())
+        self.assertEqual(movement_sequence(), sequence)
+        call_command('rebuild_daily_movements', stdout=StringIO())
+        self.assertEqual(self.stored(), DailyMovement.compute_totals())
+        self.assertGreater(movement_sequence(), sequence)
+    
+    def test_monthly_report_for_any_period(self):
+        from datetime import datetime
+        from django.urls import reverse
+        self.client.force_login(self.user)
+        march = timezone.make_aware(datetime(2025, 3, 10, 12))
+        StockIn.objects.create(
+            product=self.sugar, warehouse=self.main, quantity=50, supplier='S', reference_no='IN-1', date_received=march,
+        )
+        StockIn.objects.create(
+            product=self.rice, warehouse=self.main, quantity=80, supplier='S', reference_no='IN-2', date_received=march,
+        )
+        StockOut.objects.create(
+            product=self.sugar, warehouse=self.main, quantity=45, customer='C', reference_no='OUT-1',
+            date_issued=march.replace(day=20),
+        )
+        
+        response = self.client.get(reverse('monthly_report'), {'year': 2025, 'month': 3})
+        self.assertEqual(response.context['monthly_in_total'], 130)
+        self.assertEqual(response.context['monthly_out_total'], 45)
+        self.assertEqual(response.context['total_transactions'], 3)
+        self.assertEqual([p['sku'] for p in response.context['top_products']], ['SUK-001', 'MCH-001'])
+        
+        response = self.client.get(reverse('monthly_report'), {'date_from': '2025-03-15', 'date_to': '2025-03-31'})
+        self.assertEqual(response.context['monthly_in_total'], 0)
+        self.assertEqual(response.context['monthly_out_total'], 45)
+        self.assertEqual(response.context['month'], '15/03/2025 - 31/03/2025')
+        
+        response = self.client.get(reverse('monthly_report'), {'year': 2024, 'month': 3})
+        self.assertFalse(response.context['has_data'])
+
+
+class CheckpointTests(TestCase):
+    def setUp(self):
+        from datetime import date, datetime
+        self.product = Product.objects.create(name='Sukari', sku='SUK-001')
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.branch = Warehouse.objects.create(name='Branch', code='WH002')
+        self.march_end = date(2025, 3, 31)
+        
+        def at(month, day):
+            return timezone.make_aware(datetime(2025, month, day, 10))
+        StockIn.objects.create(
+            product=self.product, warehouse=self.main, quantity=100, supplier='S', reference_no='IN-1',
+            date_received=at(3, 5),
+        )
+        StockOut.objects.create(
+            product=self.product, warehouse=self.main, quantity=30, customer='C', reference_no='OUT-1',
+            date_issued=at(3, 20),
+        )
+        StockIn.objects.create(
+            product=self.product, warehouse=self.branch, quantity=40, supplier='S', reference_no='IN-2',
+            date_received=at(4, 2),
+        )
+        StockOut.objects.create(
+            product=self.product, warehouse=self.main, quantity=20, customer='C', reference_no='OUT-2',
+            date_issued=at(4, 10),
+        )
+    
+    def test_as_of_with_and_without_checkpoint(self):
+        from datetime import date
+        from .services.checkpoints import balances_as_of, close_period
+        without, checkpoint = balances_as_of(date(2025, 4, 5))
+        self.assertIsNone(checkpoint)
+        
+        close_period(self.march_end)
+        with_checkpoint, checkpoint = balances_as_of(date(2025, 4, 5))
+        self.assertEqual(checkpoint.cutoff_date, self.march_end)
+        self.assertEqual(with_checkpoint, without)
+        self.assertEqual(with_checkpoint, {(self.product.id, self.main.id): 70, (self.product.id, self.branch.id): 40})
+        
+        # Only the rollup rows after the cutoff are read
+        DailyMovement.objects.filter(day__lte=self.march_end).delete()
+        self.assertEqual(balances_as_of(date(2025, 4, 30))[0][(self.product.id, self.main.id)], 50)
+        self.assertEqual(balances_as_of(self.march_end)[0], {(self.product.id, self.main.id): 70})
+    
+    def test_close_period_command_and_balance_rebuild(self):
+        call_command('close_period', '2025-03-31', stdout=StringIO())
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            call_command('close_period', '2025-03-31', stdout=StringIO())
+        from .services.report_cache import movement_sequence
+        sequence = movement_sequence()
+        call_command('close_period', '2025-03-31', '--replace', stdout=StringIO())
+        self.assertGreater(movement_sequence(), sequence)
+        out = StringIO()
+        call_command('close_period', '--check', stdout=out)
+        self.assertIn('All checkpoints match', out.getvalue())
+        
+        StockBalance.objects.update(quantity=0)
+        call_command('rebuild_stock_balances', verbosity=0, stdout=StringIO())
+        self.assertEqual(self.product.get_stock_by_warehouse(self.main), 50)
+        self.assertEqual(StockBalance.compute_totals(), StockBalance.compute_totals(full_history=True))
+    
+    def test_stock_as_of_api_and_report(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        self.client.force_login(User.objects.create_user('clerk'))
+        response = self.client.get(reverse('stock_as_of_api'), {'date': '2025-03-31', 'warehouse': self.main.id})
+        self.assertEqual(response.json()['total'], 70)
+        self.assertEqual(self.client.get(reverse('stock_as_of_api')).status_code, 400)
+        
+        response = self.client.get(reverse('stock_report'), {'as_of': '2025-04-05'})
+        self.assertEqual(response.context['total_items'], 110)
+        response = self.client.get(reverse('stock_report'))
+        self.assertEqual(response.context['total_items'], 90)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        self.product = Product.objects.create(name='Sukari', sku='SUK-001')
+    
+    def test_reloads_only_after_master_data_write(self):
+        from .services.catalog import catalog_stats, get_catalog
+        get_catalog()
+        misses = catalog_stats()['misses']
+        with self.assertNumQueries(0):
+            self.assertEqual([p.sku for p in get_catalog().products], ['SUK-001'])
+        self.assertEqual(catalog_stats()['misses'], misses)
+        
+        Product.objects.create(name='Mchele', sku='MCH-001')
+        self.assertEqual(len(get_catalog().products), 2)
+        self.assertEqual(catalog_stats()['misses'], misses + 1)
+        
+        self.warehouse.name = 'Ghala Kuu'
+        self.warehouse.save()
+        self.assertEqual(get_catalog().warehouses[0].name, 'Ghala Kuu')
+    
+    def test_process_local_cache_reloads_after_max_age(self):
+        from .services.catalog import get_catalog
+        get_catalog()
+        # A write from another worker: no signal reaches this process's LocMem cache
+        Product.objects.bulk_create([Product(name='Mchele', sku='MCH-001')])
+        self.assertEqual(len(get_catalog().products), 1)
+        with override_settings(CATALOG_MAX_AGE=0):
+            self.assertEqual(len(get_catalog().products), 2)
+    
+    def test_form_validates_against_catalog(self):
+        from .forms import StockInForm
+        from .services.catalog import get_catalog
+        get_catalog()
+        data = {
+            'product': self.product.id, 'warehouse': self.warehouse.id, 'quantity': 5,
+            'supplier': 'S', 'reference_no': 'IN-1', 'notes': '',
+        }
+        form = StockInForm(data)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['product'].sku, 'SUK-001')
+        self.assertIsNot(form.cleaned_data['product'], get_catalog().products_by_id[self.product.id])
+        self.assertFalse(StockInForm(dict(data, product=9999)).is_valid())
+
+
+class StockLookupTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.branch = Warehouse.objects.create(name='Branch', code='WH002')
+        self.sugar = Product.objects.create(name='Sukari', sku='SUK-001', reorder_level=5)
+        self.rice = Product.objects.create(name='Mchele', sku='MCH-001', reorder_level=5)
+        for n, (product, warehouse, quantity) in enumerate([
+            (self.sugar, self.main, 20), (self.sugar, self.branch, 4), (self.rice, self.main, 3),
+        ]):
+            StockIn.objects.create(
+                product=product, warehouse=warehouse, quantity=quantity, supplier='S', reference_no=f'IN-{n}'
+            )
+    
+    def lookup(self, params, **headers):
+        from django.urls import reverse
+        return self.client.get(reverse('stock_lookup_api'), params, **headers)
+    
+    def test_batch_lookup_by_id_and_sku(self):
+        response = self.lookup({'products': f'{self.sugar.id},MCH-001,NOPE'})
+        data = response.json()
+        self.assertEqual([entry['stock'] for entry in data['products']], [24, 3])
+        self.assertEqual(data['products'][1]['status'], 'low')
+        self.assertEqual(data['unknown_products'], ['NOPE'])
+        
+        data = self.lookup({'products': 'SUK-001', 'warehouses': 'WH002'}).json()
+        self.assertEqual(data['products'][0]['stock'], 4)
+        self.assertEqual(self.lookup({}).status_code, 400)
+    
+    def test_conditional_get(self):
+        response = self.lookup({'products': 'SUK-001,MCH-001'})
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        
+        with self.assertNumQueries(3):  # session, user, MAX(updated_at)
+            cached = self.lookup({'products': 'SUK-001,MCH-001'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        
+        StockOut.objects.create(product=self.rice, warehouse=self.main, quantity=1, customer='C', reference_no='OUT-1')
+        response = self.lookup({'products': 'SUK-001,MCH-001'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_product_stock_api_wraps_batch_lookup(self):
+        from django.urls import reverse
+        data = self.client.get(reverse('product_stock_api', args=[self.sugar.id]), {'warehouse': self.branch.id}).json()
+        self.assertEqual((data['stock'], data['status'], data['warehouse']), (4, 'low', 'Branch'))
+        response = self.client.get(reverse('product_stock_api', args=[9999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class LiveDashboardTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        self.product = Product.objects.create(name='Sukari', sku='SUK-001', reorder_level=10)
+        self.loop = asyncio.new_event_loop()
+    
+    def tearDown(self):
+        self.loop.close()
+    
+    def subscribe(self, hub):
+        async def subscribe():
+            return hub.subscribe()
+        return self.loop.run_until_complete(subscribe())
+    
+    def test_committed_stockin_pushes_delta(self):
+        from .services.live import hub
+        queue = self.subscribe(hub)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                StockIn.objects.create(
+                    product=self.product, warehouse=self.warehouse, quantity=4, supplier='S', reference_no='IN-1'
+                )
+            event = self.loop.run_until_complete(asyncio.wait_for(queue.get(), 1))
+        finally:
+            hub.unsubscribe(queue)
+        self.assertEqual(event['type'], 'update')
+        self.assertEqual((event['today_stockins'], event['today_stockouts']), (4, 0))
+        self.assertEqual(event['movements'][0]['product'], 'Sukari')
+        self.assertEqual(event['movements'][0]['quantity'], 4)
+        self.assertEqual([(row['sku'], row['current_stock']) for row in event['low_stock']], [('SUK-001', 4)])
+    
+    def test_no_work_without_listeners(self):
+        from .services.live import hub, publish_refresh
+        self.assertEqual(hub.subscriber_count, 0)
+        with self.assertNumQueries(0):
+            publish_refresh()
+    
+    def test_slow_subscriber_gets_resync(self):
+        from .services.live import BroadcastHub
+        hub = BroadcastHub(queue_size=2)
+        queue = self.subscribe(hub)
+        for n in range(3):
+            hub.deliver({'type': 'update', 'n': n})
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get_nowait(), {'type': 'resync'})
+    
+    def test_stream_sends_snapshot_then_heartbeat(self):
+        from .services.live import event_stream, hub
+        
+        async def first_frames():
+            stream = event_stream({'type': 'snapshot', 'today_stockins': 0}, heartbeat=0.01)
+            frames = [await stream.__anext__(), await stream.__anext__()]
+            await stream.aclose()
+            return frames
+        
+        snapshot, ping = self.loop.run_until_complete(first_frames())
+        self.assertIn('event: snapshot', snapshot)
+        self.assertEqual(ping, ': ping\n\n')
+        self.assertEqual(hub.subscriber_count, 0)
+    
+    def test_wsgi_request_gets_snapshot_and_retry(self):
+        from django.urls import reverse
+        response = self.client.get(reverse('dashboard_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: 30000'))
+        self.assertIn('"low_stock": [{"id": %d' % self.product.id, body)
+
+
+class AsyncReportViewTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        user = User.objects.create_user('clerk')
+        self.client.force_login(user)
+        self.async_client.force_login(user)
+        warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        product = Product.objects.create(name='Sukari', sku='SUK-001', reorder_level=10, unit_price=100)
+        StockIn.objects.create(product=product, warehouse=warehouse, quantity=8, supplier='S', reference_no='IN-1')
+        StockOut.objects.create(product=product, warehouse=warehouse, quantity=3, customer='C', reference_no='OUT-1')
+    
+    def test_async_views_match_sync_views(self):
+        from asgiref.sync import async_to_sync
+        from django.core.cache import cache
+        from django.urls import reverse
+        checks = [
+            ('dashboard', 'dashboard_async', ['today_stockins', 'today_stockouts', 'low_stock_products']),
+            ('stock_report', 'stock_report_async', ['total_items', 'total_value', 'low_stock_count']),
+            ('monthly_report', 'monthly_report_async', ['monthly_in_total', 'total_transactions', 'top_products']),
+        ]
+        for sync_name, async_name, keys in checks:
+            cache.clear()
+            expected = self.client.get(reverse(sync_name))
+            cache.clear()
+            response = async_to_sync(self.async_client.get)(reverse(async_name))
+            self.assertEqual(response.status_code, 200)
+            for key in keys:
+                self.assertEqual(response.context[key], expected.context[key], f'{async_name}: {key}')
+    
+    def test_queries_stay_on_request_thread_inside_transaction(self):
+        from asgiref.sync import async_to_sync
+        from .services.concurrency import gather_queries
+        results = async_to_sync(gather_queries)({
+            'a': lambda: threading.current_thread().name,
+            'b': lambda: threading.current_thread().name,
+        })
+        self.assertEqual(results, {'a': threading.current_thread().name, 'b': threading.current_thread().name})
+
+
+class ConcurrentQueryTests(TransactionTestCase):
+    def test_independent_queries_run_on_the_bounded_pool(self):
+        from asgiref.sync import async_to_sync
+        from .services.concurrency import gather_queries
+        Warehouse.objects.create(name='Main', code='WH001')
+        results = async_to_sync(gather_queries)({
+            'warehouses': lambda: (threading.current_thread().name, Warehouse.objects.count()),
+            'products': lambda: (threading.current_thread().name, Product.objects.count()),
+        })
+        self.assertEqual(list(results), ['warehouses', 'products'])
+        self.assertEqual([count for _, count in results.values()], [1, 0])
+        self.assertTrue(all(name.startswith('report-query') for name, _ in results.values()))
+
+
+class DatabaseRouterTests(TestCase):
+    def test_reads_go_to_read_alias_only_inside_read_only(self):
+        from unittest import mock
+        from django.conf import settings
+        from .db_router import ReadWriteRouter, read_only
+        router = ReadWriteRouter()
+        with mock.patch.dict(settings.DATABASES, {'read': settings.DATABASES['default']}):
+            self.assertEqual(router.db_for_read(Product), 'default')
+            with read_only():
+                self.assertEqual(router.db_for_read(Product), 'read')
+                self.assertEqual(router.db_for_write(Product), 'default')
+            self.assertEqual(router.db_for_read(Product), 'default')
+        with read_only():
+            # No read database configured: everything stays on default
+            self.assertEqual(router.db_for_read(Product), 'default')
+        self.assertFalse(router.allow_migrate('read', 'warehouse'))
+    
+    def test_read_only_view_wraps_sync_and_async_views(self):
+        from asgiref.sync import async_to_sync
+        from .db_router import _read_only, read_only_view
+        sync_view = read_only_view(lambda request: _read_only.get())
+        
+        async def view(request):
+            return _read_only.get()
+        self.assertTrue(sync_view(None))
+        self.assertTrue(async_to_sync(read_only_view(view))(None))
+        self.assertFalse(_read_only.get())
+    
+    def test_production_pragmas_apply_on_connect(self):
+        import tempfile
+        from django.conf import settings
+        from django.db.utils import ConnectionHandler
+        with tempfile.TemporaryDirectory() as directory:
+            handler = ConnectionHandler({'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': f'{directory}/pragmas.sqlite3',
+                'OPTIONS': {'init_command': '; '.join(settings.SQLITE_PRAGMAS + ['PRAGMA query_only = ON'])},
+            }})
+            try:
+                with handler['default'].cursor() as cursor:
+                    values = {}
+                    for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'query_only'):
+                        cursor.execute(f'PRAGMA {pragma}')
+                        values[pragma] = cursor.fetchone()[0]
+            finally:
+                handler.close_all()
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'query_only': 1})
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user('clerk')
+        self.client.force_login(self.user)
+        self.product = Product.objects.create(name='Sukari', sku='SUK-001')
+        self.warehouses = [Warehouse.objects.create(name=f'Ghala {i}', code=f'WH{i:03d}') for i in range(6)]
+    
+    def test_server_timing_for_staff_only(self):
+        from django.test import override_settings
+        with override_settings(PERF_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get('/reports/stock/'))
+            self.user.is_staff = True
+            self.user.save()
+            timing = self.client.get('/reports/stock/')['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, view;dur=[\d.]+$')
+    
+    def test_async_view_without_server_timing(self):
+        from asgiref.sync import async_to_sync
+        from django.core.cache import cache
+        from django.test import override_settings
+        from django.urls import reverse
+        cache.clear()
+        self.async_client.force_login(self.user)
+        with override_settings(PERF_SERVER_TIMING=False):
+            response = async_to_sync(self.async_client.get)(reverse('dashboard_events'))
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Server-Timing', response)
+            self.user.is_staff = True
+            self.user.save()
+            response = async_to_sync(self.async_client.get)(reverse('dashboard_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('Server-Timing', response)
+    
+    def test_repeated_queries_are_flagged_with_call_site(self):
+        from .services.instrumentation import end_profile, start_profile
+        profile, token = start_profile()
+        try:
+            for warehouse in self.warehouses:
+                self.product.get_stock_by_warehouse(warehouse)
+        finally:
+            end_profile(token)
+        duplicates = profile.duplicates()
+        self.assertEqual(profile.query_count, 6)
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0]['count'], 6)
+        self.assertTrue(duplicates[0]['sites'][0].startswith('warehouse/models.py:'))
+        self.assertIn('dup;desc="1 repeated queries"', profile.server_timing(1.0, duplicates))
+    
+    def test_slow_requests_are_logged_as_json(self):
+        from django.test import override_settings
+        with override_settings(PERF_SLOW_REQUEST_MS=0), self.assertLogs('warehouse.performance') as logs:
+            self.client.get('/reports/low-stock/')
+        event, payload = logs.records[0].getMessage().split(' ', 1)
+        record = json.loads(payload)
+        self.assertEqual(event, 'slow_request')
+        self.assertEqual((record['path'], record['status']), ('/reports/low-stock/', 200))
+        self.assertGreater(record['queries'], 0)
+        self.assertTrue(any(query['site'].startswith('warehouse/') for query in record['slowest']))
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.products = [Product.objects.create(name=f'Bidhaa {i}', sku=f'BID-{i:03d}') for i in range(3)]
+    
+    def add_movements(self, count, start=0):
+        StockIn.objects.bulk_create([
+            StockIn(product=self.products[i % 3], warehouse=self.main, quantity=1,
+                    supplier='Supplier', reference_no=f'IN-{i}')
+            for i in range(start, start + count)
+        ])
+        # As the bulk writers (import, transfers) do after committing
+        bump_movement_sequence()
+    
+    def test_movement_changelist_queries_do_not_grow_with_rows(self):
+        self.add_movements(5)
+        self.client.get('/admin/warehouse/stockin/')  # loads the catalog
+        self.add_movements(5, start=5)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get('/admin/warehouse/stockin/').status_code, 200)
+        self.add_movements(55, start=10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/admin/warehouse/stockin/')
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertContains(response, '65 stock ins')
+    
+    def test_estimated_count_and_bounded_filtered_count(self):
+        from .admin import EstimatedCountPaginator
+        self.add_movements(30)
+        self.assertEqual(EstimatedCountPaginator(StockIn.objects.all(), 10).count, 30)
+        with self.assertNumQueries(0):
+            self.assertEqual(EstimatedCountPaginator(StockIn.objects.all(), 10).count, 30)
+        filtered = EstimatedCountPaginator(StockIn.objects.filter(product=self.products[0]), 10)
+        filtered.COUNT_LIMIT = 5
+        self.assertEqual(filtered.count, 5)
+        # Deletes are counted too, so no empty trailing pages
+        with self.captureOnCommitCallbacks(execute=True):
+            StockIn.objects.filter(reference_no__in=['IN-3', 'IN-4']).delete()
+        self.assertEqual(EstimatedCountPaginator(StockIn.objects.all(), 10).count, 28)
+    
+    def test_derived_tables_cannot_be_deleted(self):
+        StockIn.objects.create(product=self.products[0], warehouse=self.main, quantity=5, supplier='S', reference_no='IN-1')
+        balance, day = StockBalance.objects.get(), DailyMovement.objects.get()
+        for path in [f'/admin/warehouse/stockbalance/{balance.pk}/delete/', f'/admin/warehouse/dailymovement/{day.pk}/delete/']:
+            self.assertEqual(self.client.post(path, {'post': 'yes'}).status_code, 403)
+        self.client.post('/admin/warehouse/stockbalance/', {'action': 'delete_selected', '_selected_action': [balance.pk]})
+        self.assertTrue(StockBalance.objects.filter(pk=balance.pk).exists())
+        self.assertTrue(DailyMovement.objects.filter(pk=day.pk).exists())
+    
+    def test_search_by_product_party_and_reference(self):
+        self.add_movements(6)
+        StockIn.objects.filter(reference_no='IN-5').update(supplier='Azam Mills')
+        
+        def found(q):
+            response = self.client.get('/admin/warehouse/stockin/', {'q': q})
+            return sorted(row.reference_no for row in response.context['cl'].result_list)
+        
+        self.assertEqual(found('BID-001'), ['IN-1', 'IN-4'])
+        self.assertEqual(found('IN-4'), ['IN-4'])
+        self.assertEqual(found('azam'), ['IN-5'])
+        # Every word has to match somewhere: product, supplier or reference
+        self.assertEqual(found('bidhaa azam'), ['IN-5'])
+        self.assertEqual(len(found('bidhaa')), 6)
+        
+        StockIn.objects.create(product=self.products[0], warehouse=self.main, quantity=5,
+                               supplier='Supplier', reference_no='IN-X')
+        StockOut.objects.create(product=self.products[0], warehouse=self.main, quantity=1,
+                                customer='Duka la Mama', reference_no='OUT-1')
+        response = self.client.get('/admin/warehouse/stockout/', {'q': 'duka'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get('/admin/warehouse/stockbalance/', {'q': 'BID-000'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+    
+    def test_product_changelist_shows_annotated_stock(self):
+        StockIn.objects.create(product=self.products[1], warehouse=self.main, quantity=7,
+                               supplier='Supplier', reference_no='IN-X')
+        response = self.client.get('/admin/warehouse/product/', {'o': '-6'})
+        rows = response.context['cl'].result_list
+        self.assertEqual((rows[0].sku, rows[0].current_stock), ('BID-001', 7))
+
+
+class ProductSeriesTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.product = Product.objects.create(name='Sukari', sku='SUK-001')
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.branch = Warehouse.objects.create(name='Branch', code='WH002')
+        self.today = timezone.localdate()
+        from django.core.cache import cache
+        self.client.force_login(User.objects.create_user('clerk'))
+        cache.clear()
+    
+    def at(self, days_ago):
+        return timezone.now() - timedelta(days=days_ago)
+    
+    def move(self, quantity, days_ago, warehouse=None, ref='M'):
+        warehouse = warehouse or self.main
+        if quantity > 0:
+            StockIn.objects.create(
+                product=self.product, warehouse=warehouse, quantity=quantity,
+                supplier='S', reference_no=ref, date_received=self.at(days_ago),
+            )
+        else:
+            StockOut.objects.create(
+                product=self.product, warehouse=warehouse, quantity=-quantity,
+                customer='C', reference_no=ref, date_issued=self.at(days_ago),
+            )
+    
+    def get(self, **params):
+        from django.urls import reverse
+        return self.client.get(reverse('product_series_api', args=[self.product.id]), params).json()
+    
+    def test_daily_series_with_opening_balance(self):
+        self.move(100, 40, ref='OLD')
+        self.move(20, 5, ref='IN-1')
+        self.move(-30, 2, ref='OUT-1')
+        self.move(7, 2, warehouse=self.branch, ref='IN-2')
+        data = self.get(days=10)
+        self.assertEqual(data['bucket'], 'day')
+        self.assertEqual(data['opening_balance'], 100)
+        self.assertEqual(len(data['points']), 10)
+        by_date = {point['date']: point for point in data['points']}
+        day = (self.today - timedelta(days=2)).isoformat()
+        self.assertEqual((by_date[day]['in'], by_date[day]['out'], by_date[day]['net']), (7, 30, -23))
+        self.assertEqual(data['points'][-1]['balance'], 97)
+        
+        data = self.get(days=10, warehouse=self.branch.id)
+        self.assertEqual((data['opening_balance'], data['points'][-1]['balance']), (0, 7))
+    
+    def test_long_ranges_are_downsampled(self):
+        self.move(50, 700, ref='IN-1')
+        self.move(-10, 3, ref='OUT-1')
+        data = self.get(days=1825, points=50)
+        self.assertEqual(data['bucket'], 'quarter')
+        self.assertLessEqual(len(data['points']), 50)
+        self.assertEqual(sum(point['in'] for point in data['points']), 50)
+        self.assertEqual(data['points'][-1]['balance'], 40)
+        
+        data = self.get(days=1825, bucket='week', points=200)
+        self.assertEqual(data['requested_bucket'], 'week')
+        self.assertEqual(data['bucket'], 'month')
+        self.assertEqual(data['points'][-1]['balance'], 40)
+    
+    def test_extreme_ranges_are_capped(self):
+        from django.urls import reverse
+        from .services.movement_series import MAX_DAYS
+        self.move(50, 3, ref='IN-1')
+        data = self.get(date_from='1000-01-01', date_to='2024-01-01', points=2)
+        self.assertEqual(data['bucket'], 'year')
+        self.assertEqual([point['date'] for point in data['points']], ['2023-01-01', '2024-01-01'])
+        
+        url = reverse('product_series_api', args=[self.product.id])
+        for params in ({'date_to': '9999-12-31', 'bucket': 'year'}, {'date_from': '0001-01-01'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, params)
+            data = response.json()
+            span = datetime.fromisoformat(data['date_to']) - datetime.fromisoformat(data['date_from'])
+            self.assertLess(span.days, MAX_DAYS)
+            self.assertLessEqual(len(data['points']), 120)
+    
+    def test_invalid_dates_are_rejected(self):
+        from django.urls import reverse
+        url = reverse('product_series_api', args=[self.product.id])
+        for params in ({'date_from': '2024-02-31'}, {'date_to': 'jana'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertFalse(response.json()['success'])
+    
+    def test_bucket_is_one_grouped_query(self):
+        for n in range(30):
+            self.move(n + 1, n * 12, ref=f'IN-{n}')
+        self.get(days=10)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(days=365, bucket='month')
+        self.assertEqual(data['bucket'], 'month')
+        self.assertEqual(data['points'][-1]['balance'], sum(range(1, 31)))
+        rollup = [query['sql'] for query in queries.captured_queries if 'warehouse_dailymovement' in query['sql']]
+        self.assertEqual(len(rollup), 2)
+        self.assertIn('GROUP BY', rollup[-1])
+    
+    def test_unknown_product(self):
+        from django.urls import reverse
+        response = self.client.get(reverse('product_series_api', args=[999]))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_detail_page_loads_chart_lazily(self):
+        from django.urls import reverse
+        response = self.client.get(reverse('product_detail', args=[self.product.id]))
+        self.assertContains(response, reverse('product_series_api', args=[self.product.id]))
+        self.assertContains(response, 'IntersectionObserver')
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.sugar = Product.objects.create(name='Sukari ya Kilo', sku='SUK-001')
+        self.sugar_bag = Product.objects.create(name='Sukari Mfuko', sku='SUK-050')
+        self.rice = Product.objects.create(name='Mchele Safi', sku='MCH-001')
+        Product.objects.create(name='Sukari ya Zamani', sku='SUK-OLD', is_active=False)
+    
+    def skus(self, text, **kwargs):
+        from .services.product_search import search_products
+        return [product.sku for product in search_products(text, **kwargs)]
+    
+    def test_prefix_match_on_sku_and_name(self):
+        self.assertEqual(sorted(self.skus('suk')), ['SUK-001', 'SUK-050'])
+        self.assertEqual(self.skus('SUK-05'), ['SUK-050'])
+        self.assertEqual(self.skus('sukari kil'), ['SUK-001'])
+        self.assertEqual(self.skus('saf'), ['MCH-001'])
+        self.assertEqual(self.skus('SUK-001')[0], 'SUK-001')
+        self.assertEqual(self.skus('"suk" OR *'), [])
+        self.assertEqual(len(self.skus('suk', limit=1)), 1)
+    
+    def test_index_follows_product_writes(self):
+        from .services.product_search import ensure_search_index
+        self.rice.name = 'Mchele Mapembe'
+        self.rice.save()
+        self.assertEqual(self.skus('mapem'), ['MCH-001'])
+        self.assertEqual(self.skus('safi'), [])
+        Product.objects.bulk_create([Product(name='Unga wa Ngano', sku='UNG-001')])
+        self.assertEqual(self.skus('ngano'), ['UNG-001'])
+        self.sugar_bag.delete()
+        self.assertEqual(self.skus('suk'), ['SUK-001'])
+        
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER warehouse_product_fts_ai')
+        self.assertTrue(ensure_search_index())
+        self.assertFalse(ensure_search_index())
+        Product.objects.create(name='Chumvi', sku='CHU-001')
+        self.assertEqual(self.skus('chumvi'), ['CHU-001'])
+    
+    def test_movement_search_indexes_survive_table_rebuild(self):
+        from .services.product_search import MOVEMENT_SEARCH_INDEXES, ensure_movement_search_indexes
+        self.assertEqual(ensure_movement_search_indexes(), [])
+        # What SQLite's table rebuild on an AlterField leaves behind
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX stockin_supplier_nocase_idx')
+        self.assertEqual(ensure_movement_search_indexes(), ['stockin_supplier_nocase_idx'])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE '%nocase_idx'")
+            self.assertEqual({row[0] for row in cursor.fetchall()}, set(MOVEMENT_SEARCH_INDEXES))
+    
+    def test_search_api(self):
+        from django.urls import reverse
+        from .services.catalog import get_catalog
+        get_catalog()
+        with self.assertNumQueries(3):  # session, user, FTS match
+            data = self.client.get(reverse('product_search_api'), {'q': 'mch'}).json()
+        self.assertEqual(data['results'], [{
+            'id': self.rice.id, 'sku': 'MCH-001', 'name': 'Mchele Safi', 'text': 'Mchele Safi (MCH-001)',
+            'unit_price': '0.00', 'category': '-',
+        }])
+        self.assertEqual(self.client.get(reverse('product_search_api'), {'q': 'x', 'limit': 'a'}).status_code, 400)
+    
+    def test_form_renders_only_chosen_product(self):
+        from .forms import StockInForm
+        warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        self.assertNotIn('SUK-001', str(StockInForm()['product']))
+        data = {
+            'product': self.rice.id, 'warehouse': warehouse.id, 'quantity': 5,
+            'supplier': 'S', 'reference_no': 'IN-1', 'notes': '',
+        }
+        form = StockInForm(data)
+        self.assertTrue(form.is_valid(), form.errors)
+        rendered = str(form['product'])
+        self.assertIn('MCH-001', rendered)
+        self.assertNotIn('SUK-001', rendered)
+        self.assertIn('data-search-url', rendered)
+        self.assertFalse(StockInForm(dict(data, product=9999)).is_valid())
+
+
+class ReportCacheTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from .services.report_cache import reset_report_cache_stats
+        cache.clear()
+        reset_report_cache_stats()
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        self.product = Product.objects.create(name='Sukari', sku='SUK-001', reorder_level=5)
+        StockIn.objects.create(product=self.product, warehouse=self.warehouse, quantity=8, supplier='S', reference_no='IN-1')
+    
+    def stock_report(self):
+        from django.urls import reverse
+        return self.client.get(reverse('stock_report'))
+    
+    def test_report_reused_until_a_movement_commits(self):
+        from .services.report_cache import movement_sequence, report_cache_stats
+        self.assertEqual(self.stock_report().context['total_items'], 8)
+        with self.assertNumQueries(2):  # session, user
+            response = self.stock_report()
+        self.assertEqual(response.context['total_items'], 8)
+        
+        version = movement_sequence()
+        with self.captureOnCommitCallbacks(execute=True):
+            StockOut.objects.create(product=self.product, warehouse=self.warehouse, quantity=3, customer='C', reference_no='OUT-1')
+        self.assertEqual(movement_sequence(), version + 1)
+        self.assertEqual(self.stock_report().context['total_items'], 5)
+        
+        entries = {(row['kind'], row['name']): row for row in report_cache_stats()['entries']}
+        self.assertEqual(entries[('context', 'stock_report')]['hits'], 1)
+        self.assertEqual(entries[('context', 'stock_report')]['misses'], 2)
+        self.assertEqual(entries[('fragment', 'stock_report_table')]['hits'], 1)
+    
+    def test_lost_sequence_never_reuses_old_entries(self):
+        from django.core.cache import cache
+        from .services.report_cache import SEQUENCE_KEY, bump_movement_sequence, movement_sequence
+        before = bump_movement_sequence()
+        cache.delete(SEQUENCE_KEY)
+        self.assertGreater(movement_sequence(), before)
+    
+    def test_cache_stats_view(self):
+        from django.urls import reverse
+        self.stock_report()
+        self.stock_report()
+        data = self.client.get(reverse('cache_stats_api')).json()
+        self.assertEqual(data['reports']['backend'], 'LocMemCache')
+        self.assertEqual(data['reports']['hit_ratio'], 0.5)
+        self.assertIn('hits', data['catalog'])
+
+
+class StockMatrixQueryTests(TestCase):    
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user('clerk', password='pass')
+        self.client.force_login(self.user)
+        self.warehouses = [Warehouse.objects.create(name=f'WH {i}', code=f'WH{i:03d}') for i in range(3)]
+        self.seed(5)
+    
+    def seed(self, count):
+        start = Product.objects.count()
+        for i in range(start, start + count):
+            product = Product.objects.create(name=f'Product {i}', sku=f'SKU-{i}', reorder_level=5)
+            for warehouse in self.warehouses:
+                StockIn.objects.create(
+                    product=product, warehouse=warehouse, quantity=i % 7,
+                    supplier='S', reference_no=f'IN-{i}-{warehouse.id}',
+                )
+    
+    def query_count(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+    
+    def test_stock_report_totals(self):
+        from django.urls import reverse
+        response = self.client.get(reverse('stock_report'))
+        expected = sum(i % 7 for i in range(5)) * len(self.warehouses)
+        self.assertEqual(response.context['total_items'], expected)
+        self.assertEqual(
+            sum(w['total_items'] for w in response.context['warehouses']), expected
+        )
+
+
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.create_user('clerk', password='pass'))
+        self.product = Product.objects.create(name='Unga', sku='UNG-001', reorder_level=5)
+        self.warehouse = Warehouse.objects.create(name='Main', code='WH001')
+    
+    def test_snapshot_is_reused_until_a_write(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        from .services.dashboard import get_dashboard_snapshot
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            StockIn.objects.create(
+                product=self.product, warehouse=self.warehouse, quantity=3,
+                supplier='S', reference_no='IN-1',
+            )
+        self.assertEqual(get_dashboard_snapshot()['today_stockins'], 3)
+        with CaptureQueriesContext(connection) as ctx:
+            get_dashboard_snapshot()
+        self.assertEqual(len(ctx.captured_queries), 0)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            StockIn.objects.create(
+                product=self.product, warehouse=self.warehouse, quantity=4,
+                supplier='S', reference_no='IN-2',
+            )
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['today_stockins'], 7)
+        self.assertEqual(response.context['low_stock_products'], [])
+        self.assertContains(response, '+4')
+
+
+class MovementImportTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Mchele', sku='MCH-001')
+        self.warehouse = Warehouse.objects.create(name='Main', code='WH001')
+    
+    def run_import(self, text, **kwargs):
+        from .services.movement_import import import_movements
+        return import_movements(StringIO(text), **kwargs)
+    
+    def test_imports_valid_lines_and_reports_errors(self):
+        StockIn.objects.create(
+            product=self.product, warehouse=self.warehouse, quantity=1,
+            supplier='S', reference_no='GRN-OLD',
+        )
+        report = self.run_import(
+            'type,sku,warehouse,quantity,party,reference_no,date\n'
+            'in,MCH-001,WH001,100,Supplier,GRN-1,2026-03-01\n'
+            'out,MCH-001,WH001,30,Customer,INV-1,\n'
+            'out,MCH-001,WH001,500,Customer,INV-2,\n'
+            'in,NOPE,WH001,5,Supplier,GRN-2,\n'
+            'in,MCH-001,WH001,5,Supplier,GRN-OLD,\n'
+            'in,MCH-001,WH001,5,Supplier,GRN-1,\n',
+            chunk_size=2,
+        )
+        self.assertEqual((report.rows, report.created_in, report.created_out), (6, 1, 1))
+        self.assertEqual([line for line, _ in report.errors], [4, 5, 6, 7])
+        self.assertEqual(self.product.get_stock_by_warehouse(self.warehouse), 71)
+    
+    def test_rejected_line_does_not_claim_its_reference(self):
+        report = self.run_import(
+            'type,sku,warehouse,quantity,party,reference_no\n'
+            'out,MCH-001,WH001,5,Customer,INV-1\n'
+            'in,MCH-001,WH001,10,Supplier,GRN-1\n'
+            'out,MCH-001,WH001,5,Customer,INV-1\n'
+            'out,MCH-001,WH001,5,Customer,INV-1\n',
+            chunk_size=2,
+        )
+        self.assertEqual((report.created_in, report.created_out), (1, 1))
+        self.assertEqual([line for line, _ in report.errors], [2, 5])
+        self.assertIn('haitoshi', report.errors[0][1])
+        self.assertIn('imerudiwa', report.errors[1][1])
+    
+    def test_dry_run_writes_nothing(self):
+        report = self.run_import(
+            'type,sku,warehouse,quantity,party,reference_no\n'
+            'in,MCH-001,WH001,10,Supplier,GRN-1\n'
+            'out,MCH-001,WH001,4,Customer,INV-1\n',
+            dry_run=True,
+        )
+        self.assertEqual(report.created, 2)
+        self.assertFalse(StockIn.objects.exists())
+        self.assertEqual(self.product.get_total_stock(), 0)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user('clerk', password='pass'))
+        self.product = Product.objects.create(name='Chumvi', sku='CHU-001', reorder_level=50)
+        self.warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        StockIn.objects.create(
+            product=self.product, warehouse=self.warehouse, quantity=40,
+            supplier='Supplier', reference_no='GRN-1',
+        )
+        StockOut.objects.create(
+            product=self.product, warehouse=self.warehouse, quantity=5,
+            customer='Customer', reference_no='INV-1',
+        )
+    
+    def download(self, report, export_format='csv'):
+        from django.urls import reverse
+        response = self.client.get(reverse('export_report', args=[report]), {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        return response
+    
+    def test_csv_exports_stream(self):
+        import csv
+        for report in ('stock', 'low-stock', 'monthly', 'transactions'):
+            response = self.download(report)
+            self.assertTrue(response.streaming)
+            rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+            self.assertGreater(len(rows), 1, report)
+        self.assertEqual([row[0] for row in rows[1:]], ['OUT', 'IN'])
+    
+    def test_xlsx_export(self):
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            self.skipTest('openpyxl is not installed')
+        response = self.download('stock', 'xlsx')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+    
+    def test_unknown_report_is_404(self):
+        from django.urls import reverse
+        self.assertEqual(self.client.get(reverse('export_report', args=['nope'])).status_code, 404)
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.contrib.auth.models import User
+        self.job_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.job_dir, ignore_errors=True)
+        self.enterContext(self.settings(REPORT_JOB_DIR=self.job_dir))
+        self.client.force_login(User.objects.create_user('clerk', password='pass'))
+        self.product = Product.objects.create(name='Chumvi', sku='CHU-001', reorder_level=50)
+        self.warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        StockIn.objects.create(
+            product=self.product, warehouse=self.warehouse, quantity=40,
+            supplier='Supplier', reference_no='GRN-1',
+        )
+    
+    def queue(self, report, query):
+        from django.urls import reverse
+        return self.client.post(f"{reverse('queue_report_job', args=[report])}?{query}")
+    
+    def test_identical_requests_share_one_job(self):
+        from django.urls import reverse
+        response = self.queue('stock', 'format=xlsx&as_of=2026-01-31')
+        self.assertRedirects(response, reverse('report_jobs'))
+        # Parameters the report does not read do not make it a different request
+        self.queue('stock', 'format=xlsx&as_of=2026-01-31&page=3')
+        job = ReportJob.objects.get()
+        self.assertEqual((job.status, job.request_count, job.params), ('pending', 2, {'as_of': '2026-01-31'}))
+        self.queue('stock', 'format=csv&as_of=2026-01-31')
+        self.queue('monthly', 'format=csv')
+        self.assertEqual(ReportJob.objects.count(), 3)
+        self.assertEqual(ReportJob.objects.get(report='monthly').params, {
+            'year': str(timezone.localdate().year), 'month': str(timezone.localdate().month),
+        })
+        self.assertEqual(self.client.get(reverse('queue_report_job', args=['stock'])).status_code, 405)
+        self.queue('nope', 'format=csv')
+        self.assertEqual(ReportJob.objects.count(), 3)
+    
+    def test_finished_job_is_downloadable(self):
+        from django.urls import reverse
+        from .services.report_jobs import claim_next, queue_report, run_job
+        job, created = queue_report('stock', 'csv', {})
+        self.assertTrue(created)
+        job = run_job(claim_next())
+        self.assertEqual((job.status, job.row_count, job.attempts), ('done', 1, 1))
+        
+        status = self.client.get(reverse('report_job_api', args=[job.pk])).json()
+        self.assertTrue(status['ready'])
+        response = self.client.get(reverse('download_report_job', args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertIn('CHU-001', content)
+        self.assertIn(job.filename, response['Content-Disposition'])
+        self.assertContains(self.client.get(reverse('report_jobs')), job.filename)
+        # Only pending and running jobs are shared
+        self.assertTrue(queue_report('stock', 'csv', {})[1])
+        self.assertEqual(self.client.get(reverse('report_job_api', args=[999])).status_code, 404)
+    
+    def test_claims_stop_at_the_limit(self):
+        from .services.report_jobs import claim_next, queue_report
+        jobs = [queue_report('stock', 'csv', {'as_of': f'2026-01-0{day}'})[0] for day in (1, 2, 3)]
+        self.assertEqual([claim_next(limit=2).pk for _ in range(2)], [jobs[0].pk, jobs[1].pk])
+        self.assertIsNone(claim_next(limit=2))
+        self.assertEqual(ReportJob.objects.get(pk=jobs[2].pk).status, 'pending')
+    
+    def test_slow_job_keeps_its_lease(self):
+        import os
+        from unittest import mock
+        from .services.report_jobs import claim_next, queue_report, renew_leases, requeue_stale, run_job
+        queue_report('stock', 'csv', {})
+        slow = claim_next()
+        # Started two hours ago but its runner still renews the lease: not abandoned
+        later = timezone.now() + timedelta(hours=2)
+        with mock.patch('warehouse.services.report_jobs.timezone.now', return_value=later):
+            renew_leases([slow])
+        self.assertEqual(requeue_stale(now=later), 0)
+        
+        # Lease expired and the job was claimed again: the first runner's result is dropped
+        self.assertEqual(requeue_stale(now=later + timedelta(hours=1)), 1)
+        retry = claim_next()
+        self.assertEqual((retry.pk, retry.attempts), (slow.pk, 2))
+        stale = run_job(slow)
+        self.assertEqual((stale.status, stale.attempts), ('running', 2))
+        self.assertEqual(os.listdir(os.path.join(self.job_dir, str(slow.pk), '1')), [])
+        done = run_job(retry)
+        self.assertEqual(done.status, 'done')
+        self.assertTrue(done.result_file.startswith(f'{slow.pk}/2/'))
+    
+    def test_failures_stale_jobs_and_cleanup(self):
+        import os
+        from unittest import mock
+        from .services.report_jobs import MAX_ATTEMPTS, claim_next, purge_finished, queue_report, requeue_stale, run_job
+        job = queue_report('low-stock', 'csv', {})[0]
+        with mock.patch('warehouse.services.report_jobs.write_report', side_effect=RuntimeError('diski imejaa')):
+            job = run_job(claim_next())
+        self.assertEqual((job.status, job.error), ('failed', 'diski imejaa'))
+        
+        stuck = queue_report('stock', 'csv', {})[0]
+        claim_next()
+        later = timezone.now() + timedelta(hours=2)
+        self.assertEqual(requeue_stale(now=later), 1)
+        self.assertEqual(ReportJob.objects.get(pk=stuck.pk).status, 'pending')
+        ReportJob.objects.filter(pk=stuck.pk).update(status='running', started_at=timezone.now(), attempts=MAX_ATTEMPTS)
+        requeue_stale(now=later)
+        self.assertEqual(ReportJob.objects.get(pk=stuck.pk).status, 'failed')
+        
+        queue_report('monthly', 'csv', {})
+        done = run_job(claim_next())
+        self.assertTrue(os.path.isfile(os.path.join(self.job_dir, done.result_file)))
+        self.assertEqual(purge_finished(now=timezone.now() + timedelta(days=30)), 3)
+        self.assertFalse(ReportJob.objects.exists())
+        self.assertEqual(os.listdir(self.job_dir), [])
+
+
+class ReportJobRunnerTests(TransactionTestCase):
+    def test_command_runs_the_queue_on_a_pool(self):
+        import os
+        import shutil
+        import tempfile
+        from .services.report_jobs import queue_report
+        job_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, job_dir, ignore_errors=True)
+        product = Product.objects.create(name='Chumvi', sku='CHU-001')
+        warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        StockIn.objects.create(product=product, warehouse=warehouse, quantity=40, supplier='S', reference_no='GRN-1')
+        for report in ('stock', 'low-stock', 'monthly', 'transactions'):
+            queue_report(report, 'csv', {})
+        
+        out = StringIO()
+        with self.settings(REPORT_JOB_DIR=job_dir):
+            call_command('run_report_jobs', once=True, workers=2, poll=0.05, stdout=out)
+        self.assertEqual(set(ReportJob.objects.values_list('status', flat=True)), {'done'})
+        self.assertEqual(out.getvalue().count(': done'), 4)
+        self.assertEqual(len(os.listdir(job_dir)), 4)
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.utils import timezone
+        self.client.force_login(User.objects.create_user('clerk', password='pass'))
+        self.product = Product.objects.create(name='Mafuta', sku='MAF-001')
+        self.main = Warehouse.objects.create(name='Main', code='WH001')
+        self.branch = Warehouse.objects.create(name='Branch', code='WH002')
+        same_time = timezone.now()
+        for i in range(7):
+            StockIn.objects.create(
+                product=self.product, warehouse=self.main if i % 2 else self.branch, quantity=10,
+                supplier=f'Supplier {i}', reference_no=f'GRN-{i}', date_received=same_time,
+            )
+        for i in range(5):
+            StockOut.objects.create(
+                product=self.product, warehouse=self.branch, quantity=1,
+                customer='Customer', reference_no=f'INV-{i}', date_issued=same_time,
+            )
+    
+    def walk(self, **params):
+        from django.urls import reverse
+        seen, cursor = [], None
+        while True:
+            query = dict(params, page_size=3)
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get(reverse('transaction_list'), query)
+            seen += [(entry.kind, entry.reference_no) for entry in response.context['entries']]
+            next_query = response.context['next_query']
+            if not next_query:
+                return seen, response
+            cursor = next_query.split('cursor=')[1].split('&')[0]
+    
+    def test_pages_cover_every_row_once(self):
+        seen, response = self.walk()
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
+        self.assertEqual(response.context['total_transactions'], 12)
+    
+    def test_filters_and_database_totals(self):
+        seen, response = self.walk(warehouse=self.branch.id)
+        self.assertEqual(len(seen), 9)
+        self.assertEqual(response.context['stockins_total'], 40)
+        self.assertEqual(response.context['stockouts_total'], 5)
+        seen, response = self.walk(type='in', party='Supplier 3')
+        self.assertEqual(seen, [('in', 'GRN-3')])
+
+
+class QueryPlanTests(TestCase):
+    """The hot movement queries must be answered from an index, never a full table scan"""
+    
+    MOVEMENT_TABLES = ('warehouse_stockin', 'warehouse_stockout', 'warehouse_stockbalance', 'warehouse_dailymovement')
+    
+    def setUp(self):
+        self.product = Product.objects.create(name='Sabuni', sku='SAB-001')
+        self.warehouse = Warehouse.objects.create(name='Main', code='WH001')
+        StockIn.objects.create(
+            product=self.product, warehouse=self.warehouse, quantity=5,
+            supplier='S', reference_no='GRN-1',
+        )
+    
+    def full_scans(self, run):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            run()
+        scans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                if not query['sql'].lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    if detail.startswith('SCAN ') and 'USING' not in detail \
+                            and detail.split()[1] in self.MOVEMENT_TABLES:
+                        scans.append(f'{detail}  <=  {query["sql"]}')
+        return scans
+    
+    def test_key_queries_use_indexes(self):
+        from django.db import connection
+        from django.db.models import Sum
+        from .services.dashboard import compute_dashboard_snapshot
+        from .services.movement_summary import ReportPeriod, period_totals, top_products
+        from .services.periods import month_range
+        from .services.timeline import TimelineFilters, timeline_page
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite specific')
+        
+        today = timezone.localdate()
+        start, end = month_range(today.year, today.month)
+        checks = {
+            'balance lookup': lambda: self.product.get_stock_by_warehouse(self.warehouse),
+            'product/warehouse sums': lambda: (
+                StockIn.objects.filter(product=self.product, warehouse=self.warehouse)
+                .aggregate(total=Sum('quantity')),
+                StockOut.objects.filter(product=self.product, warehouse=self.warehouse)
+                .aggregate(total=Sum('quantity')),
+            ),
+            'dashboard': compute_dashboard_snapshot,
+            'monthly range': lambda: (
+                StockIn.objects.filter(date_received__gte=start, date_received__lt=end)
+                .aggregate(total=Sum('quantity')),
+                StockOut.objects.filter(date_issued__gte=start, date_issued__lt=end)
+                .aggregate(total=Sum('quantity')),
+            ),
+            'timeline page': lambda: timeline_page(TimelineFilters({}), None, 10),
+            'monthly rollup': lambda: (
+                period_totals(ReportPeriod.month(today.year, today.month)),
+                top_products(ReportPeriod.month(today.year, today.month)),
+            ),
+        }
+        for name, run in checks.items():
+            with self.subTest(name):
+                self.assertEqual(self.full_scans(run), [])
+
+
+class QueryBudgetTests(TestCase):
+    """Every view has a fixed query budget that must not grow with data size"""
+    
+    # First request after a write (cache cleared: catalog and snapshots reload)
+    QUERY_BUDGETS = {
+        'dashboard': 10,
+        'product_list': 6,
+        'product_detail': 10,
+        'add_stockin': 5,
+        'add_stockout': 5,
+        'import_movements': 5,
+        'transaction_list': 9,
+        'warehouse_stock': 8,
+        'transfer_stock': 5,
+        'stock_report': 7,
+        'low_stock_report': 6,
+        'monthly_report': 9,
+        'export_stock_csv': 7,
+        'export_transactions_csv': 4,
+        'product_stock_api': 7,
+        'product_stock_api_warehouse': 7,
+        'stock_lookup_api': 7,
+    }
+    
+    # Repeat requests: master data comes from the catalog, forms need only session + user
+    WARM_QUERY_BUDGETS = {
+        'dashboard': 2,
+        'add_stockin': 2,
+        'add_stockout': 2,
+        'import_movements': 2,
+        'transfer_stock': 2,
+        'warehouse_stock': 3,
+        'stock_report': 2,
+        'low_stock_report': 2,
+        'monthly_report': 2,
+        'product_stock_api': 4,
+        'product_stock_api_warehouse': 4,
+        'stock_lookup_api': 4,
+    }
+    
+    def test_query_budgets(self):
+        from .benchmarks import DataSize, query_growth, run_benchmarks
+        results = {
+            str(size): run_benchmarks(size, repeat=1)
+            for size in (DataSize(5, 2, 50), DataSize(30, 4, 600))
+        }
+        self.assertEqual(query_growth(results), [])
+        for name, result in results['30x4x600'].items():
+            with self.subTest(name):
+                self.assertLessEqual(result['queries'], self.QUERY_BUDGETS[name])
+    
+    def test_warm_query_budgets(self):
+        from .benchmarks import DataSize, run_benchmarks
+        results = run_benchmarks(DataSize(30, 4, 600), repeat=2, cold_cache=False)
+        for name, budget in self.WARM_QUERY_BUDGETS.items():
+            with self.subTest(name):
+                self.assertLessEqual(results[name]['queries'], budget)
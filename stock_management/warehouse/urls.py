@@ -1,23 +1,45 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# asgi.py turns ASYNC_REPORT_VIEWS on so the main pages use the async views;
+# the /async/ routes always exist so both versions can be compared.
+ASYNC_VIEWS = getattr(settings, 'ASYNC_REPORT_VIEWS', False)
+
 urlpatterns = [
     # Main Pages
-    path('', views.dashboard, name='dashboard'),
+    path('', views.dashboard_async if ASYNC_VIEWS else views.dashboard, name='dashboard'),
+    path('async/', views.dashboard_async, name='dashboard_async'),
+    path('live/dashboard/', views.dashboard_events, name='dashboard_events'),
     path('products/', views.product_list, name='product_list'),
     path('products/<int:pk>/', views.product_detail, name='product_detail'),
     path('stockin/', views.add_stockin, name='add_stockin'),
     path('stockout/', views.add_stockout, name='add_stockout'),
+    path('stock/import/', views.import_movements_view, name='import_movements'),
     path('transactions/', views.transaction_list, name='transaction_list'),
     
     # API Endpoints
     path('api/product-stock/<int:product_id>/', views.product_stock_api, name='product_stock_api'),
+    path('api/product-series/<int:product_id>/', views.product_series_api, name='product_series_api'),
+    path('api/stock/', views.stock_lookup_api, name='stock_lookup_api'),
+    path('api/transfers/', views.transfer_api, name='transfer_api'),
+    path('api/stock-as-of/', views.stock_as_of_api, name='stock_as_of_api'),
+    path('api/products/search/', views.product_search_api, name='product_search_api'),
+    path('api/report-jobs/<int:job_id>/', views.report_job_api, name='report_job_api'),
+    path('api/catalog/stats/', views.catalog_stats_api, name='catalog_stats_api'),
+    path('api/cache/stats/', views.cache_stats_api, name='cache_stats_api'),
     
     # ===== REPORTS =====
-    path('reports/stock/', views.stock_report, name='stock_report'),
+    path('reports/stock/', views.stock_report_async if ASYNC_VIEWS else views.stock_report, name='stock_report'),
+    path('reports/stock/async/', views.stock_report_async, name='stock_report_async'),
     path('reports/transactions/', views.transaction_list, name='transaction_report'),  # <-- REKEBISHA HII!
     path('reports/low-stock/', views.low_stock_report, name='low_stock_report'),
-    path('reports/monthly/', views.monthly_report, name='monthly_report'),
+    path('reports/monthly/', views.monthly_report_async if ASYNC_VIEWS else views.monthly_report, name='monthly_report'),
+    path('reports/monthly/async/', views.monthly_report_async, name='monthly_report_async'),
+    path('reports/<slug:report>/export/', views.export_report, name='export_report'),
+    path('reports/<slug:report>/queue/', views.queue_report_job, name='queue_report_job'),
+    path('reports/jobs/', views.report_jobs, name='report_jobs'),
+    path('reports/jobs/<int:job_id>/download/', views.download_report_job, name='download_report_job'),
     
         path('warehouse/<int:warehouse_id>/', views.warehouse_stock, name='warehouse_stock'),
     path('transfer/', views.transfer_stock, name='transfer_stock'),
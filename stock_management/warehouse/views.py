@@ -1,92 +1,125 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Q
 from django.utils import timezone
-from django.http import JsonResponse
-from datetime import datetime, timedelta
-from .models import Product, Warehouse, StockIn, StockOut, Category  # <-- HII IKO SAHIHI!
+from django.http import FileResponse, JsonResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.core.exceptions import ValidationError
+from django.views.decorators.http import require_POST
+from django.utils.dateparse import parse_date
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from asgiref.sync import sync_to_async
+from datetime import datetime
+import io
+import json
+from .models import Product, Warehouse, StockIn, StockOut, ReportJob  # <-- HII IKO SAHIHI!
+from .db_router import read_only_view
 from .forms import StockInForm, StockOutForm
+from .services import catalog
+from .services.catalog import catalog_stats, get_catalog
+from .services.checkpoints import balances_as_of
+from .services.concurrency import gather_queries
+from .services.dashboard import aget_dashboard_snapshot, get_dashboard_snapshot
+from .services.live import WSGI_RETRY_MS, event_stream, format_event, snapshot_event
+from .services.stock_lookup import (
+    MAX_PRODUCTS as MAX_LOOKUP_PRODUCTS, lookup_stock, resolve_products, resolve_warehouses, split_keys,
+    stock_validators
+)
+from .services.exports import REPORTS as EXPORT_REPORTS, export_response
+from .services.movement_import import import_movements
+from .services.movement_series import InvalidSeries, SeriesRequest, product_series
+from .services.movement_summary import ReportPeriod, period_totals, top_products
+from .services.replenishment import days_of_cover, plan_for
+from .services.report_cache import acached_context, cached_context, report_cache_stats
+from .services.report_jobs import RECENT_JOBS, REPORT_TITLES, job_status, queue_report, result_path
+from .services.product_search import DEFAULT_LIMIT as PRODUCT_SEARCH_LIMIT, search_products
+from .services.stock_issue import issue_stock
+from .services.stock_matrix import (
+    abuild_stock_matrix, build_stock_matrix, low_stock_products as query_low_stock, parse_as_of, stock_status,
+    suggested_order_quantity, with_total_stock
+)
+from .services.transfers import TransferError, create_transfer
+from .services.timeline import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, TimelineFilters, timeline_page, timeline_totals
 
 # ========== DASHBOARD ==========
 @login_required(login_url='/admin/login/')
+@read_only_view
 def dashboard(request):
     """Dashboard homepage"""
     try:
-        today = timezone.now().date()
-        
-        # Basic counts
-        total_products = Product.objects.count()
-        total_categories = Category.objects.count()  # <-- HII INAPIGA CALL KWENYE MODELS!
-        total_warehouses = Warehouse.objects.count()
-        
-        # Today's transactions
-        today_stockins = StockIn.objects.filter(
-            date_received__date=today
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-        
-        today_stockouts = StockOut.objects.filter(
-            date_issued__date=today
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-        
-        # Low stock products
-        low_stock_products = []
-        for product in Product.objects.all():
-            total_stock = product.get_total_stock()
-            
-            if total_stock <= product.reorder_level:
-                low_stock_products.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'sku': product.sku,
-                    'current_stock': total_stock,
-                    'reorder_level': product.reorder_level,
-                    'category': product.category.name if product.category else '-'
-                })
-        
-        # Recent transactions
-        recent_stockins = StockIn.objects.select_related('product', 'warehouse').order_by('-date_received')[:5]
-        recent_stockouts = StockOut.objects.select_related('product', 'warehouse').order_by('-date_issued')[:5]
-        
-        context = {
-            'total_products': total_products,
-            'total_categories': total_categories,
-            'total_warehouses': total_warehouses,
-            'today_stockins': today_stockins,
-            'today_stockouts': today_stockouts,
-            'low_stock_products': low_stock_products[:10],
-            'recent_stockins': recent_stockins,
-            'recent_stockouts': recent_stockouts,
-            'today': today.strftime('%d %B %Y'),
-        }
+        context = dict(get_dashboard_snapshot())
+        context['today'] = timezone.localdate().strftime('%d %B %Y')
         
     except Exception as e:
         print(f"Dashboard error: {e}")
-        context = {
-            'total_products': 0,
-            'total_categories': 0,
-            'total_warehouses': 0,
-            'today_stockins': 0,
-            'today_stockouts': 0,
-            'low_stock_products': [],
-            'recent_stockins': [],
-            'recent_stockouts': [],
-            'today': timezone.now().date().strftime('%d %B %Y'),
-        }
+        context = _empty_dashboard_context()
     
     return render(request, 'warehouse/dashboard.html', context)
 
 
+@login_required(login_url='/admin/login/')
+@read_only_view
+async def dashboard_async(request):
+    """Dashboard for ASGI workers: on a snapshot miss the queries run concurrently"""
+    try:
+        context = dict(await aget_dashboard_snapshot())
+        context['today'] = timezone.localdate().strftime('%d %B %Y')
+        
+    except Exception as e:
+        print(f"Dashboard error: {e}")
+        context = _empty_dashboard_context()
+    
+    return await sync_to_async(render)(request, 'warehouse/dashboard.html', context)
+
+
+def _empty_dashboard_context():
+    return {
+        'total_products': 0,
+        'total_categories': 0,
+        'total_warehouses': 0,
+        'today_stockins': 0,
+        'today_stockouts': 0,
+        'low_stock_products': [],
+        'recent_stockins': [],
+        'recent_stockouts': [],
+        'today': timezone.now().date().strftime('%d %B %Y'),
+    }
+
+
+@login_required(login_url='/admin/login/')
+async def dashboard_events(request):
+    """
+    Server-Sent Events stream of dashboard deltas.
+
+    Under ASGI the connection stays open and idles on the event loop. A WSGI
+    worker cannot hold it open without pinning a thread, so there the reply
+    is the snapshot alone and the browser reconnects after WSGI_RETRY_MS.
+    """
+    try:
+        first_event = snapshot_event(await sync_to_async(get_dashboard_snapshot)())
+    except Exception as e:
+        print(f"Dashboard events error: {e}")
+        return HttpResponse(status=503)
+    
+    if not hasattr(request, 'scope'):
+        response = HttpResponse(f"retry: {WSGI_RETRY_MS}\n{format_event(first_event)}", content_type='text/event-stream')
+    else:
+        response = StreamingHttpResponse(event_stream(first_event), content_type='text/event-stream')
+        response['X-Accel-Buffering'] = 'no'
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
 # ========== PRODUCTS ==========
 @login_required(login_url='/admin/login/')
 def product_list(request):
     """List all products"""
     try:
-        products = Product.objects.select_related('category').all()
+        products = list(with_total_stock())
         
         # Add stock info to each product
         for product in products:
-            product.total_stock = product.get_total_stock()
+            product.total_stock = product.current_stock
         
         context = {
             'products': products,
@@ -105,17 +138,18 @@ def product_list(request):
 def product_detail(request, pk):
     """Product details with warehouse breakdown"""
     try:
-        product = get_object_or_404(Product, pk=pk)
-        warehouses = Warehouse.objects.all()
+        product = get_object_or_404(Product.objects.select_related('category'), pk=pk)
+        matrix = build_stock_matrix(products=[product])
+        warehouses = matrix.warehouses
         
         # Stock by warehouse
         stock_by_warehouse = []
         for warehouse in warehouses:
-            stock = product.get_stock_by_warehouse(warehouse)
+            stock = matrix.stock(product.id, warehouse.id)
             stock_by_warehouse.append({
                 'warehouse': warehouse,
                 'stock': stock,
-                'status': 'out' if stock <= 0 else 'low' if stock <= product.reorder_level else 'ok'
+                'status': stock_status(stock, product.reorder_level)
             })
         
         # Transaction history
@@ -125,7 +159,7 @@ def product_detail(request, pk):
         context = {
             'product': product,
             'stock_by_warehouse': stock_by_warehouse,
-            'total_stock': product.get_total_stock(),
+            'total_stock': matrix.total(product.id),
             'stockins': stockins,
             'stockouts': stockouts,
             'warehouses': warehouses,
@@ -165,8 +199,8 @@ def add_stockin(request):
     
     context = {
         'form': form,
-        'warehouses': Warehouse.objects.all(),
-        'products': Product.objects.all(),
+        'warehouses': get_catalog().warehouses,
+        'products': get_catalog().products,
     }
     return render(request, 'warehouse/transactions/stockin_form.html', context)
 
@@ -181,14 +215,12 @@ def add_stockout(request):
                 stockout = form.save(commit=False)
                 stockout.issued_by = request.user
                 
-                # Check stock availability
-                current_stock = stockout.product.get_stock_by_warehouse(stockout.warehouse)
-                if stockout.quantity > current_stock:
-                    messages.error(request, f'✗ Stock haitoshi kwenye {stockout.warehouse.name}! Iliyopo: {current_stock}')
-                else:
-                    stockout.save()
-                    messages.success(request, f'✓ Stock ya {stockout.product.name} imetolewa kikamilifu kutoka {stockout.warehouse.name}!')
-                    return redirect('dashboard')
+                # Availability is checked and reserved atomically on save
+                issue_stock(stockout)
+                messages.success(request, f'✓ Stock ya {stockout.product.name} imetolewa kikamilifu kutoka {stockout.warehouse.name}!')
+                return redirect('dashboard')
+            except ValidationError as e:
+                messages.error(request, f'✗ {" ".join(e.messages)}')
             except Exception as e:
                 messages.error(request, f'✗ Kuna tatizo: {str(e)}')
     else:
@@ -196,39 +228,80 @@ def add_stockout(request):
     
     context = {
         'form': form,
-        'warehouses': Warehouse.objects.all(),
-        'products': Product.objects.all(),
+        'warehouses': get_catalog().warehouses,
+        'products': get_catalog().products,
     }
     return render(request, 'warehouse/transactions/stockout_form.html', context)
 
 
 @login_required(login_url='/admin/login/')
+def import_movements_view(request):
+    """Bulk import stock in/out lines from an uploaded CSV file"""
+    report = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, '✗ Chagua faili la CSV kwanza!')
+        else:
+            try:
+                stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+                report = import_movements(stream, user=request.user, dry_run=bool(request.POST.get('dry_run')))
+                if report.errors:
+                    messages.warning(request, f'⚠ Mistari {len(report.errors)} ina makosa na haikuingizwa.')
+                else:
+                    messages.success(request, f'✓ Mistari {report.created} imeingizwa kikamilifu!')
+            except Exception as e:
+                messages.error(request, f'✗ Kuna tatizo: {str(e)}')
+    
+    context = {
+        'report': report,
+        'errors': report.errors[:200] if report else [],
+    }
+    return render(request, 'warehouse/transactions/import_form.html', context)
+
+
+@login_required(login_url='/admin/login/')
+@read_only_view
 def transaction_list(request):
-    """List all transactions"""
+    """Merged in/out timeline with filters and cursor pagination"""
+    filters = TimelineFilters(request.GET)
     try:
-        stockins = StockIn.objects.select_related('product', 'warehouse').order_by('-date_received')[:100]
-        stockouts = StockOut.objects.select_related('product', 'warehouse').order_by('-date_issued')[:100]
+        page_size = min(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+    try:
+        entries, next_cursor = timeline_page(filters, request.GET.get('cursor'), page_size)
+        totals = timeline_totals(filters)
         
-        # Calculate totals
-        stockins_total = sum(s.quantity for s in stockins)
-        stockouts_total = sum(s.quantity for s in stockouts)
+        # Links to the next page keep the current filters
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        first_query = params.urlencode()
+        if next_cursor:
+            params['cursor'] = next_cursor
         
         context = {
-            'stockins': stockins,
-            'stockouts': stockouts,
-            'stockins_total': stockins_total,
-            'stockouts_total': stockouts_total,
-            'total_transactions': stockins.count() + stockouts.count(),
+            'entries': entries,
+            'filters': filters,
+            'stockins_total': totals['in']['quantity'],
+            'stockouts_total': totals['out']['quantity'],
+            'total_transactions': totals['in']['count'] + totals['out']['count'],
+            'next_query': params.urlencode() if next_cursor else '',
+            'first_query': first_query,
+            'is_first_page': not request.GET.get('cursor'),
         }
         
     except Exception as e:
         print(f"Transaction list error: {e}")
         context = {
-            'stockins': [],
-            'stockouts': [],
+            'entries': [],
+            'filters': filters,
             'stockins_total': 0,
             'stockouts_total': 0,
             'total_transactions': 0,
+            'next_query': '',
+            'first_query': '',
+            'is_first_page': True,
         }
     
     return render(request, 'warehouse/transactions/list.html', context)
@@ -236,41 +309,12 @@ def transaction_list(request):
 
 # ========== WAREHOUSE MANAGEMENT ==========
 @login_required(login_url='/admin/login/')
+@read_only_view
 def warehouse_stock(request, warehouse_id):
     """View stock in specific warehouse"""
     try:
         warehouse = get_object_or_404(Warehouse, id=warehouse_id)
-        products = Product.objects.all()
-        
-        product_data = []
-        total_items = 0
-        total_value = 0
-        
-        for product in products:
-            stock = product.get_stock_by_warehouse(warehouse)
-            value = stock * product.unit_price
-            total_items += stock
-            total_value += value
-            
-            product_data.append({
-                'id': product.id,
-                'name': product.name,
-                'sku': product.sku,
-                'category': product.category.name if product.category else '-',
-                'unit_price': product.unit_price,
-                'stock': stock,
-                'value': value,
-                'reorder_level': product.reorder_level,
-                'status': 'out' if stock <= 0 else 'low' if stock <= product.reorder_level else 'ok'
-            })
-        
-        context = {
-            'warehouse': warehouse,
-            'products': product_data,
-            'total_products': len(product_data),
-            'total_items': total_items,
-            'total_value': total_value,
-        }
+        context = cached_context('warehouse_stock', [warehouse.id], lambda: _warehouse_stock_context(warehouse))
         
     except Exception as e:
         print(f"Warehouse stock error: {e}")
@@ -285,190 +329,195 @@ def warehouse_stock(request, warehouse_id):
     return render(request, 'warehouse/warehouse_stock.html', context)
 
 
+def _warehouse_stock_context(warehouse):
+    matrix = build_stock_matrix(warehouses=[warehouse])
+    
+    product_data = []
+    total_items = 0
+    total_value = 0
+    
+    for product in matrix.products:
+        stock = matrix.stock(product.id, warehouse.id)
+        value = matrix.value(product.id)
+        total_items += stock
+        total_value += value
+        
+        product_data.append({
+            'id': product.id,
+            'name': product.name,
+            'sku': product.sku,
+            'category': product.category.name if product.category else '-',
+            'unit_price': product.unit_price,
+            'stock': stock,
+            'value': value,
+            'reorder_level': product.reorder_level,
+            'status': stock_status(stock, product.reorder_level)
+        })
+    
+    return {
+        'warehouse': warehouse,
+        'products': product_data,
+        'total_products': len(product_data),
+        'total_items': total_items,
+        'total_value': total_value,
+    }
+
+
 @login_required(login_url='/admin/login/')
 def transfer_stock(request):
-    """Transfer stock between warehouses"""
+    """Transfer stock between warehouses (one or more product lines)"""
     if request.method == 'POST':
         try:
-            product_id = request.POST.get('product')
-            from_warehouse_id = request.POST.get('from_warehouse')
-            to_warehouse_id = request.POST.get('to_warehouse')
-            quantity = int(request.POST.get('quantity', 0))
-            
-            product = get_object_or_404(Product, id=product_id)
-            from_warehouse = get_object_or_404(Warehouse, id=from_warehouse_id)
-            to_warehouse = get_object_or_404(Warehouse, id=to_warehouse_id)
+            from_warehouse = catalog.warehouse(request.POST.get('from_warehouse'))
+            to_warehouse = catalog.warehouse(request.POST.get('to_warehouse'))
+            if from_warehouse is None or to_warehouse is None:
+                raise Http404('Warehouse not found')
+            lines = zip(request.POST.getlist('product'), request.POST.getlist('quantity'))
             
-            # Check stock availability
-            current_stock = product.get_stock_by_warehouse(from_warehouse)
+            transfer = create_transfer(from_warehouse, to_warehouse, lines, user=request.user)
+            messages.success(
+                request,
+                f'✓ Stock imehamishwa kutoka {from_warehouse.name} hadi {to_warehouse.name}! ({transfer.number})'
+            )
+            return redirect('warehouse_stock', warehouse_id=from_warehouse.id)
             
-            if quantity > current_stock:
-                messages.error(request, f'✗ Hakuna stock ya kutosha kwenye {from_warehouse.name}! Iliyopo: {current_stock}')
-            elif from_warehouse == to_warehouse:
-                messages.error(request, '✗ Maghala yanayotumika ni tofauti!')
-            else:
-                # Create StockOut from source warehouse
-                StockOut.objects.create(
-                    product=product,
-                    warehouse=from_warehouse,
-                    quantity=quantity,
-                    customer=f'Transfer to {to_warehouse.name}',
-                    reference_no=f'TRF-{timezone.now().strftime("%Y%m%d%H%M%S")}',
-                    issued_by=request.user,
-                    notes=f'Stock transfer from {from_warehouse.name} to {to_warehouse.name}'
-                )
-                
-                # Create StockIn to destination warehouse
-                StockIn.objects.create(
-                    product=product,
-                    warehouse=to_warehouse,
-                    quantity=quantity,
-                    supplier=f'Transfer from {from_warehouse.name}',
-                    reference_no=f'TRF-{timezone.now().strftime("%Y%m%d%H%M%S")}',
-                    received_by=request.user,
-                    notes=f'Stock transfer from {from_warehouse.name} to {to_warehouse.name}'
-                )
-                
-                messages.success(request, f'✓ Stock imehamishwa kutoka {from_warehouse.name} hadi {to_warehouse.name}!')
-                return redirect('warehouse_stock', warehouse_id=from_warehouse.id)
-                
+        except TransferError as e:
+            for error in e.errors:
+                messages.error(request, f'✗ {error}')
         except Exception as e:
             messages.error(request, f'✗ Kuna tatizo: {str(e)}')
     
     # GET request - show form
-    warehouses = Warehouse.objects.all()
-    products = Product.objects.all()
-    
+    # Products are picked through the search API, not rendered as options
     context = {
-        'warehouses': warehouses,
-        'products': products,
+        'warehouses': get_catalog().warehouses,
+        'product_count': len(get_catalog().products),
     }
     return render(request, 'warehouse/transfer_stock.html', context)
 
 
 # ========== REPORTS ==========
 @login_required(login_url='/admin/login/')
+@read_only_view
 def stock_report(request):
-    """Generate stock report"""
+    """Generate stock report (current, or as of the end of ?as_of=YYYY-MM-DD)"""
+    as_of = parse_as_of(request.GET)
     try:
-        products = Product.objects.all()
-        warehouses = Warehouse.objects.all()
-        
-        product_data = []
-        total_items = 0
-        total_value = 0
-        low_stock_count = 0
-        out_of_stock_count = 0
+        context = cached_context(
+            'stock_report', [as_of], lambda: _stock_report_context(build_stock_matrix(as_of=as_of), as_of)
+        )
+        context['report_date'] = timezone.now()
+    except Exception as e:
+        print(f"Stock report error: {e}")
+        context = _empty_stock_report_context(as_of)
+    
+    return render(request, 'warehouse/reports/stock_report.html', context)
+
+
+@login_required(login_url='/admin/login/')
+@read_only_view
+async def stock_report_async(request):
+    """Stock report for ASGI workers: balances and catalogue are read concurrently"""
+    as_of = parse_as_of(request.GET)
+    
+    async def build():
+        return _stock_report_context(await abuild_stock_matrix(as_of), as_of)
+    
+    try:
+        context = await acached_context('stock_report', [as_of], build)
+        context['report_date'] = timezone.now()
+    except Exception as e:
+        print(f"Stock report error: {e}")
+        context = _empty_stock_report_context(as_of)
+    
+    return await sync_to_async(render)(request, 'warehouse/reports/stock_report.html', context)
+
+
+def _stock_report_context(matrix, as_of):
+    products = matrix.products
+    
+    product_data = []
+    total_items = 0
+    total_value = 0
+    low_stock_count = 0
+    out_of_stock_count = 0
+    
+    for product in products:
+        current_stock = matrix.total(product.id)
+        value = matrix.value(product.id)
         
-        for product in products:
-            current_stock = product.get_total_stock()
-            value = current_stock * product.unit_price
-            
-            total_items += current_stock
-            total_value += value
-            
-            if current_stock <= 0:
-                out_of_stock_count += 1
-            elif current_stock <= product.reorder_level:
-                low_stock_count += 1
-            
-            # Get stock by warehouse
-            stock_by_warehouse = {}
-            for warehouse in warehouses:
-                stock_by_warehouse[warehouse.id] = product.get_stock_by_warehouse(warehouse)
-            
-            product_data.append({
-                'id': product.id,
-                'name': product.name,
-                'sku': product.sku,
-                'category': product.category.name if product.category else '-',
-                'unit_price': product.unit_price,
-                'current_stock': current_stock,
-                'total_value': value,
-                'reorder_level': product.reorder_level,
-                'stock_by_warehouse': stock_by_warehouse,
-            })
+        total_items += current_stock
+        total_value += value
         
-        # Warehouse summary
-        warehouse_data = []
-        for warehouse in warehouses:
-            wh_total = 0
-            wh_value = 0
-            for product in products:
-                stock = product.get_stock_by_warehouse(warehouse)
-                wh_total += stock
-                wh_value += stock * product.unit_price
-            warehouse_data.append({
-                'id': warehouse.id,
-                'name': warehouse.name,
-                'code': warehouse.code,
-                'total_items': wh_total,
-                'total_value': wh_value,
-            })
+        if current_stock <= 0:
+            out_of_stock_count += 1
+        elif current_stock <= product.reorder_level:
+            low_stock_count += 1
         
-        context = {
-            'products': product_data,
-            'warehouses': warehouse_data,
-            'report_date': timezone.now(),
-            'total_items': total_items,
-            'total_value': total_value,
-            'low_stock_count': low_stock_count,
-            'out_of_stock_count': out_of_stock_count,
-            'in_stock_count': products.count() - low_stock_count - out_of_stock_count,
-            'has_data': products.count() > 0,
-        }
+        # Get stock by warehouse
+        stock_by_warehouse = matrix.by_warehouse(product.id)
         
-    except Exception as e:
-        print(f"Stock report error: {e}")
-        context = {
-            'products': [],
-            'warehouses': [],
-            'report_date': timezone.now(),
-            'total_items': 0,
-            'total_value': 0,
-            'low_stock_count': 0,
-            'out_of_stock_count': 0,
-            'in_stock_count': 0,
-            'has_data': False,
-        }
+        product_data.append({
+            'id': product.id,
+            'name': product.name,
+            'sku': product.sku,
+            'category': product.category.name if product.category else '-',
+            'unit_price': product.unit_price,
+            'current_stock': current_stock,
+            'total_value': value,
+            'reorder_level': product.reorder_level,
+            'stock_by_warehouse': stock_by_warehouse,
+        })
     
-    return render(request, 'warehouse/reports/stock_report.html', context)
+    # Warehouse summary
+    warehouse_data = []
+    for warehouse in matrix.warehouses:
+        warehouse_data.append({
+            'id': warehouse.id,
+            'name': warehouse.name,
+            'code': warehouse.code,
+            'total_items': matrix.warehouse_totals[warehouse.id],
+            'total_value': matrix.warehouse_values[warehouse.id],
+        })
+    
+    return {
+        'products': product_data,
+        'warehouses': warehouse_data,
+        'report_date': timezone.now(),
+        'total_items': total_items,
+        'total_value': total_value,
+        'low_stock_count': low_stock_count,
+        'out_of_stock_count': out_of_stock_count,
+        'in_stock_count': len(products) - low_stock_count - out_of_stock_count,
+        'has_data': len(products) > 0,
+        'as_of': as_of,
+        'checkpoint': matrix.checkpoint,
+    }
+
+
+def _empty_stock_report_context(as_of):
+    return {
+        'products': [],
+        'warehouses': [],
+        'report_date': timezone.now(),
+        'total_items': 0,
+        'total_value': 0,
+        'low_stock_count': 0,
+        'out_of_stock_count': 0,
+        'in_stock_count': 0,
+        'has_data': False,
+        'as_of': as_of,
+        'checkpoint': None,
+    }
 
 
 @login_required(login_url='/admin/login/')
+@read_only_view
 def low_stock_report(request):
     """Generate low stock report"""
     try:
-        products = Product.objects.all()
-        low_stock_products = []
-        
-        for product in products:
-            current_stock = product.get_total_stock()
-            reorder_level = product.reorder_level
-            
-            if current_stock <= reorder_level:
-                needed_quantity = (reorder_level * 2) - current_stock if current_stock > 0 else reorder_level * 2
-                
-                low_stock_products.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'sku': product.sku,
-                    'category': product.category.name if product.category else '-',
-                    'current_stock': current_stock,
-                    'reorder_level': reorder_level,
-                    'unit_price': product.unit_price,
-                    'total_value': current_stock * product.unit_price,
-                    'needed_quantity': needed_quantity,
-                    'order_value': needed_quantity * product.unit_price,
-                    'status': 'out' if current_stock <= 0 else 'low'
-                })
-        
-        context = {
-            'products': low_stock_products,
-            'report_date': timezone.now(),
-            'total_low_stock': len(low_stock_products),
-            'has_data': len(low_stock_products) > 0,
-        }
+        context = cached_context('low_stock_report', [], _low_stock_context)
+        context['report_date'] = timezone.now()
         
     except Exception as e:
         print(f"Low stock report error: {e}")
@@ -482,7 +531,40 @@ def low_stock_report(request):
     return render(request, 'warehouse/reports/low_stock_report.html', context)
 
 
+def _low_stock_context():
+    low_stock_products = []
+    
+    for product in query_low_stock():
+        current_stock = product.current_stock
+        plan = plan_for(product)
+        
+        needed_quantity = suggested_order_quantity(current_stock, product.reorder_level, plan)
+        
+        low_stock_products.append({
+            'id': product.id,
+            'name': product.name,
+            'sku': product.sku,
+            'category': product.category.name if product.category else '-',
+            'current_stock': current_stock,
+            'reorder_level': product.reorder_point,
+            'daily_demand': plan.daily_demand if plan else None,
+            'days_of_cover': days_of_cover(current_stock, plan),
+            'unit_price': product.unit_price,
+            'total_value': current_stock * product.unit_price,
+            'needed_quantity': needed_quantity,
+            'order_value': needed_quantity * product.unit_price,
+            'status': 'out' if current_stock <= 0 else 'low'
+        })
+    
+    return {
+        'products': low_stock_products,
+        'total_low_stock': len(low_stock_products),
+        'has_data': len(low_stock_products) > 0,
+    }
+
+
 @login_required(login_url='/admin/login/')
+@read_only_view
 def transaction_report(request):
     """Generate transaction report"""
     try:
@@ -518,127 +600,430 @@ def transaction_report(request):
 
 
 @login_required(login_url='/admin/login/')
+@read_only_view
 def monthly_report(request):
-    """Generate monthly report"""
+    """Movement report for a month (?year=&month=) or a date range (?date_from=&date_to=)"""
+    today = timezone.localdate()
+    period = ReportPeriod.from_params(request.GET, today)
+    
+    def build():
+        return _monthly_context({key: fn() for key, fn in _monthly_queries(period).items()})
+    
     try:
-        today = timezone.now().date()
-        first_day = today.replace(day=1)
-        
-        if today.month == 12:
-            last_day = today.replace(year=today.year + 1, month=1, day=1)
-        else:
-            last_day = today.replace(month=today.month + 1, day=1)
-        
-        # Monthly transactions
-        monthly_stockins = StockIn.objects.filter(
-            date_received__date__gte=first_day,
-            date_received__date__lt=last_day
-        ).select_related('product', 'warehouse')
-        
-        monthly_stockouts = StockOut.objects.filter(
-            date_issued__date__gte=first_day,
-            date_issued__date__lt=last_day
-        ).select_related('product', 'warehouse')
-        
-        # Calculate totals
-        monthly_in_total = monthly_stockins.aggregate(total=Sum('quantity'))['total'] or 0
-        monthly_out_total = monthly_stockouts.aggregate(total=Sum('quantity'))['total'] or 0
-        
-        # Top products
-        products = Product.objects.all()
-        top_products = []
-        
-        for product in products:
-            monthly_in = monthly_stockins.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
-            monthly_out = monthly_stockouts.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            if monthly_in > 0 or monthly_out > 0:
-                top_products.append({
-                    'name': product.name,
-                    'sku': product.sku,
-                    'monthly_in': monthly_in,
-                    'monthly_out': monthly_out,
-                    'total': monthly_in + monthly_out
-                })
-        
-        # Sort by total activity
-        top_products.sort(key=lambda x: x['total'], reverse=True)
-        
-        context = {
-            'month': today.strftime('%B %Y'),
-            'year': today.year,
-            'month_name': today.strftime('%B'),
-            'monthly_stockins': monthly_stockins[:50],
-            'monthly_stockouts': monthly_stockouts[:50],
-            'monthly_in_total': monthly_in_total,
-            'monthly_out_total': monthly_out_total,
-            'total_transactions': monthly_stockins.count() + monthly_stockouts.count(),
-            'top_products': top_products[:10],
-            'report_date': timezone.now(),
-            'has_data': monthly_stockins.exists() or monthly_stockouts.exists(),
-        }
-        
+        context = cached_context('monthly_report', [period.first_day, period.last_day], build)
     except Exception as e:
         print(f"Monthly report error: {e}")
-        context = {
-            'month': timezone.now().strftime('%B %Y'),
-            'year': timezone.now().year,
-            'month_name': timezone.now().strftime('%B'),
-            'monthly_stockins': [],
-            'monthly_stockouts': [],
-            'monthly_in_total': 0,
-            'monthly_out_total': 0,
-            'total_transactions': 0,
-            'top_products': [],
-            'report_date': timezone.now(),
-            'has_data': False,
-        }
+        context = _empty_monthly_context()
     
+    context.update(_period_context(period, today))
     return render(request, 'warehouse/reports/monthly_report.html', context)
 
 
+@login_required(login_url='/admin/login/')
+@read_only_view
+async def monthly_report_async(request):
+    """Monthly report for ASGI workers: totals, line lists and rankings are queried concurrently"""
+    today = timezone.localdate()
+    period = ReportPeriod.from_params(request.GET, today)
+    
+    async def build():
+        return _monthly_context(await gather_queries(_monthly_queries(period)))
+    
+    try:
+        context = await acached_context('monthly_report', [period.first_day, period.last_day], build)
+    except Exception as e:
+        print(f"Monthly report error: {e}")
+        context = _empty_monthly_context()
+    
+    context.update(_period_context(period, today))
+    return await sync_to_async(render)(request, 'warehouse/reports/monthly_report.html', context)
+
+
+def _monthly_queries(period):
+    """The monthly report's independent queries as {key: callable}"""
+    start, end = period.datetime_range()
+    return {
+        # Totals and rankings come from the daily rollup, not the movement tables
+        'totals': lambda: period_totals(period),
+        'top_products': lambda: top_products(period),
+        # Latest lines of the period (plain range on the indexed date columns)
+        'stockins': lambda: list(StockIn.objects.filter(
+            date_received__gte=start,
+            date_received__lt=end
+        ).select_related('product', 'warehouse')[:50]),
+        'stockouts': lambda: list(StockOut.objects.filter(
+            date_issued__gte=start,
+            date_issued__lt=end
+        ).select_related('product', 'warehouse')[:50]),
+    }
+
+
+def _monthly_context(results):
+    totals = results['totals']
+    total_transactions = totals['lines_in'] + totals['lines_out']
+    return {
+        'monthly_stockins': results['stockins'],
+        'monthly_stockouts': results['stockouts'],
+        'monthly_in_total': totals['qty_in'],
+        'monthly_out_total': totals['qty_out'],
+        'total_transactions': total_transactions,
+        'top_products': results['top_products'],
+        'has_data': total_transactions > 0,
+    }
+
+
+def _empty_monthly_context():
+    return {
+        'monthly_stockins': [],
+        'monthly_stockouts': [],
+        'monthly_in_total': 0,
+        'monthly_out_total': 0,
+        'total_transactions': 0,
+        'top_products': [],
+        'has_data': False,
+    }
+
+
+def _period_context(period, today):
+    return {
+        'period': period,
+        'month': period.label,
+        'year': period.year,
+        'month_name': period.name,
+        'months': [(number, datetime(2000, number, 1).strftime('%B')) for number in range(1, 13)],
+        'years': range(today.year - 5, today.year + 1),
+        'report_date': timezone.now(),
+    }
+
+
+@login_required(login_url='/admin/login/')
+def export_report(request, report):
+    """Stream a report as CSV (default) or XLSX straight from the database"""
+    if report not in EXPORT_REPORTS:
+        raise Http404('Report not found')
+    export_format = request.GET.get('format', 'csv')
+    try:
+        return export_response(report, export_format, request.GET)
+    except ImportError:
+        messages.error(request, '✗ Kupakua XLSX kunahitaji openpyxl kwenye server. Tumia CSV.')
+    except ValueError as e:
+        messages.error(request, f'✗ Kuna tatizo: {str(e)}')
+    return redirect(request.META.get('HTTP_REFERER') or 'dashboard')
+
+
+@login_required(login_url='/admin/login/')
+@require_POST
+def queue_report_job(request, report):
+    """Queue a report export (?format= plus the report page's filters) to be generated in the background"""
+    try:
+        job, created = queue_report(report, request.GET.get('format', 'csv'), request.GET, request.user)
+        if created:
+            messages.success(request, f'✓ Ripoti #{job.pk} imewekwa kwenye foleni. Ipakue hapa ikiwa tayari.')
+        else:
+            messages.info(request, f'ℹ Ripoti hii tayari iko kwenye foleni (#{job.pk}), hatujaiongeza tena.')
+    except ValueError as e:
+        messages.error(request, f'✗ Kuna tatizo: {str(e)}')
+    return redirect('report_jobs')
+
+
+@login_required(login_url='/admin/login/')
+def report_jobs(request):
+    """Background report exports: queued, running and ready to download"""
+    try:
+        jobs = list(ReportJob.objects.select_related('requested_by')[:RECENT_JOBS])
+    except Exception as e:
+        print(f"Report jobs error: {e}")
+        jobs = []
+    
+    for job in jobs:
+        job.title = REPORT_TITLES.get(job.report, job.report)
+    
+    context = {
+        'jobs': jobs,
+        'active_ids': [job.pk for job in jobs if job.is_active],
+        'has_data': len(jobs) > 0,
+    }
+    return render(request, 'warehouse/reports/report_jobs.html', context)
+
+
+@login_required(login_url='/admin/login/')
+def download_report_job(request, job_id):
+    """The stored file of a finished report job"""
+    job = get_object_or_404(ReportJob, pk=job_id, status=ReportJob.DONE)
+    path = result_path(job)
+    if not path.is_file():
+        raise Http404('Report file not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=job.filename)
+
+
 # ========== API ENDPOINTS ==========
 @login_required(login_url='/admin/login/')
+@read_only_view
 def product_stock_api(request, product_id):
-    """API to get product stock info for specific warehouse"""
+    """API to get product stock info for specific warehouse (single-product form of stock_lookup_api)"""
     try:
-        product = get_object_or_404(Product, id=product_id)
+        product = catalog.product(product_id)
+        if product is None:
+            raise Product.DoesNotExist
         warehouse_id = request.GET.get('warehouse')
+        warehouses = None
         
         if warehouse_id:
-            warehouse = get_object_or_404(Warehouse, id=warehouse_id)
-            current_stock = product.get_stock_by_warehouse(warehouse)
+            warehouse = catalog.warehouse(warehouse_id)
+            if warehouse is None:
+                raise Http404('Warehouse not found')
+            warehouses = [warehouse]
             warehouse_name = warehouse.name
         else:
-            current_stock = product.get_total_stock()
             warehouse_name = 'All Warehouses'
         
-        if current_stock <= 0:
-            status = 'out'
-            status_text = 'Hakuna Stock'
-        elif current_stock <= product.reorder_level:
-            status = 'low'
-            status_text = 'Stock Ndogo'
-        else:
-            status = 'ok'
-            status_text = 'Ipo'
+        def payload():
+            entry = lookup_stock([product], warehouses)[0]
+            return {
+                'success': True,
+                'product_id': entry['product_id'],
+                'product_name': entry['product_name'],
+                'sku': entry['sku'],
+                'warehouse': warehouse_name,
+                'stock': entry['stock'],
+                'status': entry['status'],
+                'status_text': entry['status_text'],
+                'reorder_level': entry['reorder_level'],
+                'unit_price': entry['unit_price'],
+            }
         
+        return _conditional_json(request, stock_validators([product], warehouses), payload)
+        
+    except Product.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Product not found'}, status=404)
+    except Http404:
+        return JsonResponse({'success': False, 'error': 'Warehouse not found'}, status=404)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required(login_url='/admin/login/')
+@read_only_view
+def product_series_api(request, product_id):
+    """
+    In/out/net and running balance of a product per day, week, month...
+    
+    ?date_from=&date_to= or ?days=<n> (default: the last 90 days), ?warehouse=<id>,
+    ?bucket=auto|day|week|month|quarter|year, ?points=<max points>. The
+    bucket is widened when the range would need more than `points` of them.
+    """
+    try:
+        product = catalog.product(product_id)
+        if product is None:
+            raise Product.DoesNotExist
+        warehouse = None
+        if request.GET.get('warehouse'):
+            warehouse = catalog.warehouse(request.GET.get('warehouse'))
+            if warehouse is None:
+                raise Http404('Warehouse not found')
+        series = SeriesRequest.from_params(request.GET)
+        
+        context = cached_context(
+            'product_series', (product.id, warehouse.id if warehouse else '', *series.cache_parts()),
+            lambda: product_series(product, series, warehouse),
+        )
         return JsonResponse({
             'success': True,
             'product_id': product.id,
-            'product_name': product.name,
-            'sku': product.sku,
-            'warehouse': warehouse_name,
-            'stock': current_stock,
-            'status': status,
-            'status_text': status_text,
-            'reorder_level': product.reorder_level,
-            'unit_price': str(product.unit_price),
+            'warehouse_id': warehouse.id if warehouse else None,
+            'date_from': series.first_day.isoformat(),
+            'date_to': series.last_day.isoformat(),
+            'requested_bucket': series.requested,
+            'bucket': context['bucket'],
+            'opening_balance': context['opening_balance'],
+            'points': context['points'],
         })
         
     except Product.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Product not found'}, status=404)
+    except Http404:
+        return JsonResponse({'success': False, 'error': 'Warehouse not found'}, status=404)
+    except InvalidSeries as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required(login_url='/admin/login/')
+@read_only_view
+def stock_lookup_api(request):
+    """
+    Stock for many products at once.
     
-    
\ No newline at end of file
+    ?products=1,2,SKU-3 (ids or SKUs, also repeatable) and optional
+    ?warehouses=1,WH002 (ids or codes). Supports If-None-Match /
+    If-Modified-Since; unchanged stock answers 304.
+    """
+    try:
+        products, unknown_products = resolve_products(split_keys(request.GET, 'products'))
+        warehouses, unknown_warehouses = resolve_warehouses(split_keys(request.GET, 'warehouses'))
+        if not products:
+            return JsonResponse({'success': False, 'error': 'products=<id au SKU,...> inahitajika'}, status=400)
+        if len(products) > MAX_LOOKUP_PRODUCTS:
+            return JsonResponse(
+                {'success': False, 'error': f'Bidhaa zisizidi {MAX_LOOKUP_PRODUCTS} kwa ombi moja'}, status=400
+            )
+        
+        def payload():
+            return {
+                'success': True,
+                'warehouses': [warehouse.id for warehouse in warehouses],
+                'products': lookup_stock(products, warehouses),
+                'unknown_products': unknown_products,
+                'unknown_warehouses': unknown_warehouses,
+            }
+        
+        return _conditional_json(request, stock_validators(products, warehouses), payload)
+        
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+def _conditional_json(request, validators, payload):
+    """JsonResponse with ETag/Last-Modified, or 304 when the client's copy is current"""
+    etag, last_modified = validators
+    etag = quote_etag(etag)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = JsonResponse(payload())
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required(login_url='/admin/login/')
+@require_POST
+def transfer_api(request):
+    """
+    Create a multi-line transfer document.
+    
+    Body (JSON): {"from_warehouse": id, "to_warehouse": id, "notes": "",
+                  "lines": [{"product": id, "quantity": n}, ...]}
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        warehouse_ids = [payload.get('from_warehouse'), payload.get('to_warehouse')]
+        if not all(isinstance(value, (int, str)) and str(value).strip().isdigit() for value in warehouse_ids):
+            return JsonResponse(
+                {'success': False, 'errors': ['from_warehouse na to_warehouse lazima ziwe namba za ghala']}, status=400
+            )
+        from_warehouse, to_warehouse = (catalog.warehouse(value) for value in warehouse_ids)
+        if from_warehouse is None or to_warehouse is None:
+            raise Warehouse.DoesNotExist
+        lines = payload.get('lines') or []
+        if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+            return JsonResponse({'success': False, 'errors': ['lines lazima iwe orodha ya bidhaa']}, status=400)
+        lines = [(line.get('product'), line.get('quantity')) for line in lines]
+        
+        transfer = create_transfer(
+            from_warehouse, to_warehouse, lines, user=request.user, notes=payload.get('notes', '')
+        )
+        return JsonResponse({
+            'success': True,
+            'id': transfer.id,
+            'number': transfer.number,
+            'from_warehouse': from_warehouse.id,
+            'to_warehouse': to_warehouse.id,
+            'lines': transfer.line_count,
+        }, status=201)
+        
+    except (ValueError, AttributeError) as e:
+        errors = e.errors if isinstance(e, TransferError) else ['ombi si sahihi']
+        return JsonResponse({'success': False, 'errors': errors}, status=400)
+    except Warehouse.DoesNotExist:
+        return JsonResponse({'success': False, 'errors': ['ghala halipo']}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required(login_url='/admin/login/')
+@read_only_view
+def stock_as_of_api(request):
+    """
+    Stock at the end of ?date=YYYY-MM-DD, optionally narrowed with
+    ?product=<id> and/or ?warehouse=<id>
+    """
+    try:
+        as_of = parse_date(request.GET.get('date') or '')
+        if as_of is None:
+            return JsonResponse({'success': False, 'error': 'date=YYYY-MM-DD inahitajika'}, status=400)
+        product_id = request.GET.get('product')
+        warehouse_id = request.GET.get('warehouse')
+        products = [get_object_or_404(Product, id=product_id)] if product_id else None
+        warehouses = [get_object_or_404(Warehouse, id=warehouse_id)] if warehouse_id else None
+        
+        cells, checkpoint = balances_as_of(as_of, products, warehouses)
+        balances = [
+            {'product_id': product, 'warehouse_id': warehouse, 'stock': quantity}
+            for (product, warehouse), quantity in sorted(cells.items())
+        ]
+        return JsonResponse({
+            'success': True,
+            'date': as_of.isoformat(),
+            'checkpoint': checkpoint.cutoff_date.isoformat() if checkpoint else None,
+            'balances': balances,
+            'total': sum(cells.values()),
+        })
+        
+    except Http404:
+        return JsonResponse({'success': False, 'error': 'Product or warehouse not found'}, status=404)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required(login_url='/admin/login/')
+def report_job_api(request, job_id):
+    """Status of a background report job, polled by the report jobs page"""
+    try:
+        job = ReportJob.objects.get(pk=job_id)
+    except ReportJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    
+    return JsonResponse({'success': True, **job_status(job)})
+
+
+@login_required(login_url='/admin/login/')
+def catalog_stats_api(request):
+    """Hit/miss counters of this process's catalog cache"""
+    return JsonResponse({'success': True, **catalog_stats()})
+
+
+@login_required(login_url='/admin/login/')
+def cache_stats_api(request):
+    """Hit ratios of the report context/fragment cache and the catalog in this process"""
+    return JsonResponse({'success': True, 'reports': report_cache_stats(), 'catalog': catalog_stats()})
+
+
+@login_required(login_url='/admin/login/')
+@read_only_view
+def product_search_api(request):
+    """Typeahead: ?q=<SKU or name prefixes>&limit=N, best matches first"""
+    try:
+        limit = int(request.GET.get('limit') or PRODUCT_SEARCH_LIMIT)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'limit si namba sahihi'}, status=400)
+    
+    try:
+        products = search_products(request.GET.get('q', ''), limit)
+        return JsonResponse({
+            'success': True,
+            'results': [{
+                'id': product.id,
+                'sku': product.sku,
+                'name': product.name,
+                'text': str(product),
+                'unit_price': str(product.unit_price),
+                'category': product.category.name if product.category else '-',
+            } for product in products],
+        })
+    except Exception as e:
+        print(f"Product search error: {e}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)